@@ -0,0 +1,198 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+
+MAX_TRACKED_CLIENTS = 10000
+
+ADMITTED = 'admitted'
+RATE_LIMITED = 'rate_limited'
+OVERLOADED = 'overloaded'
+
+
+class TokenBuckets:
+    """
+    Per-client token buckets refilled at ``rate`` tokens a second up to
+    ``burst``. Only the MAX_TRACKED_CLIENTS most recently seen clients are
+    tracked; a forgotten client starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Take a token; returns 0 when admitted, otherwise seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RouteClass:
+    """
+    A group of routes sharing one budget in this worker: at most
+    ``concurrency`` requests in flight, at most ``queue`` more waiting up to
+    ``queue_timeout`` seconds for a slot, and a token bucket per client.
+    """
+
+    def __init__(self, name, routes, concurrency, queue, queue_timeout, rate, burst, shed_on_db_pressure=False):
+        self.name = name
+        self.routes = set(routes)
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.shed_on_db_pressure = shed_on_db_pressure
+        self.buckets = TokenBuckets(rate, burst)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.counts = {ADMITTED: 0, RATE_LIMITED: 0, OVERLOADED: 0}
+
+    def record(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def acquire(self):
+        """Take an in-flight slot, queueing for one if allowed; False when the queue is full or the wait times out"""
+        with self._lock:
+            if self._slots.acquire(blocking=False):
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'routes': sorted(self.routes),
+                'concurrency': self.concurrency,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                **self.counts,
+            }
+
+
+class DatabasePressure:
+    """
+    Whether the default database's connection pool is backed up: too many
+    requests waiting for a connection right now, or a high average wait
+    over the last ADMISSION_DB_CHECK_INTERVAL seconds. Always False when
+    the database is not pooled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._last = (0, 0)
+        self._pressured = False
+
+    def __call__(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < settings.ADMISSION_DB_CHECK_INTERVAL:
+                return self._pressured
+            self._checked_at = now
+
+            connection = connections['default']
+            pool = connection._connection_pools.get('default') if connection.vendor == 'postgresql' else None
+            if pool is None:
+                self._pressured = False
+                return False
+
+            stats = pool.get_stats()
+            queued, wait_ms = stats.get('requests_queued', 0), stats.get('requests_wait_ms', 0)
+            new_queued, new_wait_ms = queued - self._last[0], wait_ms - self._last[1]
+            self._last = (queued, wait_ms)
+            average_wait = new_wait_ms / new_queued if new_queued > 0 else 0
+            self._pressured = (
+                stats.get('requests_waiting', 0) >= settings.ADMISSION_MAX_DB_WAITING
+                or average_wait >= settings.ADMISSION_MAX_DB_WAIT_MS
+            )
+            return self._pressured
+
+
+class AdmissionController:
+    def __init__(self, classes):
+        self.classes = [RouteClass(name, **options) for name, options in classes.items()]
+        self._by_route = {route: route_class for route_class in self.classes for route in route_class.routes}
+        self.db_pressure = DatabasePressure()
+
+    def route_class(self, route_name):
+        return self._by_route.get(route_name)
+
+    def admit(self, route_class, client):
+        """
+        Decide whether a request may run. Returns (outcome, retry_after);
+        on ADMITTED the caller owns an in-flight slot and must release it.
+        """
+        wait = route_class.buckets.take(client)
+        if wait:
+            route_class.record(RATE_LIMITED)
+            return RATE_LIMITED, max(1, math.ceil(wait))
+
+        if route_class.shed_on_db_pressure and self.db_pressure():
+            route_class.record(OVERLOADED)
+            return OVERLOADED, settings.ADMISSION_RETRY_AFTER
+
+        if not route_class.acquire():
+            route_class.record(OVERLOADED)
+            return OVERLOADED, settings.ADMISSION_RETRY_AFTER
+
+        route_class.record(ADMITTED)
+        return ADMITTED, 0
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'enabled': settings.ADMISSION_CONTROL_ENABLED,
+            'classes': {route_class.name: route_class.stats() for route_class in self.classes},
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(settings.ADMISSION_CLASSES)
+        return _controller
+
+
+def reset():
+    """Forget budgets and counters; the next request rebuilds them from settings"""
+    global _controller
+    with _controller_lock:
+        _controller = None
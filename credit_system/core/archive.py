@@ -0,0 +1,88 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from . import portfolio, scoring, versions
+from .ids import lock_ids
+from .models import ArchivedLoan, CustomerLoanHistory, Loan
+
+LOAN_FIELDS = [
+    'loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+    'emis_paid_on_time', 'start_date', 'end_date', 'version',
+]
+
+
+def archivable_loans(today=None):
+    """
+    Loans that can leave the hot table: ended more than LOAN_ARCHIVE_AFTER_DAYS
+    ago and started before this year, so they no longer affect the active or
+    current-year parts of any credit score.
+    """
+    today = today or date.today()
+    return Loan.objects.filter(
+        end_date__lt=today - timedelta(days=settings.LOAN_ARCHIVE_AFTER_DAYS),
+        start_date__lt=date(today.year, 1, 1),
+    )
+
+
+def _roll_up(rows):
+    totals = defaultdict(lambda: dict.fromkeys(scoring.HISTORY_FIELDS, 0))
+    for row in rows:
+        customer_totals = totals[row['customer_id']]
+        customer_totals['loan_count'] += 1
+        customer_totals['total_tenure'] += row['tenure']
+        customer_totals['total_emis_paid'] += row['emis_paid_on_time']
+        customer_totals['total_amount'] += row['loan_amount']
+    return totals
+
+
+def _archive_batch(batch_size, today):
+    with transaction.atomic():
+        # keeps loan id allocation from reading the tables while these loans move
+        lock_ids(Loan)
+        rows = list(
+            archivable_loans(today).select_for_update().order_by('loan_id').values(*LOAN_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        ArchivedLoan.objects.bulk_create([ArchivedLoan(**row) for row in rows])
+
+        totals = _roll_up(rows)
+        histories = CustomerLoanHistory.objects.select_for_update().in_bulk(list(totals))
+        missing = []
+        for customer_id, customer_totals in totals.items():
+            history = histories.get(customer_id)
+            if history is None:
+                missing.append(CustomerLoanHistory(customer_id=customer_id, **customer_totals))
+                continue
+            for field, value in customer_totals.items():
+                setattr(history, field, getattr(history, field) + value)
+        CustomerLoanHistory.objects.bulk_create(missing)
+        CustomerLoanHistory.objects.bulk_update(list(histories.values()), scoring.HISTORY_FIELDS)
+
+        Loan.objects.filter(loan_id__in=[row['loan_id'] for row in rows]).delete()
+        # the scores stay the same, but the hot loan lists shrink
+        versions.touch_customers(list(totals))
+    return len(rows)
+
+
+def archive_closed_loans(batch_size=None, today=None):
+    """
+    Move closed loans into ArchivedLoan in batches of ``batch_size``
+    (default LOAN_ARCHIVE_BATCH_SIZE), one transaction per batch, adding
+    each customer's archived totals to their CustomerLoanHistory. Returns
+    the number of loans archived.
+    """
+    batch_size = batch_size or settings.LOAN_ARCHIVE_BATCH_SIZE
+    archived = 0
+    while True:
+        moved = _archive_batch(batch_size, today)
+        archived += moved
+        if moved < batch_size:
+            break
+    if archived:
+        portfolio.invalidate()
+    return archived
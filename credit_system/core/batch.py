@@ -0,0 +1,101 @@
+from django.db import IntegrityError, transaction
+
+from .ids import allocate_ids
+from .lazy import np
+from .models import Customer
+from .serializers import CustomerBatchItemSerializer
+
+BATCH_ATTEMPTS = 2
+DUPLICATE_PHONE_ERROR = 'customer with this phone number already exists.'
+
+
+def approved_limits(monthly_incomes):
+    """36x monthly income rounded to the nearest lakh, for a whole batch at once"""
+    incomes = np.asarray(monthly_incomes, dtype=np.float64)
+    return np.round(36 * incomes / 100000) * 100000
+
+
+def _validate(rows):
+    valid = {}
+    errors = {}
+    for index, row in enumerate(rows):
+        serializer = CustomerBatchItemSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+def _reject_taken_phones(valid, errors):
+    """Drop rows whose phone number is already registered or repeated earlier in the batch"""
+    phones = [data['phone_number'] for data in valid.values()]
+    taken = set(Customer.objects.filter(phone_number__in=phones).values_list('phone_number', flat=True))
+    for index in sorted(valid):
+        phone = valid[index]['phone_number']
+        if phone in taken:
+            errors[index] = {'phone_number': [DUPLICATE_PHONE_ERROR]}
+            del valid[index]
+        else:
+            taken.add(phone)
+
+
+def _insert(valid):
+    indexes = sorted(valid)
+    limits = approved_limits([valid[index]['monthly_income'] for index in indexes])
+
+    with transaction.atomic():
+        first_id = allocate_ids(Customer, len(indexes))
+        customers = [
+            Customer(
+                customer_id=first_id + offset,
+                first_name=valid[index]['first_name'],
+                last_name=valid[index]['last_name'],
+                phone_number=valid[index]['phone_number'],
+                monthly_salary=valid[index]['monthly_income'],
+                approved_limit=float(limit),
+                age=valid[index].get('age'),
+            )
+            for offset, (index, limit) in enumerate(zip(indexes, limits))
+        ]
+        Customer.objects.bulk_create(customers, batch_size=1000)
+    return dict(zip(indexes, customers))
+
+
+def register_customers(rows):
+    """
+    Register many customers in one pass.
+
+    Rows are validated individually, phone numbers are checked against the
+    database in a single query, ids come from one contiguous block and all
+    accepted rows are inserted with ``bulk_create``. Returns one result per
+    input row, in order.
+    """
+    valid, errors = _validate(rows)
+
+    created = {}
+    for attempt in range(BATCH_ATTEMPTS):
+        pending = dict(valid)
+        _reject_taken_phones(pending, errors)
+        if not pending:
+            break
+        try:
+            created = _insert(pending)
+            break
+        except IntegrityError:
+            # a phone number was registered concurrently; the retry sees it in the lookup
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+
+    serializer = CustomerBatchItemSerializer()
+    results = []
+    for index in range(len(rows)):
+        if index in created:
+            results.append({
+                'index': index,
+                'status': 'created',
+                'customer': serializer.to_representation(created[index]),
+            })
+        else:
+            results.append({'index': index, 'status': 'rejected', 'errors': errors[index]})
+    return results
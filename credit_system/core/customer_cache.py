@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Customer
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'customer-cache:invalidate'
+RECONNECT_DELAY = 1
+
+
+class CustomerCache:
+    """
+    Bounded LRU of Customer rows for this process.
+
+    Entries expire after CUSTOMER_CACHE_TTL seconds and the least recently
+    used entry is evicted past CUSTOMER_CACHE_SIZE. A size of 0 disables
+    the cache. Misses are not cached, so a customer registered by another
+    process is found on the next lookup.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def maxsize(self):
+        return settings.CUSTOMER_CACHE_SIZE
+
+    @property
+    def ttl(self):
+        return settings.CUSTOMER_CACHE_TTL
+
+    def get(self, customer_id):
+        """Cached customer, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            customer, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[customer_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(customer_id)
+            self.hits += 1
+            return customer
+
+    def put(self, customer):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[customer.customer_id] = (customer, time.monotonic() + self.ttl)
+            self._entries.move_to_end(customer.customer_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, customer_ids):
+        with self._lock:
+            for customer_id in customer_ids:
+                if self._entries.pop(customer_id, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'size': len(self._entries),
+                'max_size': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def reset(self):
+        """Empty the cache and zero its counters"""
+        with self._lock:
+            self._entries.clear()
+            self._reset_stats()
+
+
+class InMemoryBus:
+    """Invalidation bus for a single process; stands in for Redis in tests"""
+
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler):
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def publish(self, message):
+        for handler in list(self._handlers):
+            handler(message)
+
+
+class RedisBus:
+    """
+    Invalidation bus over Redis pub/sub.
+
+    Each process listens on a daemon thread. After a dropped connection the
+    listener clears the local cache, since messages may have been missed.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._handlers = []
+        self._client = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def subscribe(self, handler):
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+        with self._lock:
+            # a forked worker inherits the parent's state but not its threads
+            if self._listener_pid != os.getpid():
+                self._client = None
+                self._listener_pid = os.getpid()
+                threading.Thread(target=self._listen, name='customer-cache-bus', daemon=True).start()
+
+    def _dispatch(self, message):
+        for handler in list(self._handlers):
+            handler(message)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for raw in pubsub.listen():
+                    self._dispatch(json.loads(raw['data']))
+            except Exception:
+                logger.warning("Customer cache bus disconnected; clearing local cache", exc_info=True)
+                self._dispatch({'all': True})
+                time.sleep(RECONNECT_DELAY)
+
+    def publish(self, message):
+        try:
+            self._redis().publish(CHANNEL, json.dumps(message))
+        except Exception:
+            # the TTL bounds staleness in other processes while Redis is away
+            logger.warning("Could not publish customer cache invalidation", exc_info=True)
+
+
+_cache = CustomerCache()
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def _handle(message):
+    if message.get('all'):
+        _cache.clear()
+    else:
+        _cache.discard(message.get('ids', []))
+
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            if settings.CUSTOMER_CACHE_BUS == 'redis':
+                _bus = RedisBus(settings.REDIS_URL)
+            else:
+                _bus = InMemoryBus()
+    _bus.subscribe(_handle)
+    return _bus
+
+
+def get_customer(customer_id):
+    """
+    ``Customer.objects.get(customer_id=...)`` through the process cache.
+    Misses are always read from the primary, even under ``replica_reads()``,
+    so the cache never holds a row older than its last invalidation. Raises
+    Customer.DoesNotExist like the query it replaces.
+    """
+    if settings.CUSTOMER_CACHE_SIZE <= 0:
+        return Customer.objects.get(customer_id=customer_id)
+
+    get_bus()
+    customer = _cache.get(customer_id)
+    if customer is None:
+        # a lagging replica could refill an invalidated entry with the stale row for a whole TTL
+        customer = Customer.objects.using('default').get(customer_id=customer_id)
+        _cache.put(customer)
+    return customer
+
+
+def preload(limit):
+    """Fill the cache with up to ``limit`` customers, newest first; returns how many were loaded"""
+    limit = min(limit, settings.CUSTOMER_CACHE_SIZE)
+    if limit <= 0:
+        return 0
+
+    get_bus()
+    customers = list(Customer.objects.using('default').order_by('-customer_id')[:limit])
+    # the newest customers end up most recently used
+    for customer in reversed(customers):
+        _cache.put(customer)
+    return len(customers)
+
+
+def _publish(message):
+    _handle(message)
+    # other processes may only re-read the row once the change is committed
+    transaction.on_commit(lambda: get_bus().publish(message))
+
+
+def invalidate(customer_ids):
+    """Drop customers from every process's cache"""
+    customer_ids = [int(customer_id) for customer_id in customer_ids]
+    if customer_ids:
+        _publish({'ids': customer_ids})
+
+
+def invalidate_all():
+    """Drop every cached customer in every process, e.g. after a reload"""
+    _publish({'all': True})
+
+
+def stats():
+    return _cache.stats()
+
+
+def reset():
+    _cache.reset()
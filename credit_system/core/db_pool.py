@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import connections
+
+
+def pool_options(min_size, max_size):
+    """``OPTIONS['pool']`` for Django's psycopg connection pool, sized as given"""
+    return {
+        'min_size': min_size,
+        'max_size': max_size,
+        'timeout': settings.DB_POOL_TIMEOUT,
+        'max_lifetime': settings.DB_POOL_MAX_LIFETIME,
+        'max_idle': settings.DB_POOL_MAX_IDLE,
+    }
+
+
+def configure_worker_pools():
+    """
+    Resize the pools of this process to CELERY_DB_POOL_MIN_SIZE and
+    CELERY_DB_POOL_MAX_SIZE. Runs in each Celery worker process before it
+    touches the database; an ingestion worker holds few long transactions
+    rather than many short requests.
+    """
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql' or not connection.settings_dict['OPTIONS'].get('pool'):
+            continue
+        # a pool inherited from the parent process belongs to it
+        connection._connection_pools.pop(alias, None)
+        connection.settings_dict['OPTIONS'] = {
+            **connection.settings_dict['OPTIONS'],
+            'pool': pool_options(settings.CELERY_DB_POOL_MIN_SIZE, settings.CELERY_DB_POOL_MAX_SIZE),
+        }
+
+
+def _pool_stats(alias, pool):
+    stats = pool.get_stats()
+    size = stats.get('pool_size', 0)
+    in_use = size - stats.get('pool_available', 0)
+    queued = stats.get('requests_queued', 0)
+    return {
+        'alias': alias,
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'size': size,
+        'in_use': in_use,
+        'available': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': stats.get('requests_num', 0),
+        'queued_checkouts': queued,
+        'wait_ms_total': stats.get('requests_wait_ms', 0),
+        'wait_ms_avg': round(stats.get('requests_wait_ms', 0) / queued, 2) if queued else 0.0,
+        'checkout_errors': stats.get('requests_errors', 0),
+        'failed_health_checks': stats.get('returns_bad', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+        'saturation': round(in_use / stats['pool_max'], 4) if stats.get('pool_max') else 0.0,
+    }
+
+
+def pool_stats():
+    """
+    Metrics of every connection pool opened by this process. Counters are
+    cumulative since the pool opened; ``saturation`` is the share of
+    ``max_size`` checked out right now.
+    """
+    stats = []
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            continue
+        pool = connection._connection_pools.get(alias)
+        if pool is not None:
+            stats.append(_pool_stats(alias, pool))
+    return stats
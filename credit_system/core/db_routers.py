@@ -0,0 +1,129 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+_lag_checks = {}
+_lag_lock = threading.Lock()
+
+# zero when the replica has replayed everything it received, otherwise the age of the last replayed commit
+LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads inside the block go to a read replica; usable as a decorator"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary(pinned=True):
+    """Keep every read inside the block on the primary, e.g. right after the client wrote"""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0])
+
+
+def _lag_ok(alias):
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checks.get(alias)
+        if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return checked[1]
+
+    try:
+        healthy = replica_lag(alias) <= settings.REPLICA_MAX_LAG
+    except Exception:
+        logger.warning("Replica %s lag check failed; reading from the primary", alias, exc_info=True)
+        healthy = False
+
+    with _lag_lock:
+        _lag_checks[alias] = (now, healthy)
+    return healthy
+
+
+def reset_lag_checks():
+    with _lag_lock:
+        _lag_checks.clear()
+
+
+def healthy_replicas():
+    return [alias for alias in settings.DATABASE_REPLICAS if _lag_ok(alias)]
+
+
+def _sticky_key(client):
+    return f"db-sticky:{client}"
+
+
+def client_key(request):
+    """Who to keep on the primary after a write: an explicit client id, the user, or the address"""
+    client = request.headers.get('X-Client-ID')
+    if client:
+        return f"client:{client}"
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"addr:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def mark_wrote(client):
+    cache.set(_sticky_key(client), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def recently_wrote(client):
+    return bool(cache.get(_sticky_key(client)))
+
+
+class ReplicaRouter:
+    """
+    Send reads to a read replica inside ``replica_reads()`` blocks.
+
+    Everything else, all writes and reads pinned to the primary after a
+    client's write, go to ``default``. Replicas further behind than
+    REPLICA_MAX_LAG seconds are skipped until their next lag check.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _replica_reads.get() or _pinned_to_primary.get():
+            return 'default'
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
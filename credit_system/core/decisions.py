@@ -0,0 +1,112 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import origination
+from .models import LoanDecision
+
+logger = logging.getLogger(__name__)
+
+# set while a drain task is queued, so a burst of submissions schedules one task, not one each
+DRAIN_SCHEDULED_KEY = 'loan-decisions:drain-scheduled'
+
+RESULT_FIELDS = ['status', 'loan_id', 'loan_approved', 'message', 'monthly_installment', 'decided_at']
+
+
+def _schedule_drain():
+    from .tasks import process_loan_decisions
+
+    window = settings.LOAN_DECISION_BATCH_WINDOW
+    # expires on its own in case the task is lost; beat also sweeps the queue
+    if cache.add(DRAIN_SCHEDULED_KEY, 1, int(window) + 60):
+        process_loan_decisions.apply_async(countdown=window)
+
+
+def submit(application):
+    """
+    Queue a validated application for a worker to decide and return its
+    LoanDecision. The drain task is scheduled once the row is committed,
+    LOAN_DECISION_BATCH_WINDOW seconds out so that applications arriving
+    meanwhile are decided in the same micro-batch.
+    """
+    decision = LoanDecision.objects.create(
+        customer_id=application['customer_id'],
+        loan_amount=application['loan_amount'],
+        interest_rate=application['interest_rate'],
+        tenure=application['tenure'],
+    )
+    transaction.on_commit(_schedule_drain)
+    return decision
+
+
+def _decide_one(decision):
+    """Decide a single application in its own savepoint; a failure becomes an error result"""
+    try:
+        with transaction.atomic():
+            return origination.originate_loans([decision.application()])[0]
+    except Exception as e:
+        logger.warning("Could not decide loan application %s", decision.decision_id, exc_info=True)
+        return {'error': f"Could not decide the application: {e}"}
+
+
+def _decide(pending):
+    """
+    Results for a batch of pending decisions. The batch is decided together;
+    if that fails, each application is retried on its own so one bad row
+    cannot hold back the rest of the queue.
+    """
+    try:
+        with transaction.atomic():
+            return origination.originate_loans([decision.application() for decision in pending])
+    except Exception:
+        logger.warning("Loan decision batch failed; deciding its %d applications one by one", len(pending), exc_info=True)
+        return [_decide_one(decision) for decision in pending]
+
+
+def _apply_result(decision, result, decided_at):
+    decision.decided_at = decided_at
+    if 'error' in result or 'errors' in result:
+        decision.status = LoanDecision.STATUS_FAILED
+        decision.loan_approved = False
+        decision.message = result.get('error') or json.dumps(result['errors'], default=str)
+        return
+    decision.status = LoanDecision.STATUS_DECIDED
+    decision.loan_id = result['loan_id']
+    decision.loan_approved = result['loan_approved']
+    decision.message = result['message']
+    decision.monthly_installment = result['monthly_installment']
+
+
+def drain(batch_size=None):
+    """
+    Decide every pending application, oldest first, ``batch_size`` per
+    transaction: each batch is scored, booked through the origination
+    engine and marked decided together. An application that cannot be
+    decided is marked failed with the error, so it leaves the queue. Pending
+    rows another worker has locked are skipped. Returns how many
+    applications were decided or failed.
+    """
+    batch_size = batch_size or settings.LOAN_DECISION_BATCH_SIZE
+    cache.delete(DRAIN_SCHEDULED_KEY)
+    decided = 0
+    while True:
+        with transaction.atomic():
+            pending = list(
+                LoanDecision.objects.select_for_update(skip_locked=True)
+                .filter(status=LoanDecision.STATUS_PENDING)
+                .order_by('id')[:batch_size]
+            )
+            if not pending:
+                return decided
+            results = _decide(pending)
+            decided_at = timezone.now()
+            for decision, result in zip(pending, results):
+                _apply_result(decision, result, decided_at)
+            LoanDecision.objects.bulk_update(pending, RESULT_FIELDS)
+        decided += len(pending)
+        if len(pending) < batch_size:
+            return decided
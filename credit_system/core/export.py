@@ -0,0 +1,208 @@
+import csv
+import gzip
+import tempfile
+import zlib
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from .models import ArchivedLoan, Customer, Loan
+
+CSV = 'csv'
+PARQUET = 'parquet'
+FORMATS = (CSV, PARQUET)
+
+# headers match the source workbooks so exports load back through ingest_data
+CUSTOMER_COLUMNS = [
+    ('Customer ID', 'customer_id'),
+    ('First Name', 'first_name'),
+    ('Last Name', 'last_name'),
+    ('Age', 'age'),
+    ('Phone Number', 'phone_number'),
+    ('Monthly Salary', 'monthly_salary'),
+    ('Approved Limit', 'approved_limit'),
+]
+LOAN_COLUMNS = [
+    ('Customer ID', 'customer_id'),
+    ('Loan ID', 'loan_id'),
+    ('Loan Amount', 'loan_amount'),
+    ('Tenure', 'tenure'),
+    ('Interest Rate', 'interest_rate'),
+    ('Monthly payment', 'monthly_repayment'),
+    ('EMIs paid on Time', 'emis_paid_on_time'),
+    ('Date of Approval', 'start_date'),
+    ('End Date', 'end_date'),
+] + [(header, f'customer__{field}') for header, field in CUSTOMER_COLUMNS[1:]]
+
+KINDS = {
+    'loans': LOAN_COLUMNS,
+    'customers': CUSTOMER_COLUMNS,
+}
+
+
+def _loan_filter(active_only=False, start_from=None, start_to=None):
+    condition = Q()
+    if active_only:
+        condition &= Q(end_date__gte=date.today())
+    if start_from:
+        condition &= Q(start_date__gte=start_from)
+    if start_to:
+        condition &= Q(start_date__lte=start_to)
+    return condition
+
+
+def _customer_range(queryset, customer_from=None, customer_to=None):
+    if customer_from is not None:
+        queryset = queryset.filter(customer_id__gte=customer_from)
+    if customer_to is not None:
+        queryset = queryset.filter(customer_id__lte=customer_to)
+    return queryset
+
+
+def export_queryset(kind, active_only=False, start_from=None, start_to=None, customer_from=None, customer_to=None):
+    """
+    Rows to export as tuples in column order, ordered by primary key.
+
+    Loans include the archived ones, so an export still holds every loan
+    after the archival job has run. For ``customers`` the loan filters
+    select customers with at least one matching live or archived loan.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    fields = [field for _, field in KINDS[kind]]
+    loan_condition = _loan_filter(active_only, start_from, start_to)
+    if kind == 'loans':
+        live = _customer_range(Loan.objects.filter(loan_condition), customer_from, customer_to)
+        archived = _customer_range(ArchivedLoan.objects.filter(loan_condition), customer_from, customer_to)
+        return live.values_list(*fields).union(archived.values_list(*fields), all=True).order_by('loan_id')
+
+    queryset = Customer.objects.order_by('customer_id')
+    if loan_condition:
+        queryset = queryset.filter(
+            Exists(Loan.objects.filter(loan_condition, customer_id=OuterRef('customer_id')))
+            | Exists(ArchivedLoan.objects.filter(loan_condition, customer_id=OuterRef('customer_id')))
+        )
+    return _customer_range(queryset, customer_from, customer_to).values_list(*fields)
+
+
+def iter_rows(queryset, chunk_size=None):
+    """Stream ``queryset`` with a server-side cursor where the database has one"""
+    return queryset.iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(kind, rows, fileobj):
+    writer = csv.writer(fileobj)
+    writer.writerow([header for header, _ in KINDS[kind]])
+    count = 0
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+        count += 1
+    return count
+
+
+def _arrow_schema(kind):
+    import pyarrow as pa
+
+    arrow_types = {
+        'DateField': pa.date32(),
+        'FloatField': pa.float64(),
+        'IntegerField': pa.int64(),
+        'BigIntegerField': pa.int64(),
+        'ForeignKey': pa.int64(),
+    }
+    model = Loan if kind == 'loans' else Customer
+
+    columns = []
+    for header, field in KINDS[kind]:
+        if field.startswith('customer__'):
+            model_field = Customer._meta.get_field(field[len('customer__'):])
+        else:
+            model_field = model._meta.get_field(field)
+        columns.append(pa.field(header, arrow_types.get(model_field.get_internal_type(), pa.string())))
+    return pa.schema(columns)
+
+
+def write_parquet(kind, rows, fileobj, compression='snappy', chunk_size=None):
+    """Write rows as Parquet, one row group per chunk so only one chunk is held at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(kind)
+    count = 0
+    with pq.ParquetWriter(fileobj, schema, compression=compression) as writer:
+        for chunk in _chunked(rows, chunk_size or settings.EXPORT_CHUNK_SIZE):
+            columns = list(zip(*chunk))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            count += len(chunk)
+    return count
+
+
+def export_to_path(kind, path, fmt=None, compress=None, chunk_size=None, **filters):
+    """
+    Export ``kind`` to a file. The format and gzip compression are taken
+    from the file name unless given. Returns the number of rows written.
+    """
+    lower = str(path).lower()
+    if fmt is None:
+        fmt = PARQUET if lower.endswith('.parquet') else CSV
+    if compress is None:
+        compress = lower.endswith('.gz')
+
+    rows = iter_rows(export_queryset(kind, **filters), chunk_size)
+    if fmt == PARQUET:
+        # Parquet compresses per column chunk; gzip selects that codec instead of wrapping the file
+        return write_parquet(kind, rows, str(path), compression='gzip' if compress else 'snappy', chunk_size=chunk_size)
+
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', newline='') as fileobj:
+        return write_csv(kind, rows, fileobj)
+
+
+class _Echo:
+    """File-like object whose write() hands back the text it was given"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(kind, compress=False, chunk_size=None, **filters):
+    """Yield a CSV export as bytes, optionally gzipped, without buffering the whole file"""
+    writer = csv.writer(_Echo())
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    rows = iter_rows(export_queryset(kind, **filters), chunk_size)
+
+    def encode(lines):
+        data = ''.join(lines).encode()
+        return compressor.compress(data) if compressor else data
+
+    yield encode([writer.writerow([header for header, _ in KINDS[kind]])])
+    for chunk in _chunked(rows, chunk_size or settings.EXPORT_CHUNK_SIZE):
+        data = encode(writer.writerow(['' if value is None else value for value in row]) for row in chunk)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+
+def parquet_file(kind, compress=False, chunk_size=None, **filters):
+    """A Parquet export in a spooled temporary file, rewound for reading"""
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_SIZE)
+    rows = iter_rows(export_queryset(kind, **filters), chunk_size)
+    write_parquet(kind, rows, spool, compression='gzip' if compress else 'snappy', chunk_size=chunk_size)
+    spool.seek(0)
+    return spool
@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .locks import CacheLock
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+POLL_INTERVAL = 0.05
+
+
+def principal(request):
+    """
+    Whose keys these are: the authenticated user, else the client address.
+    Self-declared ids such as X-Client-ID are not trusted, since a shared
+    key would replay another caller's stored response.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"addr:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def result_key(scope, owner, key):
+    """Cache key of the response stored for ``key`` sent by ``owner`` to ``scope``"""
+    digest = hashlib.sha256(f'{owner}\0{key}'.encode()).hexdigest()
+    return f'idempotency:{scope}:{digest}'
+
+
+def request_fingerprint(request):
+    """Hash of the method, path, query string and body, so a key reused for a different request can be told apart"""
+    payload = json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'query': sorted(request.GET.lists()),
+        'body': request.data,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {"error": f"{HEADER} was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _run_once(result_key, fingerprint, run):
+    """
+    Run the request unless it has already been answered under this key. The
+    first caller holds a cache lock while it runs; duplicates arriving
+    meanwhile wait for its stored response instead of running again.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        stored = cache.get(result_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        lock = CacheLock(result_key, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        if lock.acquire():
+            try:
+                # the original may have finished between the lookup and the lock
+                stored = cache.get(result_key)
+                if stored is not None:
+                    return _replay(stored, fingerprint)
+                response = run()
+                # server errors are not stored, so the client can retry them
+                if response.status_code < 500:
+                    cache.set(result_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, settings.IDEMPOTENCY_KEY_TTL)
+                return response
+            finally:
+                lock.release()
+
+        # another request with this key is running; it either stores a response or drops the lock
+        while cache.get(lock.key) is not None and cache.get(result_key) is None:
+            if time.monotonic() >= deadline:
+                response = Response(
+                    {"error": f"A request with this {HEADER} is still in progress"},
+                    status=status.HTTP_409_CONFLICT
+                )
+                response['Retry-After'] = str(settings.IDEMPOTENCY_WAIT_TIMEOUT)
+                return response
+            time.sleep(POLL_INTERVAL)
+
+
+def idempotent(scope):
+    """
+    Honour an ``Idempotency-Key`` header on an APIView method. The first
+    response under a key is kept for IDEMPOTENCY_KEY_TTL seconds and replayed
+    for repeats of the same request by the same principal; keys of different
+    callers never meet. Requests without the header run as usual.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return method(view, request, *args, **kwargs)
+            if not key or len(key) > settings.IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response(
+                    {"error": f"{HEADER} must be 1 to {settings.IDEMPOTENCY_KEY_MAX_LENGTH} characters"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return _run_once(
+                result_key(scope, principal(request), key),
+                request_fingerprint(request),
+                lambda: method(view, request, *args, **kwargs),
+            )
+        return wrapper
+    return decorate
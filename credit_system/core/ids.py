@@ -0,0 +1,40 @@
+import zlib
+
+from django.db import connection
+from django.db.models import Max
+
+from .models import ArchivedLoan, Loan
+
+# archived loans keep their ids, so new loan ids must continue past them too
+SHARED_ID_SPACE = {Loan: [ArchivedLoan]}
+
+
+def lock_ids(model):
+    """
+    Hold ``model``'s id allocation lock until the current transaction ends
+    (Postgres only). Also taken by the loan archival job, so an allocation
+    never reads the live and archived maxima while a loan moves between them.
+    """
+    if connection.vendor == 'postgresql':
+        lock_key = zlib.crc32(model._meta.db_table.encode())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [lock_key])
+
+
+def allocate_ids(model, count):
+    """
+    Reserve ``count`` contiguous primary keys for ``model`` and return the first.
+
+    Ids continue from the current maximum, matching how customers and loans
+    have always been numbered; loan ids also continue past archived loans.
+    Must be called inside a transaction that also inserts the rows: on
+    Postgres an advisory lock held until commit keeps concurrent allocations
+    for the same table from overlapping.
+    """
+    lock_ids(model)
+
+    current = 0
+    for table in [model] + SHARED_ID_SPACE.get(model, []):
+        pk_name = table._meta.pk.name
+        current = max(current, table.objects.aggregate(max_id=Max(pk_name))['max_id'] or 0)
+    return current + 1
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+
+from django.conf import settings
+
+from .lazy import pd
+from .models import IngestionGeneration, Customer
+
+FINGERPRINT_INDEX = 'fingerprints.json'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def get_cache_dir():
+    """Return the parse cache directory, or None when caching is disabled"""
+    cache_dir = getattr(settings, 'INGEST_CACHE_DIR', None)
+    if not cache_dir:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    return str(cache_dir)
+
+
+def _load_index(cache_dir):
+    if cache_dir is None:
+        return {}
+    try:
+        with open(os.path.join(cache_dir, FINGERPRINT_INDEX)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir, index):
+    if cache_dir is None:
+        return
+    path = os.path.join(cache_dir, FINGERPRINT_INDEX)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as fh:
+        json.dump(index, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_files(paths):
+    """
+    Fingerprint source files by size, mtime and sha256.
+
+    The content hash is only recomputed when size or mtime differ from the
+    fingerprint stored in the cache directory.
+    """
+    cache_dir = get_cache_dir()
+    index = _load_index(cache_dir)
+    fingerprints = {}
+    changed = False
+
+    for path in paths:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        stored = index.get(key)
+        if stored and stored['size'] == stat.st_size and stored['mtime_ns'] == stat.st_mtime_ns:
+            fingerprint = stored
+        else:
+            fingerprint = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': _hash_file(path),
+            }
+            index[key] = fingerprint
+            changed = True
+        fingerprints[path] = fingerprint
+
+    if changed:
+        try:
+            _save_index(cache_dir, index)
+        except OSError:
+            pass
+    return fingerprints
+
+
+def generation_id(fingerprints):
+    """Combine per-file content hashes into a single generation id"""
+    digest = hashlib.sha256()
+    for path in sorted(fingerprints):
+        digest.update(os.path.basename(path).encode())
+        digest.update(fingerprints[path]['sha256'].encode())
+    return digest.hexdigest()
+
+
+def generation_is_loaded(generation):
+    """True when the last completed ingestion loaded ``generation`` and the data is still there"""
+    latest = IngestionGeneration.objects.order_by('-id').first()
+    return latest is not None and latest.fingerprint == generation and Customer.objects.exists()
+
+
+def _parquet_path(cache_dir, path, fingerprint, columns=None):
+    """Conversion of ``path`` holding every column, or only ``columns`` for a lean read"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"{stem}-{fingerprint['sha256'][:16]}"
+    if columns is not None:
+        name += '-' + hashlib.sha256('\0'.join(sorted(columns)).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}.parquet")
+
+
+def _remove_stale_parquet(cache_dir, path, fingerprint):
+    """Drop conversions of older contents of ``path``; those of the current content stay"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    current = f"{stem}-{fingerprint['sha256'][:16]}"
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{stem}-") and name.endswith('.parquet') and not name.startswith(current):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def _is_workbook(path):
+    return str(path).lower().endswith('.xlsx')
+
+
+def _read_plain(path, columns=None, nrows=None):
+    """Read a CSV (optionally gzipped) or Parquet source, such as an export from this system"""
+    if str(path).lower().endswith('.parquet'):
+        if nrows == 0:
+            import pyarrow.parquet as pq
+            return pd.DataFrame(columns=pq.read_schema(path).names)
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, nrows=nrows)
+
+
+def read_header(path, fingerprint=None):
+    """Column names of a source file, read without loading its rows"""
+    if not _is_workbook(path):
+        return list(_read_plain(path, nrows=0).columns)
+
+    cache_dir = get_cache_dir()
+    if cache_dir is not None and fingerprint is not None:
+        parquet_path = _parquet_path(cache_dir, path, fingerprint)
+        if os.path.exists(parquet_path):
+            try:
+                import pyarrow.parquet as pq
+                return list(pq.read_schema(parquet_path).names)
+            except Exception:
+                pass
+    return list(pd.read_excel(path, nrows=0).columns)
+
+
+def _read_parquet(parquet_path, columns=None):
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path, columns=columns)
+        except Exception:
+            pass
+    return None
+
+
+def read_frame(path, fingerprint=None, columns=None):
+    """
+    Read an xlsx source file, going through the columnar parse cache.
+
+    When a Parquet conversion for the same content hash exists it is read
+    instead of the workbook; otherwise the workbook is parsed and the
+    conversion is written for the next run. ``columns`` limits the load to
+    those source columns: the workbook is parsed with only those columns and
+    the conversion is cached under that column set, so a full read never
+    gets a lean conversion. A lean read also uses a full conversion when one
+    exists. CSV and Parquet sources are read directly.
+    """
+    if not _is_workbook(path):
+        return _read_plain(path, columns=columns)
+
+    cache_dir = get_cache_dir()
+    if cache_dir is None or fingerprint is None:
+        return pd.read_excel(path, usecols=columns)
+
+    parquet_path = _parquet_path(cache_dir, path, fingerprint, columns)
+    df = _read_parquet(parquet_path)
+    if df is None and columns is not None:
+        df = _read_parquet(_parquet_path(cache_dir, path, fingerprint), columns=columns)
+    if df is not None:
+        return df
+
+    df = pd.read_excel(path, usecols=columns)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        _remove_stale_parquet(cache_dir, path, fingerprint)
+    except Exception:
+        # pyarrow missing or a column pyarrow cannot store; the xlsx parse still stands
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
@@ -0,0 +1,213 @@
+from django.utils.dateparse import parse_date
+
+from .lazy import np, pd
+from .models import Customer, Loan
+
+REQUIRED_CUSTOMER_COLUMNS = ['customer_id', 'first_name', 'last_name', 'phone_number', 'monthly_salary', 'approved_limit']
+CUSTOMER_FIELDS = REQUIRED_CUSTOMER_COLUMNS + ['age']
+REQUIRED_LOAN_COLUMNS = ['customer_id', 'loan_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_payment', 'emis_paid_on_time', 'start_date', 'end_date']
+
+NAME_COLUMNS = ['first_name', 'last_name']
+
+
+class RowError(Exception):
+    """A source row that cannot be converted into a model instance"""
+
+
+def map_customer_columns(columns):
+    """Map customer sheet headers onto model field names"""
+    mapping = {}
+    for col in columns:
+        col_lower = str(col).lower().strip()
+        if 'customer' in col_lower and 'id' in col_lower:
+            mapping[col] = 'customer_id'
+        elif 'first' in col_lower and 'name' in col_lower:
+            mapping[col] = 'first_name'
+        elif 'last' in col_lower and 'name' in col_lower:
+            mapping[col] = 'last_name'
+        elif 'age' in col_lower:
+            mapping[col] = 'age'
+        elif 'phone' in col_lower:
+            mapping[col] = 'phone_number'
+        elif 'salary' in col_lower:
+            mapping[col] = 'monthly_salary'
+        elif 'limit' in col_lower:
+            mapping[col] = 'approved_limit'
+    return mapping
+
+
+def map_loan_columns(columns):
+    """Map loan sheet headers onto ingestion field names"""
+    mapping = {}
+    for col in columns:
+        col_lower = str(col).lower().strip()
+        if 'customer' in col_lower and 'id' in col_lower:
+            mapping[col] = 'customer_id'
+        elif 'loan' in col_lower and 'id' in col_lower:
+            mapping[col] = 'loan_id'
+        elif 'loan' in col_lower and 'amount' in col_lower:
+            mapping[col] = 'loan_amount'
+        elif 'tenure' in col_lower:
+            mapping[col] = 'tenure'
+        elif 'interest' in col_lower and 'rate' in col_lower:
+            mapping[col] = 'interest_rate'
+        elif 'monthly' in col_lower and 'payment' in col_lower:
+            mapping[col] = 'monthly_payment'
+        elif 'emis' in col_lower and ('paid' in col_lower or 'time' in col_lower):
+            mapping[col] = 'emis_paid_on_time'
+        elif ('start' in col_lower and 'date' in col_lower) or ('date' in col_lower and 'approval' in col_lower):
+            mapping[col] = 'start_date'
+        elif 'end' in col_lower and 'date' in col_lower:
+            mapping[col] = 'end_date'
+    return mapping
+
+
+def iter_source_chunks(path, chunk_size):
+    """
+    Stream a CSV (optionally gzipped), xlsx or Parquet file as DataFrames of
+    at most ``chunk_size`` rows, without loading the whole file.
+    """
+    lower = str(path).lower()
+    if lower.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif lower.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame(batch, columns=header)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=header)
+        finally:
+            workbook.close()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def missing_columns(df, required):
+    return [col for col in required if col not in df.columns]
+
+
+def source_columns(mapping, fields):
+    """Source headers to load for ``fields``, taking the first header mapped to each field"""
+    selected = {}
+    for source, field in mapping.items():
+        if field in fields and field not in selected:
+            selected[field] = source
+    return list(selected.values())
+
+
+def compact_frame(df, categorical=()):
+    """
+    Shrink a mapped frame in place: integer columns are downcast to the
+    smallest integer dtype that holds them and name columns become
+    categoricals. Float columns are left alone so amounts and rates keep
+    full precision.
+    """
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in categorical:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def first_occurrence_positions(df, key):
+    """Row positions of the first occurrence of each ``key`` value, in file order"""
+    return np.flatnonzero(~df.duplicated(subset=[key], keep='first').to_numpy())
+
+
+def parse_date_value(value):
+    """Parse a sheet cell into a date, returning None when it is empty or unparseable"""
+    if pd.isna(value):
+        return None
+    value_str = str(value)
+    if not value_str or value_str == 'nan':
+        return None
+    if len(value_str) == 10 and value_str.count('-') == 2:
+        return parse_date(value_str)
+    try:
+        return pd.to_datetime(value).date()
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_date_column(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return [None if pd.isna(value) else value.date() for value in series]
+    return [parse_date_value(value) for value in series]
+
+
+def parse_loan_dates(chunk):
+    """Return ``chunk`` with start and end dates parsed into ``date`` objects (None when unparseable)"""
+    return chunk.assign(
+        start_date=_parse_date_column(chunk['start_date']),
+        end_date=_parse_date_column(chunk['end_date']),
+    )
+
+
+def build_customers(chunk):
+    """Convert a chunk of mapped customer rows into unsaved Customer instances"""
+    customers = []
+    for row in chunk.itertuples(index=False):
+        try:
+            customers.append(Customer(
+                customer_id=int(row.customer_id),
+                first_name=str(row.first_name).strip(),
+                last_name=str(row.last_name).strip(),
+                phone_number=int(row.phone_number),
+                monthly_salary=float(row.monthly_salary),
+                approved_limit=float(row.approved_limit),
+                age=int(row.age) if hasattr(row, 'age') and not pd.isna(row.age) else None,
+            ))
+        except (ValueError, TypeError) as e:
+            raise RowError(f"Error creating customer {getattr(row, 'customer_id', 'unknown')}: {str(e)}")
+    return customers
+
+
+def build_loans(chunk, known_customer_ids):
+    """
+    Convert a chunk of mapped loan rows into unsaved Loan instances.
+
+    Dates must already be parsed with ``parse_loan_dates``. Returns the
+    loans and the number of rows skipped because the customer is unknown
+    or a date could not be parsed.
+    """
+    loans = []
+    skipped = 0
+    for row in chunk.itertuples(index=False):
+        try:
+            customer_id = int(row.customer_id)
+            if customer_id not in known_customer_ids:
+                skipped += 1
+                continue
+
+            if row.start_date is None or row.end_date is None:
+                skipped += 1
+                continue
+
+            loans.append(Loan(
+                customer_id=customer_id,
+                loan_id=int(row.loan_id),
+                loan_amount=float(row.loan_amount),
+                tenure=int(row.tenure),
+                interest_rate=float(row.interest_rate),
+                monthly_repayment=float(row.monthly_payment),
+                emis_paid_on_time=int(row.emis_paid_on_time),
+                start_date=row.start_date,
+                end_date=row.end_date,
+            ))
+        except (ValueError, TypeError) as e:
+            raise RowError(f"Error creating loan {getattr(row, 'loan_id', 'unknown')}: {str(e)}")
+    return loans, skipped
@@ -0,0 +1,96 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+
+
+def process_path(path, pid):
+    """The file one process writes for the log at ``path``: ``slow.jsonl`` becomes ``slow.<pid>.jsonl``"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{pid}{ext}'
+
+
+def _with_backups(name):
+    """``name`` and its rotated backups, oldest first"""
+    backups = [backup for backup in glob.glob(f'{glob.escape(name)}.*') if backup.rsplit('.', 1)[1].isdigit()]
+    backups.sort(key=lambda backup: -int(backup.rsplit('.', 1)[1]))
+    return backups + ([name] if os.path.exists(name) else [])
+
+
+class JsonlLog:
+    """
+    Append-only JSONL log rotated by size with a few numbered backups.
+
+    Each process writes and rotates its own file, named after the log path
+    with its pid (see ``process_path``), so gunicorn and Celery processes
+    never rotate a file another one is appending to. A process forked with
+    the file already open starts its own file on its first write.
+
+    The path, size limit and backup count come from the named settings when
+    the file is first written; after ``close()`` the next write reopens it,
+    picking up changed settings. ``default`` serializes values json cannot.
+    Safe to write from several threads.
+    """
+
+    def __init__(self, path_setting, max_bytes_setting, backups_setting, default=str):
+        self.path_setting = path_setting
+        self.max_bytes_setting = max_bytes_setting
+        self.backups_setting = backups_setting
+        self.default = default
+        self._handler = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return getattr(settings, self.path_setting)
+
+    def _get_handler(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._handler is not None and self._pid != pid:
+                # inherited across a fork: the parent keeps writing its own file
+                self._handler.close()
+                self._handler = None
+            if self._handler is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._handler = RotatingFileHandler(
+                    process_path(self.path, pid),
+                    maxBytes=getattr(settings, self.max_bytes_setting),
+                    backupCount=getattr(settings, self.backups_setting),
+                )
+                self._pid = pid
+            return self._handler
+
+    def write(self, *records):
+        """Append one line per record; lines written together land in the same file"""
+        text = '\n'.join(json.dumps(record, default=self.default) for record in records)
+        self._get_handler().handle(logging.makeLogRecord({'msg': text}))
+
+    def close(self):
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+            self._handler = None
+
+    def files(self, path=None):
+        """Every file of the log: ``path`` itself, then each process's file, each with its backups oldest first"""
+        path = path or self.path
+        root, ext = os.path.splitext(path)
+        own_file = re.compile(re.escape(root) + r'\.\d+' + re.escape(ext) + '$')
+        process_files = sorted(name for name in glob.glob(f'{glob.escape(root)}.*{glob.escape(ext)}') if own_file.match(name))
+        return [name for base in [path] + process_files for name in _with_backups(base)]
+
+    def read(self, path=None):
+        """Every record in the log's files; records of one process come oldest first"""
+        for name in self.files(path):
+            with open(name) as log_file:
+                for line in log_file:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
@@ -0,0 +1,38 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stand-in for a heavy module, imported the first time one of its
+    attributes is used, so processes that never touch it (web workers,
+    most management commands) do not pay for loading it.
+
+    Attribute writes and deletes go to the real module too, so patching
+    ``core.tasks.pd.read_excel`` still patches ``pandas.read_excel``.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        if self._module is None:
+            object.__setattr__(self, '_module', importlib.import_module(self._name))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
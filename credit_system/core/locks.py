@@ -0,0 +1,40 @@
+import uuid
+
+from django.core.cache import cache
+
+
+class CacheLock:
+    """
+    Best-effort distributed lock on top of the shared cache.
+
+    ``cache.add`` is atomic on Redis and memcached, so only one holder can
+    create the key. The key expires after ``timeout`` seconds so a crashed
+    holder cannot block others forever; long-running holders call
+    ``refresh()`` to extend it.
+    """
+
+    def __init__(self, name, timeout):
+        self.key = f"lock:{name}"
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    def acquire(self):
+        self.acquired = cache.add(self.key, self.token, self.timeout)
+        return self.acquired
+
+    def refresh(self):
+        if self.acquired:
+            cache.touch(self.key, self.timeout)
+
+    def release(self):
+        if self.acquired and cache.get(self.key) == self.token:
+            cache.delete(self.key)
+        self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_closed_loans
+
+
+class Command(BaseCommand):
+    help = 'Move closed loans from the loan table into the archive, keeping credit scores unchanged'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Loans per transaction (default: LOAN_ARCHIVE_BATCH_SIZE setting)',
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size'] or settings.LOAN_ARCHIVE_BATCH_SIZE
+        self.stdout.write(self.style.NOTICE('Loan archival started...'))
+        archived = archive_closed_loans(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} closed loans'))
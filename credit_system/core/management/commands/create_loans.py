@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.origination import process_applications_file
+
+
+class Command(BaseCommand):
+    help = 'Decide and book a file of loan applications (CSV, xlsx or Parquet) in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Loan applications file')
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Where to write per-application results (default: <path>.results.csv)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Applications per transaction (default: LOAN_BATCH_MAX_SIZE setting)',
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        output = kwargs['output'] or f'{path}.results.csv'
+        chunk_size = kwargs['chunk_size'] or settings.LOAN_BATCH_MAX_SIZE
+
+        self.stdout.write(self.style.NOTICE('Loan batch started...'))
+        try:
+            summary = process_applications_file(path, output, chunk_size)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not process {path}: {exc}')
+        self.stdout.write(self.style.SUCCESS(summary))
+        self.stdout.write(f'Results written to {output}')
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from core.tasks import ingest_repayment_feed
+
+
+class Command(BaseCommand):
+    help = 'Apply a daily repayment feed (CSV or xlsx) to loan EMI counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Repayment feed file')
+        parser.add_argument(
+            '--rejects',
+            default=None,
+            help='Where to write the rejects report (default: <path>.rejects.csv)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows per transaction (default: REPAYMENT_FEED_CHUNK_SIZE setting)',
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='run_async',
+            help='Enqueue the feed on a Celery worker instead of running it inline',
+        )
+
+    def handle(self, *args, **kwargs):
+        task_args = (kwargs['path'], kwargs['rejects'], kwargs['chunk_size'])
+
+        if kwargs['run_async']:
+            result = ingest_repayment_feed.delay(*task_args)
+            self.stdout.write(self.style.SUCCESS(f'Repayment feed enqueued. Task: {result.id}'))
+            return
+
+        self.stdout.write(self.style.NOTICE('Repayment feed started...'))
+        result = ingest_repayment_feed(*task_args)
+        if result.startswith('Repayment feed complete'):
+            self.stdout.write(self.style.SUCCESS(result))
+        else:
+            self.stdout.write(self.style.ERROR(result))
@@ -1,14 +1,84 @@
+import json
+import os
+
 from django.core.management.base import BaseCommand
+from core.models import IngestionJob
+from core.profiling import format_table
 from core.tasks import ingest_data  
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Reload from scratch even if the source files match the generation already in the database',
+        )
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='run_async',
+            help='Enqueue the ingestion on a Celery worker instead of running it inline',
+        )
+        parser.add_argument(
+            '--lean',
+            action='store_true',
+            default=None,
+            help='Load only the mapped columns in compact dtypes (default: INGEST_LEAN_LOADING setting)',
+        )
+        parser.add_argument(
+            '--customer-file',
+            default=None,
+            help='Customer source (xlsx, CSV, CSV.gz or Parquet; default: data/customer_data.xlsx)',
+        )
+        parser.add_argument(
+            '--loan-file',
+            default=None,
+            help='Loan source (xlsx, CSV, CSV.gz or Parquet; default: data/loan_data.xlsx)',
+        )
+        parser.add_argument(
+            '--profile',
+            nargs='?',
+            const='ingest-profile.json',
+            default=None,
+            metavar='PATH',
+            help='Record per-stage time, rows and peak memory and write them as JSON (default: ingest-profile.json)',
+        )
+
     def handle(self, *args, **kwargs):
+        options = {
+            'force': kwargs['force'],
+            'profile': kwargs['profile'],
+            'lean': kwargs['lean'],
+            'customer_file': kwargs['customer_file'],
+            'loan_file': kwargs['loan_file'],
+        }
+        if kwargs['run_async']:
+            result = ingest_data.delay(**options)
+            self.stdout.write(self.style.SUCCESS(
+                f'Data ingestion enqueued. Task: {result.id} (progress at /api/ingest-status/{result.id})'
+            ))
+            return
+
         self.stdout.write(self.style.NOTICE('Data ingestion started...'))
         
         try:
-            result = ingest_data()
+            result = ingest_data(**options)
             self.stdout.write(self.style.SUCCESS(f'Data ingestion completed. Result: {result}'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error during data ingestion: {e}'))
+            return
+
+        job = IngestionJob.objects.order_by('-id').first()
+        if job is not None and job.message == result:
+            progress = job.progress()
+            self.stdout.write(
+                f"Job {job.task_id}: {progress['rows_done']}/{progress['rows_total']} rows, "
+                f"{progress['rows_per_sec']} rows/sec, attempt {job.attempts}"
+            )
 
+        if kwargs['profile'] and os.path.exists(kwargs['profile']):
+            with open(kwargs['profile']) as fh:
+                report = json.load(fh)
+            self.stdout.write(format_table(report))
+            self.stdout.write(f"Profile written to {kwargs['profile']}")
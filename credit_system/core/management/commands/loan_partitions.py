@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from core import partitions
+
+
+class Command(BaseCommand):
+    help = 'List, create, detach or attach the yearly partitions of the loan table (Postgres only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'ensure', 'detach', 'attach'])
+        parser.add_argument('--year', type=int, default=None, help='Partition year for detach and attach')
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop the partition table after detaching it instead of keeping its rows',
+        )
+
+    def handle(self, *args, **kwargs):
+        if not partitions.is_partitioned():
+            raise CommandError('The loan table is not partitioned on this database')
+
+        action = kwargs['action']
+        year = kwargs['year']
+        if action in ('detach', 'attach') and year is None:
+            raise CommandError(f'{action} needs --year')
+
+        try:
+            if action == 'list':
+                for name, bound in partitions.list_partitions():
+                    self.stdout.write(f'{name}: {bound}')
+            elif action == 'ensure':
+                created = partitions.ensure_partitions()
+                self.stdout.write(self.style.SUCCESS(
+                    f"Created {', '.join(created)}" if created else 'Loan partitions up to date'
+                ))
+            elif action == 'detach':
+                partitions.detach_partition(partitions.partition_name(year), drop=kwargs['drop'])
+                self.stdout.write(self.style.SUCCESS(f'Detached {partitions.partition_name(year)}'))
+            else:
+                partitions.attach_partition(partitions.partition_name(year), year)
+                self.stdout.write(self.style.SUCCESS(f'Attached {partitions.partition_name(year)}'))
+        except DatabaseError as exc:
+            raise CommandError(str(exc))
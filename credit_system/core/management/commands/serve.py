@@ -0,0 +1,56 @@
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+CONFIG_PATH = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+ASGI_WORKER = 'uvicorn_worker.UvicornWorker'
+
+
+def gunicorn_argv(options):
+    """Command line for gunicorn from the serve options; unset options fall back to gunicorn.conf.py"""
+    argv = [sys.executable, '-m', 'gunicorn', '--config', CONFIG_PATH]
+    if options.get('bind'):
+        argv += ['--bind', options['bind']]
+    if options.get('workers'):
+        argv += ['--workers', str(options['workers'])]
+    if options.get('threads'):
+        argv += ['--threads', str(options['threads'])]
+    if options.get('max_requests') is not None:
+        argv += ['--max-requests', str(options['max_requests'])]
+    if options.get('no_preload'):
+        argv += ['--no-preload']
+    if options.get('asgi'):
+        argv += ['--worker-class', ASGI_WORKER, 'credit_system.asgi:application']
+    else:
+        argv += ['credit_system.wsgi:application']
+    return argv
+
+
+class Command(BaseCommand):
+    help = 'Serve the API with gunicorn: one preforked worker per CPU, recycled and warmed up before taking traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default=None, help='Address to listen on (default: 0.0.0.0:8000)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--threads', type=int, default=None, help='Threads per WSGI worker (default: 1)')
+        parser.add_argument(
+            '--max-requests',
+            type=int,
+            default=None,
+            help='Requests before a worker is replaced, 0 to never recycle (default: 5000)',
+        )
+        parser.add_argument('--asgi', action='store_true', help='Serve credit_system/asgi.py with uvicorn workers')
+        parser.add_argument(
+            '--no-preload',
+            action='store_true',
+            help='Load the app in each worker instead of the master, so HUP also reloads code',
+        )
+
+    def handle(self, *args, **kwargs):
+        argv = gunicorn_argv(kwargs)
+        self.stdout.write(self.style.NOTICE(f"Starting gunicorn: {' '.join(argv[1:])}"))
+        self.stdout.flush()
+        # gunicorn becomes this process, so signals from the container reach its master
+        os.execv(sys.executable, argv)
@@ -0,0 +1,45 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import read_records, summarize
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log: the statements costing the most time, with their callers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Log to read (default: SLOW_QUERY_LOG_PATH setting)')
+        parser.add_argument('--limit', type=int, default=10, help='Statements to show (default: 10)')
+        parser.add_argument(
+            '--sort',
+            choices=['total', 'max', 'count'],
+            default='total',
+            help='Rank by total time, slowest single run or number of slow runs (default: total)',
+        )
+        parser.add_argument('--explain', action='store_true', help='Print the captured plan of each statement')
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path'] or settings.SLOW_QUERY_LOG_PATH
+        groups = summarize(read_records(path), kwargs['sort'])
+        if not groups:
+            self.stdout.write(self.style.NOTICE(f'No slow queries logged in {path}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(group['count'] for group in groups)} slow statements, {len(groups)} distinct"
+        ))
+        for rank, group in enumerate(groups[:kwargs['limit']], start=1):
+            sources = ', '.join(
+                f'{source} ({count})'
+                for source, count in sorted(group['sources'].items(), key=lambda item: -item[1])
+            )
+            self.stdout.write(
+                f"\n#{rank} {group['fingerprint']}: {group['count']} runs, total {group['total_ms']} ms, "
+                f"mean {group['mean_ms']} ms, max {group['max_ms']} ms"
+            )
+            self.stdout.write(f'  from: {sources}')
+            self.stdout.write(f"  sql:  {group['sql']}")
+            if kwargs['explain'] and group['explain'] is not None:
+                self.stdout.write('  plan: ' + json.dumps(group['explain'], indent=2).replace('\n', '\n  '))
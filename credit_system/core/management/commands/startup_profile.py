@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup import BOOT_TARGETS, budget_violations, by_package, measure
+
+
+class Command(BaseCommand):
+    help = 'Boot a web worker, Celery worker or management command in a fresh interpreter and report its import costs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(BOOT_TARGETS), default='web', help='Process to boot (default: web)')
+        parser.add_argument('--limit', type=int, default=20, help='Rows to show (default: 20)')
+        parser.add_argument(
+            '--by',
+            choices=['module', 'package'],
+            default='package',
+            help='Rank single modules by cumulative time, or top-level packages by their summed self time',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Fail when the boot breaks the STARTUP_BUDGET_* settings or imports a STARTUP_LAZY_MODULES module',
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            report = measure(kwargs['target'], importtime=True)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['target']}: cold start {report['wall_seconds']}s (with -X importtime), "
+            f"peak RSS {report['max_rss_kb'] // 1024} MiB, {len(report['modules'])} modules imported"
+        ))
+        if kwargs['by'] == 'package':
+            rows = by_package(report['modules'])
+            key = 'self_us'
+        else:
+            rows = sorted(report['modules'], key=lambda row: -row['cumulative_us'])
+            key = 'cumulative_us'
+        width = max((len(row['module']) for row in rows[:kwargs['limit']]), default=0)
+        for row in rows[:kwargs['limit']]:
+            self.stdout.write(f"  {row['module'].ljust(width)}  {row[key] / 1000:8.1f} ms")
+
+        if kwargs['check']:
+            # -X importtime itself slows the boot, so the time budget is checked on a clean run
+            violations = budget_violations({**measure(kwargs['target']), 'max_rss_kb': report['max_rss_kb']})
+            if violations:
+                raise CommandError('Startup budget exceeded: ' + '; '.join(violations))
+            self.stdout.write(self.style.SUCCESS('Within the startup budget'))
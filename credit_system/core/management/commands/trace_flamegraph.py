@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tracing import folded_stacks, read_spans
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold the sampled traces into flame-graph stacks ("root;child;leaf microseconds" per line), '
+        'ready for flamegraph.pl or speedscope'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Trace log to read (default: TRACE_LOG_PATH setting)')
+        parser.add_argument('--output', default=None, help='File to write the stacks to (default: stdout)')
+        parser.add_argument(
+            '--name',
+            default=None,
+            help='Only traces whose root span name contains this, e.g. CreateLoanView or ingest_data',
+        )
+        parser.add_argument(
+            '--min-ms',
+            type=float,
+            default=0,
+            help='Only traces that took at least this long, to see what dominates slow requests',
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path'] or settings.TRACE_LOG_PATH
+        traces = {}
+        for span in read_spans(path):
+            traces.setdefault(span['trace_id'], []).append(span)
+
+        spans = []
+        kept = 0
+        for trace_spans in traces.values():
+            root = next((span for span in trace_spans if span['parent_id'] is None), None)
+            if root is None:
+                continue
+            if kwargs['name'] and kwargs['name'] not in root['name']:
+                continue
+            if root['duration_ms'] < kwargs['min_ms']:
+                continue
+            spans.extend(trace_spans)
+            kept += 1
+
+        if not kept:
+            self.stderr.write(self.style.NOTICE(f'No matching traces in {path}'))
+            return
+
+        lines = [f'{stack} {self_us}' for stack, self_us in sorted(folded_stacks(spans).items())]
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as output:
+                output.write('\n'.join(lines) + '\n')
+        else:
+            for line in lines:
+                self.stdout.write(line)
+        # the summary goes to stderr so stdout can be piped straight into flamegraph.pl
+        self.stderr.write(self.style.SUCCESS(f'Folded {kept} traces into {len(lines)} stacks'))
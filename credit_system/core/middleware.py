@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from . import admission, db_routers, slow_queries, tracing
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+def _wrote(request, response):
+    """Whether the request was a successful write; views that only read set ``writes_data = False``"""
+    if request.method in SAFE_METHODS or response.status_code >= 400:
+        return False
+    match = getattr(request, 'resolver_match', None)
+    view = getattr(match.func, 'view_class', None) if match is not None else None
+    return getattr(view, 'writes_data', True)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for replica routing: for REPLICA_STICKY_SECONDS after a
+    client's successful write, its reads stay on the primary. Read-only POST
+    endpoints such as check-eligibility do not count as writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        client = db_routers.client_key(request)
+        with db_routers.pinned_to_primary(db_routers.recently_wrote(client)):
+            response = self.get_response(request)
+
+        if _wrote(request, response):
+            db_routers.mark_wrote(client)
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Load shedding for the routes grouped in ADMISSION_CLASSES. Each class
+    has its own in-flight cap, wait queue and per-client token buckets in
+    this worker, so a burst on one class cannot starve another. Requests
+    over a client's rate get 429; requests that would queue too long, or
+    arrive while the database pool is backed up, get 503. Both carry
+    Retry-After.
+    """
+
+    MESSAGES = {
+        admission.RATE_LIMITED: "Too many requests; slow down",
+        admission.OVERLOADED: "Server busy; retry shortly",
+    }
+    STATUSES = {
+        admission.RATE_LIMITED: 429,
+        admission.OVERLOADED: 503,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return self.get_response(request)
+        try:
+            route_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return self.get_response(request)
+
+        controller = admission.get_controller()
+        route_class = controller.route_class(route_name)
+        if route_class is None:
+            return self.get_response(request)
+
+        outcome, retry_after = controller.admit(route_class, db_routers.client_key(request))
+        if outcome != admission.ADMITTED:
+            response = JsonResponse({"error": self.MESSAGES[outcome]}, status=self.STATUSES[outcome])
+            response['Retry-After'] = str(retry_after)
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            route_class.release()
+
+
+def _core_view_name(request):
+    """Dotted name of the core.views view handling the request, or None for any other route"""
+    try:
+        view = resolve(request.path_info).func
+    except Resolver404:
+        return None
+    view = getattr(view, 'view_class', view)
+    if view.__module__ != 'core.views':
+        return None
+    return f'{view.__module__}.{view.__qualname__}'
+
+
+class SlowQueryLogMiddleware:
+    """Tag the statements of requests handled by core.views for the slow-query log (see SLOW_QUERY_LOG_ENABLED)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            return self.get_response(request)
+        view_name = _core_view_name(request)
+        if view_name is None:
+            return self.get_response(request)
+        with slow_queries.capture(view_name):
+            return self.get_response(request)
+
+
+class TracingMiddleware:
+    """
+    Trace a TRACE_SAMPLE_RATE share of requests to core.views: the request
+    is the root span, ORM queries and instrumented code nest under it, and
+    rendering the response gets its own span.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.TRACE_SAMPLE_RATE <= 0:
+            return self.get_response(request)
+        view_name = _core_view_name(request)
+        if view_name is None:
+            return self.get_response(request)
+
+        root = tracing.start_trace(view_name, method=request.method, path=request.path)
+        if root is None:
+            return self.get_response(request)
+        status = None
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            root.finish(status=status)
+
+    def process_template_response(self, request, response):
+        render = tracing.start_span('render')
+        if render is not None:
+            response.add_post_render_callback(lambda rendered: render.finish())
+        return response
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('customers_loaded', models.IntegerField(default=0)),
+                ('loans_loaded', models.IntegerField(default=0)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
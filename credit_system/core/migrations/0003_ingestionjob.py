@@ -0,0 +1,35 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ingestiongeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(db_index=True, max_length=64)),
+                ('generation', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('stage', models.CharField(default='customers', max_length=20)),
+                ('customers_total', models.IntegerField(default=0)),
+                ('loans_total', models.IntegerField(default=0)),
+                ('customer_offset', models.IntegerField(default=0)),
+                ('loan_offset', models.IntegerField(default=0)),
+                ('loans_created', models.IntegerField(default=0)),
+                ('loans_skipped', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=1)),
+                ('rows_at_resume', models.IntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('resumed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepaymentEvent',
+            fields=[
+                ('event_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('loan_id', models.IntegerField(db_index=True)),
+                ('emis_paid', models.IntegerField(default=1)),
+                ('paid_on_time', models.BooleanField(default=True)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
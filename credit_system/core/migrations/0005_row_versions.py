@@ -0,0 +1,22 @@
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_repaymentevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='loans_version',
+            field=models.BigIntegerField(default=core.models.new_version),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='version',
+            field=models.BigIntegerField(default=core.models.new_version),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations
+
+# Postgres only: core_loan becomes a table partitioned by end_date, one partition per year
+# plus a default one. A partitioned table's primary key has to include the partition key,
+# so the key is (loan_id, end_date); loan ids stay unique because new ones come from
+# ids.allocate_ids and ingestion drops duplicate ids before loading.
+
+
+def partition_loans(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE core_loan_partitioned (LIKE core_loan INCLUDING DEFAULTS) PARTITION BY RANGE (end_date)'
+        )
+        cursor.execute('ALTER TABLE core_loan_partitioned ADD CONSTRAINT core_loan_pk PRIMARY KEY (loan_id, end_date)')
+        cursor.execute('CREATE INDEX core_loan_by_customer ON core_loan_partitioned (customer_id)')
+        cursor.execute(
+            'ALTER TABLE core_loan_partitioned ADD CONSTRAINT core_loan_customer_fk FOREIGN KEY (customer_id) '
+            'REFERENCES core_customer (customer_id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute('CREATE TABLE core_loan_default PARTITION OF core_loan_partitioned DEFAULT')
+
+        cursor.execute('SELECT EXTRACT(YEAR FROM MIN(end_date)), EXTRACT(YEAR FROM MAX(end_date)) FROM core_loan')
+        first_year, last_year = cursor.fetchone()
+        this_year = date.today().year
+        first_year = min(int(first_year or this_year), this_year)
+        last_year = max(int(last_year or this_year), this_year + getattr(settings, 'LOAN_PARTITION_YEARS_AHEAD', 5))
+        for year in range(first_year, last_year + 1):
+            cursor.execute(
+                f'CREATE TABLE core_loan_y{year} PARTITION OF core_loan_partitioned FOR VALUES FROM (%s) TO (%s)',
+                [date(year, 1, 1), date(year + 1, 1, 1)],
+            )
+
+        cursor.execute('INSERT INTO core_loan_partitioned SELECT * FROM core_loan')
+        cursor.execute('DROP TABLE core_loan')
+        cursor.execute('ALTER TABLE core_loan_partitioned RENAME TO core_loan')
+
+
+def unpartition_loans(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE core_loan_plain (LIKE core_loan INCLUDING DEFAULTS)')
+        cursor.execute('INSERT INTO core_loan_plain SELECT * FROM core_loan')
+        cursor.execute('DROP TABLE core_loan CASCADE')
+        cursor.execute('ALTER TABLE core_loan_plain RENAME TO core_loan')
+        cursor.execute('ALTER TABLE core_loan ADD CONSTRAINT core_loan_pkey PRIMARY KEY (loan_id)')
+        cursor.execute('CREATE INDEX core_loan_by_customer ON core_loan (customer_id)')
+        cursor.execute(
+            'ALTER TABLE core_loan ADD CONSTRAINT core_loan_customer_fk FOREIGN KEY (customer_id) '
+            'REFERENCES core_customer (customer_id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_row_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_loans, unpartition_loans),
+    ]
@@ -0,0 +1,39 @@
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_partition_loans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoanHistory',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_history', serialize=False, to='core.customer')),
+                ('loan_count', models.IntegerField(default=0)),
+                ('total_tenure', models.BigIntegerField(default=0)),
+                ('total_emis_paid', models.BigIntegerField(default=0)),
+                ('total_amount', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.FloatField()),
+                ('tenure', models.IntegerField()),
+                ('interest_rate', models.FloatField()),
+                ('monthly_repayment', models.FloatField()),
+                ('emis_paid_on_time', models.IntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('version', models.BigIntegerField(default=core.models.new_version)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='core.customer')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decision_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('decided', 'Decided'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('customer_id', models.IntegerField()),
+                ('loan_amount', models.FloatField()),
+                ('interest_rate', models.FloatField()),
+                ('tenure', models.IntegerField()),
+                ('loan_id', models.IntegerField(blank=True, null=True)),
+                ('loan_approved', models.BooleanField(blank=True, null=True)),
+                ('message', models.TextField(blank=True)),
+                ('monthly_installment', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='core_loande_status_39168d_idx')],
+            },
+        ),
+    ]
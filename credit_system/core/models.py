@@ -1,4 +1,15 @@
+import time
+import uuid
+from datetime import date
+
 from django.db import models
+from django.utils import timezone
+
+
+def new_version():
+    """Row version stamp in nanoseconds since the epoch, so it keeps increasing across reloads"""
+    return time.time_ns()
+
 
 class Customer(models.Model):
     customer_id = models.IntegerField(primary_key=True)
@@ -8,11 +19,21 @@ class Customer(models.Model):
     monthly_salary = models.FloatField()
     approved_limit = models.FloatField()
     age = models.IntegerField(null=True, blank=True)
-
+    # bumped whenever one of the customer's loans is created or changes
+    loans_version = models.BigIntegerField(default=new_version)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+class LoanQuerySet(models.QuerySet):
+    def active(self, today=None):
+        """
+        Loans still running on ``today``. Filtering on the partition key lets
+        Postgres skip the partitions of loans that ended in earlier years.
+        """
+        return self.filter(end_date__gte=today or date.today())
+
+
 class Loan(models.Model):
     loan_id = models.IntegerField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loans')
@@ -23,6 +44,173 @@ class Loan(models.Model):
     emis_paid_on_time = models.IntegerField()
     start_date = models.DateField()
     end_date = models.DateField()
+    version = models.BigIntegerField(default=new_version)
+
+    objects = LoanQuerySet.as_manager()
 
     def __str__(self):
         return f"Loan #{self.loan_id} for {self.customer.first_name}"
+
+
+class ArchivedLoan(models.Model):
+    """A closed loan moved out of the hot Loan table by the archival job"""
+    loan_id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_amount = models.FloatField()
+    tenure = models.IntegerField()
+    interest_rate = models.FloatField()
+    monthly_repayment = models.FloatField()
+    emis_paid_on_time = models.IntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()
+    version = models.BigIntegerField(default=new_version)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived loan #{self.loan_id}"
+
+
+class CustomerLoanHistory(models.Model):
+    """
+    Running totals of a customer's archived loans, added to the live loan
+    aggregates so archiving leaves the credit score unchanged.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='loan_history')
+    loan_count = models.IntegerField(default=0)
+    total_tenure = models.BigIntegerField(default=0)
+    total_emis_paid = models.BigIntegerField(default=0)
+    total_amount = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Loan history of customer #{self.customer_id}"
+
+
+class RepaymentEvent(models.Model):
+    """A repayment applied to a loan, keyed by the sender's event id so retries are no-ops"""
+    event_id = models.CharField(max_length=100, primary_key=True)
+    # plain column rather than a foreign key: the event log outlives reloads of the loan table
+    loan_id = models.IntegerField(db_index=True)
+    emis_paid = models.IntegerField(default=1)
+    paid_on_time = models.BooleanField(default=True)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Repayment {self.event_id} for loan #{self.loan_id}"
+
+
+class IngestionGeneration(models.Model):
+    """Fingerprint of the source files loaded by a completed ingestion run"""
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    customers_loaded = models.IntegerField(default=0)
+    loans_loaded = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Generation {self.fingerprint[:12]}"
+
+
+class IngestionJob(models.Model):
+    """Checkpoint and progress of an ingestion run, resumable after a crash"""
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    STAGE_CUSTOMERS = 'customers'
+    STAGE_LOANS = 'loans'
+    STAGE_DONE = 'done'
+
+    task_id = models.CharField(max_length=64, db_index=True)
+    generation = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    stage = models.CharField(max_length=20, default=STAGE_CUSTOMERS)
+    customers_total = models.IntegerField(default=0)
+    loans_total = models.IntegerField(default=0)
+    customer_offset = models.IntegerField(default=0)
+    loan_offset = models.IntegerField(default=0)
+    loans_created = models.IntegerField(default=0)
+    loans_skipped = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=1)
+    rows_at_resume = models.IntegerField(default=0)
+    message = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    resumed_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def rows_total(self):
+        return self.customers_total + self.loans_total
+
+    @property
+    def rows_done(self):
+        return self.customer_offset + self.loan_offset
+
+    def progress(self):
+        """Rows done, percent, throughput and ETA of the current attempt"""
+        rows_total = self.rows_total
+        rows_done = self.rows_done
+        end = self.finished_at or timezone.now()
+        elapsed = max((end - self.resumed_at).total_seconds(), 0)
+        rows_this_attempt = rows_done - self.rows_at_resume
+        rows_per_sec = rows_this_attempt / elapsed if elapsed > 0 else 0.0
+        remaining = rows_total - rows_done
+        if self.status != self.STATUS_RUNNING:
+            eta = 0.0 if self.status == self.STATUS_SUCCEEDED else None
+        else:
+            eta = remaining / rows_per_sec if rows_per_sec > 0 else None
+        return {
+            'rows_done': rows_done,
+            'rows_total': rows_total,
+            'percent': round(100.0 * rows_done / rows_total, 1) if rows_total else 0.0,
+            'rows_per_sec': round(rows_per_sec, 1),
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+        }
+
+    def __str__(self):
+        return f"Ingestion {self.task_id} ({self.status})"
+
+
+class LoanDecision(models.Model):
+    """A loan application submitted asynchronously, queued until a worker decides it"""
+    STATUS_PENDING = 'pending'
+    STATUS_DECIDED = 'decided'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DECIDED, 'Decided'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    decision_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # the application; customer_id is not a foreign key so the decision survives a fresh ingestion
+    customer_id = models.IntegerField()
+    loan_amount = models.FloatField()
+    interest_rate = models.FloatField()
+    tenure = models.IntegerField()
+    # the outcome, filled in once decided
+    loan_id = models.IntegerField(null=True, blank=True)
+    loan_approved = models.BooleanField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    monthly_installment = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def application(self):
+        return {
+            'customer_id': self.customer_id,
+            'loan_amount': self.loan_amount,
+            'interest_rate': self.interest_rate,
+            'tenure': self.tenure,
+        }
+
+    def __str__(self):
+        return f"Loan decision {self.decision_id} ({self.status})"
@@ -0,0 +1,242 @@
+import csv
+from collections import defaultdict
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+
+from . import scoring, versions
+from .ids import allocate_ids
+from .ingestion import iter_source_chunks, map_loan_columns
+from .lazy import np, pd
+from .models import Customer, Loan
+from .serializers import CreateLoanRequestSerializer
+
+APPROVED_MESSAGE = "Loan approved successfully"
+CUSTOMER_NOT_FOUND = "Customer not found"
+
+RESULT_FIELDS = ['row', 'customer_id', 'loan_id', 'loan_approved', 'message', 'monthly_installment']
+
+
+def monthly_installments(loan_amounts, annual_interest_rates, tenures):
+    """``scoring.monthly_installment`` over whole arrays of applications"""
+    amounts = np.asarray(loan_amounts, dtype=np.float64)
+    rates = np.asarray(annual_interest_rates, dtype=np.float64) / (12 * 100)
+    tenures = np.asarray(tenures, dtype=np.float64)
+    growth = (1 + rates) ** tenures
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amortized = amounts * rates * growth / (growth - 1)
+    return np.where(rates == 0, amounts / tenures, amortized)
+
+
+def approval_decisions(current_emis, monthly_salaries, credit_scores, projected_emis, interest_rates):
+    """``scoring.approval_decision`` over whole arrays; returns (approved, corrected_rates)"""
+    current_emis = np.asarray(current_emis, dtype=np.float64)
+    salaries = np.asarray(monthly_salaries, dtype=np.float64)
+    scores = np.asarray(credit_scores, dtype=np.float64)
+    rates = np.asarray(interest_rates, dtype=np.float64)
+
+    affordable = current_emis + projected_emis <= salaries * 0.5
+    approved = affordable & (scores > 10)
+    corrected = np.select(
+        [scores > 50, scores > 30, scores > 10],
+        [rates, np.maximum(rates, 12), np.maximum(rates, 16)],
+        default=rates,
+    )
+    return approved, np.where(affordable, corrected, rates)
+
+
+def _rounds(applications):
+    """
+    Split applications into rounds holding at most one application per
+    customer, keeping each customer's applications in input order.
+    """
+    seen = defaultdict(int)
+    rounds = defaultdict(list)
+    for position, application in enumerate(applications):
+        rounds[seen[application['customer_id']]].append(position)
+        seen[application['customer_id']] += 1
+    return [rounds[number] for number in sorted(rounds)]
+
+
+def _add_loan(stats, loan_amount, tenure, monthly_repayment):
+    # a loan starting today is current and counts towards this year's activity
+    stats['loan_count'] += 1
+    stats['total_tenure'] += tenure
+    stats['total_amount'] += loan_amount
+    stats['current_year_loans'] += 1
+    stats['current_amount'] += loan_amount
+    stats['current_emi'] += monthly_repayment
+
+
+def decide(applications, customers, stats):
+    """
+    Decide a batch of applications against in-memory customer stats.
+
+    Applications are dicts with ``customer_id``, ``loan_amount``,
+    ``interest_rate`` and ``tenure`` for customers present in ``customers``.
+    Each round scores one application per customer at once; approvals
+    update ``stats`` so a customer's later applications see the EMI burden
+    of earlier ones. Returns one decision dict per application, in order.
+    """
+    decisions = [None] * len(applications)
+    scores = {}
+
+    for positions in _rounds(applications):
+        batch = [applications[position] for position in positions]
+        owners = [customers[application['customer_id']] for application in batch]
+        owner_stats = [stats[customer.customer_id] for customer in owners]
+
+        for customer, customer_stats in zip(owners, owner_stats):
+            if customer.customer_id not in scores:
+                scores[customer.customer_id] = scoring.credit_score_from_stats(customer_stats, customer.approved_limit)
+        credit_scores = [scores[customer.customer_id] for customer in owners]
+
+        amounts = [application['loan_amount'] for application in batch]
+        rates = [application['interest_rate'] for application in batch]
+        tenures = [application['tenure'] for application in batch]
+        current_emis = [customer_stats['current_emi'] for customer_stats in owner_stats]
+        salaries = [customer.monthly_salary for customer in owners]
+
+        projected = monthly_installments(amounts, rates, tenures)
+        approved, corrected = approval_decisions(current_emis, salaries, credit_scores, projected, rates)
+        installments = monthly_installments(amounts, corrected, tenures)
+
+        for offset, position in enumerate(positions):
+            customer = owners[offset]
+            if approved[offset]:
+                installment = round(float(installments[offset]), 2)
+                decisions[position] = {
+                    'approved': True,
+                    'interest_rate': float(corrected[offset]),
+                    'monthly_installment': installment,
+                    'message': APPROVED_MESSAGE,
+                }
+                _add_loan(owner_stats[offset], amounts[offset], tenures[offset], installment)
+                # the new loan changes the customer's score for their next application
+                scores.pop(customer.customer_id, None)
+            else:
+                decisions[position] = {
+                    'approved': False,
+                    'interest_rate': rates[offset],
+                    'monthly_installment': 0.0,
+                    'message': scoring.rejection_message(
+                        credit_scores[offset], current_emis[offset], customer.monthly_salary
+                    ),
+                }
+    return decisions
+
+
+def originate_loans(applications):
+    """
+    Decide and book many loan applications in one transaction.
+
+    Every affected customer is scored from one grouped aggregate query, the
+    approval rules run over the batch with numpy, approved loans take ids
+    from one contiguous block and are inserted with ``bulk_create``. Rows
+    that fail validation are reported with their errors. Returns one result
+    per input row, in order.
+    """
+    results = [None] * len(applications)
+    valid = {}
+    for index, row in enumerate(applications):
+        serializer = CreateLoanRequestSerializer(data=row)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = {'index': index, 'errors': serializer.errors}
+
+    with transaction.atomic():
+        customer_ids = {data['customer_id'] for data in valid.values()}
+        customers = Customer.objects.select_for_update().in_bulk(customer_ids)
+        stats = scoring.customer_loan_stats(list(customers))
+
+        indexes = [index for index in sorted(valid) if valid[index]['customer_id'] in customers]
+        decisions = decide([valid[index] for index in indexes], customers, stats)
+
+        approved = [(index, decision) for index, decision in zip(indexes, decisions) if decision['approved']]
+        loan_ids = {}
+        if approved:
+            first_id = allocate_ids(Loan, len(approved))
+            start_date = date.today()
+            loans = []
+            for offset, (index, decision) in enumerate(approved):
+                data = valid[index]
+                loan_ids[index] = first_id + offset
+                loans.append(Loan(
+                    loan_id=first_id + offset,
+                    customer_id=data['customer_id'],
+                    loan_amount=data['loan_amount'],
+                    tenure=data['tenure'],
+                    interest_rate=decision['interest_rate'],
+                    monthly_repayment=decision['monthly_installment'],
+                    emis_paid_on_time=0,
+                    start_date=start_date,
+                    end_date=start_date + relativedelta(months=data['tenure']),
+                ))
+            Loan.objects.bulk_create(loans, batch_size=1000)
+            versions.touch_customers({loan.customer_id for loan in loans})
+
+    for index, decision in zip(indexes, decisions):
+        results[index] = {
+            'index': index,
+            'loan_id': loan_ids.get(index),
+            'customer_id': valid[index]['customer_id'],
+            'loan_approved': decision['approved'],
+            'message': decision['message'],
+            'monthly_installment': decision['monthly_installment'],
+        }
+    for index, data in valid.items():
+        if results[index] is None:
+            results[index] = {
+                'index': index,
+                'loan_id': None,
+                'customer_id': data['customer_id'],
+                'loan_approved': False,
+                'message': CUSTOMER_NOT_FOUND,
+                'monthly_installment': 0.0,
+            }
+    return results
+
+
+def _application_rows(chunk):
+    chunk = chunk.rename(columns=map_loan_columns(chunk.columns))
+    fields = ['customer_id', 'loan_amount', 'interest_rate', 'tenure']
+    rows = []
+    for record in chunk.to_dict('records'):
+        rows.append({
+            field: record[field] for field in fields
+            if field in record and not pd.isna(record[field])
+        })
+    return rows
+
+
+def process_applications_file(path, output_path, chunk_size=5000):
+    """
+    Run a campaign file of loan applications through ``originate_loans``
+    chunk by chunk, writing one result row per application to a CSV at
+    ``output_path``. Returns a summary string.
+    """
+    counts = {'rows': 0, 'approved': 0, 'rejected': 0, 'invalid': 0}
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+        first_row = 1
+        for chunk in iter_source_chunks(path, chunk_size):
+            for result in originate_loans(_application_rows(chunk)):
+                row = {'row': first_row + result['index']}
+                if 'errors' in result:
+                    counts['invalid'] += 1
+                    row.update(loan_approved=False, message=f"Invalid row: {dict(result['errors'])}")
+                else:
+                    counts['approved' if result['loan_approved'] else 'rejected'] += 1
+                    row.update(result)
+                writer.writerow(row)
+            counts['rows'] += len(chunk)
+            first_row += len(chunk)
+
+    return (
+        f"Loan batch complete: {counts['rows']} applications, {counts['approved']} approved, "
+        f"{counts['rejected']} rejected, {counts['invalid']} invalid"
+    )
@@ -0,0 +1,139 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+PARENT_TABLE = 'core_loan'
+DEFAULT_PARTITION = 'core_loan_default'
+
+PARTITIONS_SQL = """
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = %s
+    ORDER BY child.relname
+"""
+
+
+def partition_name(year):
+    return f"{PARENT_TABLE}_y{year}"
+
+
+def year_bounds(year):
+    """Range of end dates held by a year's partition, upper bound exclusive"""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def is_partitioned():
+    """Whether core_loan is a partitioned table; always False off Postgres"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = partrelid WHERE relname = %s",
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """(name, bound) for every partition attached to core_loan"""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [PARENT_TABLE])
+        return cursor.fetchall()
+
+
+def planned_years(first_year=None, last_year=None, today=None):
+    """
+    Years that should have a partition: from ``first_year`` (default this
+    year) through LOAN_PARTITION_YEARS_AHEAD years past ``last_year`` or
+    today, whichever is later.
+    """
+    today = today or date.today()
+    first_year = min(first_year or today.year, today.year)
+    last_year = max(last_year or today.year, today.year + settings.LOAN_PARTITION_YEARS_AHEAD)
+    return list(range(first_year, last_year + 1))
+
+
+def _attach_year(cursor, year):
+    """
+    Create and attach the partition for ``year``.
+
+    Rows for that year already in the default partition would make a plain
+    CREATE ... PARTITION OF fail, so the table is built detached, those rows
+    are moved into it, and it is attached afterwards.
+    """
+    name = partition_name(year)
+    lower, upper = year_bounds(year)
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{PARENT_TABLE}" INCLUDING DEFAULTS)')
+    # lets ATTACH skip the validation scan
+    cursor.execute(
+        f'ALTER TABLE "{name}" ADD CONSTRAINT "{name}_bounds" '
+        f"CHECK (end_date IS NOT NULL AND end_date >= %s AND end_date < %s)",
+        [lower, upper],
+    )
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE end_date >= %s AND end_date < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [lower, upper],
+    )
+    cursor.execute(
+        f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+        [lower, upper],
+    )
+    cursor.execute(f'ALTER TABLE "{name}" DROP CONSTRAINT "{name}_bounds"')
+
+
+def ensure_partitions(first_year=None, last_year=None):
+    """
+    Create any missing yearly partitions (see ``planned_years``).
+    Returns the names of the partitions created; a no-op off Postgres.
+    """
+    if not is_partitioned():
+        return []
+    existing = {name for name, _ in list_partitions()}
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for year in planned_years(first_year, last_year):
+            if partition_name(year) not in existing:
+                _attach_year(cursor, year)
+                created.append(partition_name(year))
+    return created
+
+
+def detach_partition(name, drop=False):
+    """Detach a partition from core_loan, keeping its rows as a plain table unless ``drop``"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+
+
+def attach_partition(name, year):
+    """Attach a detached table holding one year of loans back to core_loan"""
+    lower, upper = year_bounds(year)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper],
+        )
+
+
+def drop_loan_partitions():
+    """
+    Empty core_loan by detaching and dropping every yearly partition and
+    truncating the default one, instead of deleting row by row. Leaves no
+    dead tuples or bloated indexes behind for vacuum. Returns False when the
+    table is not partitioned and nothing was done.
+    """
+    if not is_partitioned():
+        return False
+    for name, _ in list_partitions():
+        if name != DEFAULT_PARTITION:
+            detach_partition(name, drop=True)
+    with connection.cursor() as cursor:
+        cursor.execute(f'TRUNCATE "{DEFAULT_PARTITION}"')
+    return True
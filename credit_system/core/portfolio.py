@@ -0,0 +1,173 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Case, CharField, Count, Q, Sum, Value, When
+
+from . import scoring
+from .models import ArchivedLoan, Customer, Loan
+
+CACHE_PREFIX = 'portfolio'
+REPORTS = ('summary', 'breakdown')
+
+# bands follow the thresholds used by the scoring and approval rules
+SCORE_BUCKETS = [('0-10', 10), ('11-30', 30), ('31-50', 50), ('51-100', 100)]
+VOLUME_RATIO_BUCKETS = [('<=0.5', 0.5), ('0.5-1.0', 1.0), ('1.0-1.5', 1.5), ('>1.5', None)]
+INTEREST_RATE_BUCKETS = [('<8', 8), ('8-12', 12), ('12-16', 16), ('16+', None)]
+TENURE_BUCKETS = [('<=12', 13), ('13-24', 25), ('25-36', 37), ('37+', None)]
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def _cache_key(report, today):
+    return f'{CACHE_PREFIX}:{report}:{today.isoformat()}'
+
+
+def _cached(report, build):
+    today = date.today()
+    key = _cache_key(report, today)
+    data = cache.get(key)
+    if data is None:
+        data = build(today)
+        cache.set(key, data, settings.PORTFOLIO_CACHE_TTL)
+    return data
+
+
+def invalidate():
+    """Drop cached portfolio reports; called after the loan book is reloaded"""
+    today = date.today()
+    cache.delete_many([_cache_key(report, today) for report in REPORTS])
+
+
+def _band(field, buckets):
+    """SQL CASE expression labelling ``field`` with the first bucket whose upper bound it is below"""
+    whens = [When(**{f'{field}__lt': upper}, then=Value(label)) for label, upper in buckets if upper is not None]
+    return Case(*whens, default=Value(buckets[-1][0]), output_field=CharField())
+
+
+def _upper_band(value, buckets):
+    for label, upper in buckets:
+        if upper is None or value <= upper:
+            return label
+    return buckets[-1][0]
+
+
+def _loan_distribution(field, buckets, today):
+    active = Q(end_date__gte=today)
+    distribution = {
+        label: {'bucket': label, 'loans': 0, 'exposure': 0, 'active_loans': 0, 'active_exposure': 0}
+        for label, _ in buckets
+    }
+    # archived loans are closed, so they only add to the all-time figures
+    for model in (Loan, ArchivedLoan):
+        rows = (
+            model.objects.annotate(bucket=_band(field, buckets))
+            .values('bucket')
+            .annotate(
+                loans=Count('loan_id'),
+                exposure=Sum('loan_amount'),
+                active_loans=Count('loan_id', filter=active),
+                active_exposure=Sum('loan_amount', filter=active),
+            )
+            .order_by()
+        )
+        for row in rows:
+            bucket = distribution[row.pop('bucket')]
+            for key, value in row.items():
+                bucket[key] += value or 0
+    return list(distribution.values())
+
+
+def _customer_distributions(today):
+    """
+    Credit-score and volume-ratio distributions across all customers.
+
+    The per-customer aggregates come from one grouped query streamed in
+    chunks; only the score formula itself runs in Python.
+    """
+    scores = {label: {'bucket': label, 'customers': 0, 'active_exposure': 0} for label, _ in SCORE_BUCKETS}
+    ratios = {label: {'bucket': label, 'customers': 0, 'exposure': 0} for label, _ in VOLUME_RATIO_BUCKETS}
+    no_limit = {'bucket': 'no limit', 'customers': 0, 'exposure': 0}
+
+    history_columns = [f'loan_history__{field}' for field in scoring.HISTORY_FIELDS]
+    rows = (
+        Customer.objects.values('customer_id', 'approved_limit', *history_columns)
+        .annotate(**scoring.stats_annotations(today, prefix='loans__'))
+        .order_by()
+    )
+    for row in rows.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        approved_limit = row.pop('approved_limit')
+        row.pop('customer_id')
+        history = {field: row.pop(f'loan_history__{field}') for field in scoring.HISTORY_FIELDS}
+        stats = scoring.add_history({key: value or 0 for key, value in row.items()}, history)
+
+        score = scoring.credit_score_from_stats(stats, approved_limit)
+        score_bucket = scores[_upper_band(score, SCORE_BUCKETS)]
+        score_bucket['customers'] += 1
+        score_bucket['active_exposure'] += stats['current_amount']
+
+        if approved_limit > 0:
+            ratio_bucket = ratios[_upper_band(stats['total_amount'] / approved_limit, VOLUME_RATIO_BUCKETS)]
+        else:
+            ratio_bucket = no_limit
+        ratio_bucket['customers'] += 1
+        ratio_bucket['exposure'] += stats['total_amount']
+
+    volume_ratios = list(ratios.values())
+    if no_limit['customers']:
+        volume_ratios.append(no_limit)
+    return list(scores.values()), volume_ratios
+
+
+def _build_summary(today):
+    active = Q(end_date__gte=today)
+    totals = Loan.objects.aggregate(
+        loans=Count('loan_id'),
+        active_loans=Count('loan_id', filter=active),
+        total_exposure=Sum('loan_amount'),
+        active_exposure=Sum('loan_amount', filter=active),
+        active_emi=Sum('monthly_repayment', filter=active),
+        average_interest_rate=Avg('interest_rate'),
+        customers_with_active_loans=Count('customer_id', filter=active, distinct=True),
+    )
+    archived = ArchivedLoan.objects.aggregate(
+        loans=Count('loan_id'),
+        total_exposure=Sum('loan_amount'),
+        interest_rates=Sum('interest_rate'),
+    )
+    loans = totals['loans'] + archived['loans']
+    interest_rates = (totals['average_interest_rate'] or 0) * totals['loans'] + (archived['interest_rates'] or 0)
+    customers = Customer.objects.aggregate(customers=Count('customer_id'), approved_limit=Sum('approved_limit'))
+    return {
+        'as_of': today.isoformat(),
+        'customers': customers['customers'],
+        'customers_with_active_loans': totals['customers_with_active_loans'],
+        'loans': loans,
+        'active_loans': totals['active_loans'],
+        'total_exposure': (totals['total_exposure'] or 0) + (archived['total_exposure'] or 0),
+        'active_exposure': totals['active_exposure'] or 0,
+        'active_emi': round(totals['active_emi'] or 0, 2),
+        'total_approved_limit': customers['approved_limit'] or 0,
+        'average_interest_rate': round(interest_rates / loans, 2) if loans else 0,
+    }
+
+
+def _build_breakdown(today):
+    credit_scores, volume_ratios = _customer_distributions(today)
+    return {
+        'as_of': today.isoformat(),
+        'credit_scores': credit_scores,
+        'volume_ratios': volume_ratios,
+        'interest_rates': _loan_distribution('interest_rate', INTEREST_RATE_BUCKETS, today),
+        'tenures': _loan_distribution('tenure', TENURE_BUCKETS, today),
+    }
+
+
+def summary():
+    """Portfolio-wide exposure and EMI totals, cached for PORTFOLIO_CACHE_TTL seconds"""
+    return _cached('summary', _build_summary)
+
+
+def breakdown():
+    """Portfolio distributions by credit score, volume ratio, interest rate and tenure"""
+    return _cached('breakdown', _build_breakdown)
@@ -0,0 +1,197 @@
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .tracing import span as trace_span
+
+
+def _rss_kb():
+    """Current resident set size in KiB, read from /proc when available"""
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _max_rss_kb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class _RssSampler:
+    """Polls RSS on a daemon thread while a stage runs and keeps the highest reading"""
+
+    interval = 0.01
+
+    def __init__(self):
+        self.peak_kb = _rss_kb()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # without /proc there is nothing to poll; the stage falls back to ru_maxrss
+        if self.peak_kb is not None:
+            self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = _rss_kb()
+        if rss is not None and rss > self.peak_kb:
+            self.peak_kb = rss
+
+    def stop(self):
+        """Stop polling and return the peak RSS in KiB, or None when RSS cannot be read"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        return self.peak_kb
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, rows and peak memory per named stage.
+
+    A stage may be entered many times (once per chunk); its figures are
+    accumulated and its peaks are the maximum across entries. Python
+    allocations are tracked with tracemalloc; process memory is the highest
+    RSS sampled on a background thread while the stage runs.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._started_tracemalloc = False
+        self._wall_start = None
+        self._cpu_start = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self._wall_start
+        self.cpu_seconds = time.process_time() - self._cpu_start
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        record = self.stages.setdefault(name, {
+            'calls': 0,
+            'rows': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_traced_kb': 0,
+            'peak_rss_kb': 0,
+            'rss_growth_kb': 0,
+        })
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        max_rss_start = _max_rss_kb()
+        sampler = _RssSampler().start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        counter = {'rows': rows}
+        try:
+            with trace_span(name):
+                yield counter
+        finally:
+            record['calls'] += 1
+            record['rows'] += counter['rows']
+            record['wall_seconds'] += time.perf_counter() - wall_start
+            record['cpu_seconds'] += time.process_time() - cpu_start
+            if tracing:
+                peak = (tracemalloc.get_traced_memory()[1] - traced_start) // 1024
+                record['peak_traced_kb'] = max(record['peak_traced_kb'], peak)
+            max_rss_end = _max_rss_kb()
+            peak_rss = sampler.stop()
+            record['peak_rss_kb'] = max(record['peak_rss_kb'], max_rss_end if peak_rss is None else peak_rss)
+            record['rss_growth_kb'] += max_rss_end - max_rss_start
+
+    def report(self):
+        return {
+            'wall_seconds': round(getattr(self, 'wall_seconds', 0.0), 4),
+            'cpu_seconds': round(getattr(self, 'cpu_seconds', 0.0), 4),
+            'max_rss_kb': _max_rss_kb(),
+            'stages': [
+                {
+                    'stage': name,
+                    **{key: round(value, 4) if isinstance(value, float) else value for key, value in record.items()},
+                }
+                for name, record in self.stages.items()
+            ],
+        }
+
+    def write_json(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as fh:
+            json.dump(self.report(), fh, indent=2)
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every stage is a no-op"""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        # stages still show up in sampled traces
+        with trace_span(name):
+            yield {'rows': rows}
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def format_table(report):
+    """Render a profile report as a plain-text summary table"""
+    headers = ['stage', 'calls', 'rows', 'wall s', 'cpu s', 'rows/s', 'peak py KiB', 'peak rss KiB']
+    rows = []
+    for stage in report['stages']:
+        wall = stage['wall_seconds']
+        rows.append([
+            stage['stage'],
+            str(stage['calls']),
+            str(stage['rows']),
+            f"{wall:.3f}",
+            f"{stage['cpu_seconds']:.3f}",
+            f"{stage['rows'] / wall:.0f}" if wall > 0 and stage['rows'] else '-',
+            str(stage['peak_traced_kb']),
+            str(stage['peak_rss_kb']),
+        ])
+    rows.append([
+        'total', '', '',
+        f"{report['wall_seconds']:.3f}",
+        f"{report['cpu_seconds']:.3f}",
+        '', '',
+        str(report['max_rss_kb']),
+    ])
+
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+    lines = ['  '.join(cell.ljust(widths[i]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(row))
+             for row in [headers] + rows]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
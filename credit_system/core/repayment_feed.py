@@ -0,0 +1,165 @@
+import csv
+
+from django.db import IntegrityError, transaction
+
+from . import repayments
+from .ingestion import iter_source_chunks
+from .lazy import pd
+from .models import Loan, RepaymentEvent
+
+REJECT_DUPLICATE = 'duplicate_event'
+REJECT_UNKNOWN_LOAN = 'unknown_loan'
+REJECT_INVALID = 'invalid_row'
+
+REJECT_FIELDS = ['row', 'event_id', 'loan_id', 'reason']
+
+
+def map_feed_columns(columns):
+    """Map repayment feed headers onto event field names"""
+    mapping = {}
+    for col in columns:
+        col_lower = str(col).lower().strip()
+        if 'loan' in col_lower and 'id' in col_lower:
+            mapping[col] = 'loan_id'
+        elif 'event' in col_lower or 'reference' in col_lower or 'transaction' in col_lower:
+            mapping[col] = 'event_id'
+        elif 'late' in col_lower:
+            mapping[col] = 'late'
+        elif 'emi' in col_lower or 'installment' in col_lower:
+            mapping[col] = 'emis_paid'
+        elif 'time' in col_lower:
+            mapping[col] = 'paid_on_time'
+    return mapping
+
+
+def _as_bool(value, default):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y', 't')
+    return bool(value)
+
+
+class FeedStats:
+    def __init__(self):
+        self.rows = 0
+        self.applied = 0
+        self.loans_updated = 0
+        self.rejected = {REJECT_DUPLICATE: 0, REJECT_UNKNOWN_LOAN: 0, REJECT_INVALID: 0}
+
+    def summary(self):
+        return (
+            f"Repayment feed complete: {self.rows} rows, {self.applied} applied to {self.loans_updated} loans, "
+            f"{self.rejected[REJECT_DUPLICATE]} duplicates, {self.rejected[REJECT_UNKNOWN_LOAN]} unknown loans, "
+            f"{self.rejected[REJECT_INVALID]} invalid"
+        )
+
+
+def _normalize(chunk, first_row, reject):
+    """Turn a raw chunk into event dicts, rejecting rows that cannot be read"""
+    chunk = chunk.rename(columns=map_feed_columns(chunk.columns))
+    events = []
+    for offset, row in enumerate(chunk.to_dict('records')):
+        row_number = first_row + offset
+        try:
+            event_id = row['event_id']
+            if pd.isna(event_id) or str(event_id).strip() == '':
+                raise ValueError('missing event id')
+            emis = row.get('emis_paid', 1)
+            if 'late' in row:
+                paid_on_time = not _as_bool(row['late'], False)
+            else:
+                paid_on_time = _as_bool(row.get('paid_on_time'), True)
+            event = {
+                'row': row_number,
+                'event_id': str(event_id).strip(),
+                'loan_id': int(row['loan_id']),
+                'emis_paid': 1 if pd.isna(emis) else int(emis),
+                'paid_on_time': paid_on_time,
+            }
+            if event['emis_paid'] < 1:
+                raise ValueError('emis_paid must be positive')
+        except (KeyError, ValueError, TypeError):
+            reject(row_number, row.get('event_id'), row.get('loan_id'), REJECT_INVALID)
+            continue
+        events.append(event)
+    return events
+
+
+def _plan_chunk(events):
+    """The events of a chunk to store, their per-loan EMI totals, and the rows to reject"""
+    event_ids = [event['event_id'] for event in events]
+    existing = set(RepaymentEvent.objects.filter(event_id__in=event_ids).values_list('event_id', flat=True))
+    known_loans = set(Loan.objects.filter(
+        loan_id__in={event['loan_id'] for event in events}
+    ).values_list('loan_id', flat=True))
+
+    new_events = []
+    increments = {}
+    rejected = []
+    seen = set()
+    for event in events:
+        if event['event_id'] in existing or event['event_id'] in seen:
+            rejected.append((event['row'], event['event_id'], event['loan_id'], REJECT_DUPLICATE))
+            continue
+        seen.add(event['event_id'])
+        if event['loan_id'] not in known_loans:
+            rejected.append((event['row'], event['event_id'], event['loan_id'], REJECT_UNKNOWN_LOAN))
+            continue
+        new_events.append(RepaymentEvent(
+            event_id=event['event_id'],
+            loan_id=event['loan_id'],
+            emis_paid=event['emis_paid'],
+            paid_on_time=event['paid_on_time'],
+        ))
+        if event['paid_on_time']:
+            increments[event['loan_id']] = increments.get(event['loan_id'], 0) + event['emis_paid']
+    return new_events, increments, rejected
+
+
+def _apply_chunk(events, reject, stats):
+    for attempt in range(repayments.BATCH_ATTEMPTS):
+        new_events, increments, rejected = _plan_chunk(events)
+        try:
+            with transaction.atomic():
+                RepaymentEvent.objects.bulk_create(new_events)
+                loans_updated = repayments.bulk_increment_emis(increments)
+            break
+        except IntegrityError:
+            # /record-payment stored one of these event ids first; the retry rejects it as a duplicate
+            if attempt == repayments.BATCH_ATTEMPTS - 1:
+                raise
+
+    for row in rejected:
+        reject(*row)
+    stats.loans_updated += loans_updated
+    stats.applied += len(new_events)
+
+
+def process_feed(path, rejects_path, chunk_size=10000):
+    """
+    Stream a repayment feed into the loan counters chunk by chunk.
+
+    Each chunk's events are stored and its per-loan EMI totals applied in
+    one transaction, retried once if a concurrently recorded payment claims
+    one of its event ids first. Duplicate events (already stored, or repeated in the
+    same chunk), unknown loans and unreadable rows go to a CSV rejects
+    report at ``rejects_path``. Returns the run's FeedStats.
+    """
+    stats = FeedStats()
+    with open(rejects_path, 'w', newline='') as rejects_file:
+        writer = csv.writer(rejects_file)
+        writer.writerow(REJECT_FIELDS)
+
+        def reject(row_number, event_id, loan_id, reason):
+            stats.rejected[reason] += 1
+            writer.writerow([row_number, '' if event_id is None else event_id, '' if loan_id is None else loan_id, reason])
+
+        first_row = 1
+        for chunk in iter_source_chunks(path, chunk_size):
+            stats.rows += len(chunk)
+            events = _normalize(chunk, first_row, reject)
+            first_row += len(chunk)
+            if events:
+                _apply_chunk(events, reject, stats)
+    return stats
@@ -0,0 +1,170 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+
+from . import versions
+from .models import Loan, RepaymentEvent, new_version
+
+APPLIED = 'applied'
+DUPLICATE = 'duplicate'
+LOAN_NOT_FOUND = 'loan_not_found'
+
+BATCH_ATTEMPTS = 2
+VALUES_BATCH_SIZE = 400
+
+
+def _increment(emis):
+    # a loan cannot have more on-time EMIs than its tenure
+    return Least(F('emis_paid_on_time') + emis, F('tenure'))
+
+
+def _loan_states(loan_ids):
+    return {
+        row['loan_id']: row
+        for row in Loan.objects.filter(loan_id__in=loan_ids).values('loan_id', 'tenure', 'emis_paid_on_time')
+    }
+
+
+def _result(event_id, loan_id, outcome, state=None):
+    result = {'event_id': event_id, 'loan_id': loan_id, 'status': outcome}
+    if state is not None:
+        result['emis_paid_on_time'] = state['emis_paid_on_time']
+        result['repayments_left'] = max(0, state['tenure'] - state['emis_paid_on_time'])
+    return result
+
+
+def record_payment(event_id, loan_id, emis_paid=1, paid_on_time=True):
+    """
+    Apply a single repayment event.
+
+    The event row and the counter update commit together; a repeated
+    event id is reported as a duplicate and changes nothing.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                RepaymentEvent.objects.create(
+                    event_id=event_id,
+                    loan_id=loan_id,
+                    emis_paid=emis_paid,
+                    paid_on_time=paid_on_time,
+                )
+        except IntegrityError:
+            return _result(event_id, loan_id, DUPLICATE, _loan_states([loan_id]).get(loan_id))
+
+        version = new_version()
+        updated = Loan.objects.filter(loan_id=loan_id).update(
+            emis_paid_on_time=_increment(emis_paid if paid_on_time else 0),
+            version=version,
+        )
+        if not updated:
+            transaction.set_rollback(True)
+            return _result(event_id, loan_id, LOAN_NOT_FOUND)
+        versions.touch_customers_of_loans([loan_id], version)
+
+        return _result(event_id, loan_id, APPLIED, _loan_states([loan_id])[loan_id])
+
+
+def _apply_batch(events):
+    event_ids = [event['event_id'] for event in events]
+    existing = set(RepaymentEvent.objects.filter(event_id__in=event_ids).values_list('event_id', flat=True))
+    known_loans = set(Loan.objects.filter(
+        loan_id__in={event['loan_id'] for event in events}
+    ).values_list('loan_id', flat=True))
+
+    outcomes = []
+    new_events = []
+    increments = defaultdict(int)
+    seen = set()
+    for event in events:
+        if event['event_id'] in existing or event['event_id'] in seen:
+            outcomes.append(DUPLICATE)
+            continue
+        seen.add(event['event_id'])
+        if event['loan_id'] not in known_loans:
+            outcomes.append(LOAN_NOT_FOUND)
+            continue
+        outcomes.append(APPLIED)
+        new_events.append(RepaymentEvent(
+            event_id=event['event_id'],
+            loan_id=event['loan_id'],
+            emis_paid=event['emis_paid'],
+            paid_on_time=event['paid_on_time'],
+        ))
+        if event['paid_on_time']:
+            increments[event['loan_id']] += event['emis_paid']
+
+    RepaymentEvent.objects.bulk_create(new_events)
+
+    # one UPDATE per distinct increment; on salary day nearly every loan moves by one EMI
+    version = new_version()
+    loans_by_increment = defaultdict(list)
+    for loan_id, emis in increments.items():
+        loans_by_increment[emis].append(loan_id)
+    for emis, loan_ids in loans_by_increment.items():
+        Loan.objects.filter(loan_id__in=loan_ids).update(emis_paid_on_time=_increment(emis), version=version)
+    versions.touch_customers_of_loans(increments, version)
+
+    return outcomes
+
+
+def record_payments(events):
+    """
+    Apply a batch of repayment events in one transaction.
+
+    Events are dicts with ``event_id``, ``loan_id``, ``emis_paid`` and
+    ``paid_on_time``. Returns one result per event, in order.
+    """
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                outcomes = _apply_batch(events)
+            break
+        except IntegrityError:
+            # a concurrent batch inserted one of our event ids first; the retry sees it as a duplicate
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+
+    states = _loan_states({event['loan_id'] for event in events})
+    return [
+        _result(event['event_id'], event['loan_id'], outcome, states.get(event['loan_id']))
+        for event, outcome in zip(events, outcomes)
+    ]
+
+
+def _increment_sql(rows):
+    table = connection.ops.quote_name(Loan._meta.db_table)
+    values = ', '.join(['(%s, %s)'] * rows)
+    if connection.vendor == 'postgresql':
+        return (
+            f"UPDATE {table} AS l SET emis_paid_on_time = LEAST(l.emis_paid_on_time + v.emis, l.tenure), version = %s "
+            f"FROM (VALUES {values}) AS v(loan_id, emis) WHERE l.loan_id = v.loan_id"
+        )
+    return (
+        f"UPDATE {table} SET emis_paid_on_time = MIN({table}.emis_paid_on_time + v.emis, {table}.tenure), version = %s "
+        f"FROM (SELECT column1 AS loan_id, column2 AS emis FROM (VALUES {values})) AS v "
+        f"WHERE {table}.loan_id = v.loan_id"
+    )
+
+
+def bulk_increment_emis(increments):
+    """
+    Add on-time EMIs to many loans with ``UPDATE ... FROM (VALUES ...)``.
+
+    ``increments`` maps loan id to the number of EMIs to add; each batch of
+    loans is one statement. The loans and their customers' loan lists get
+    a new version. Returns the number of loans updated.
+    """
+    items = list(increments.items())
+    version = new_version()
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), VALUES_BATCH_SIZE):
+            batch = items[start:start + VALUES_BATCH_SIZE]
+            params = [version] + [value for pair in batch for value in pair]
+            cursor.execute(_increment_sql(len(batch)), params)
+            updated += cursor.rowcount
+    versions.touch_customers_of_loans(increments, version)
+    return updated
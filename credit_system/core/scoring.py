@@ -0,0 +1,177 @@
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+
+from . import tracing
+from .models import CustomerLoanHistory, Loan
+from .singleflight import SingleFlight
+
+NO_HISTORY_SCORE = 60
+
+score_flights = SingleFlight('credit-score')
+
+# totals carried over from archived loans; archived loans are closed and started before
+# this year, so they never count towards the current-year or active figures
+HISTORY_FIELDS = ['loan_count', 'total_tenure', 'total_emis_paid', 'total_amount']
+
+
+def empty_stats():
+    return {
+        'loan_count': 0,
+        'total_tenure': 0,
+        'total_emis_paid': 0,
+        'total_amount': 0,
+        'current_year_loans': 0,
+        'current_amount': 0,
+        'current_emi': 0,
+    }
+
+
+def stats_annotations(today, prefix=''):
+    """
+    Aggregate expressions behind the credit score. ``prefix`` points them
+    at the loan table from a related model, e.g. ``'loans__'`` on Customer.
+    """
+    active = Q(**{f'{prefix}end_date__gte': today})
+    return {
+        'loan_count': Count(f'{prefix}loan_id'),
+        'total_tenure': Sum(f'{prefix}tenure'),
+        'total_emis_paid': Sum(f'{prefix}emis_paid_on_time'),
+        'total_amount': Sum(f'{prefix}loan_amount'),
+        'current_year_loans': Count(f'{prefix}loan_id', filter=Q(**{f'{prefix}start_date__year': today.year})),
+        'current_amount': Sum(f'{prefix}loan_amount', filter=active),
+        'current_emi': Sum(f'{prefix}monthly_repayment', filter=active),
+    }
+
+
+def add_history(stats, history):
+    """Fold a customer's archived-loan totals (a dict or CustomerLoanHistory) into their stats"""
+    for field in HISTORY_FIELDS:
+        value = history.get(field) if isinstance(history, dict) else getattr(history, field)
+        stats[field] += value or 0
+    return stats
+
+
+@tracing.traced()
+def customer_loan_stats(customer_ids, today=None):
+    """
+    Per-customer loan aggregates behind the credit score and approval rules.
+
+    One grouped query covers every customer in ``customer_ids`` and a second
+    adds the totals of their archived loans; customers without loans get
+    zeroed stats.
+    """
+    today = today or date.today()
+    rows = (
+        Loan.objects.filter(customer_id__in=customer_ids)
+        .values('customer_id')
+        .annotate(**stats_annotations(today))
+        .order_by()
+    )
+
+    stats = {customer_id: empty_stats() for customer_id in customer_ids}
+    for row in rows:
+        customer_id = row.pop('customer_id')
+        stats[customer_id] = {key: value or 0 for key, value in row.items()}
+    for history in CustomerLoanHistory.objects.filter(customer_id__in=customer_ids):
+        add_history(stats[history.customer_id], history)
+    return stats
+
+
+@tracing.traced()
+def credit_score_from_stats(stats, approved_limit):
+    """Credit score (0-100) from a customer's loan aggregates"""
+    if not stats['loan_count']:
+        return NO_HISTORY_SCORE
+
+    total_emis_expected = stats['total_tenure']
+    emi_score = (stats['total_emis_paid'] / total_emis_expected) * 25 if total_emis_expected > 0 else 0
+
+    loan_count = stats['loan_count']
+    if loan_count <= 2:
+        loan_count_score = 20
+    elif loan_count <= 5:
+        loan_count_score = 15
+    elif loan_count <= 10:
+        loan_count_score = 10
+    else:
+        loan_count_score = 5
+
+    activity_score = 20 if stats['current_year_loans'] else 0
+
+    if approved_limit > 0:
+        volume_ratio = stats['total_amount'] / approved_limit
+        if volume_ratio <= 0.5:
+            volume_score = 20
+        elif volume_ratio <= 1.0:
+            volume_score = 15
+        elif volume_ratio <= 1.5:
+            volume_score = 10
+        else:
+            volume_score = 5
+    else:
+        volume_score = 0
+
+    if stats['current_amount'] > approved_limit:
+        return 0
+
+    total_score = emi_score + loan_count_score + activity_score + volume_score
+    return round(min(total_score, 100))
+
+
+@tracing.traced()
+def credit_score(customer):
+    """
+    Credit score of one customer. Concurrent requests for the same customer
+    and loan-state version share a single computation.
+    """
+    today = date.today()
+    # everything the score depends on: the loans (via their version), the limit and the date
+    key = f"{customer.customer_id}:{customer.loans_version}:{customer.approved_limit}:{today.isoformat()}"
+
+    def compute():
+        stats = customer_loan_stats([customer.customer_id], today)[customer.customer_id]
+        return credit_score_from_stats(stats, customer.approved_limit)
+
+    return score_flights.do(
+        key,
+        compute,
+        shared=settings.SCORING_SINGLEFLIGHT_SHARED,
+        timeout=settings.SCORING_SINGLEFLIGHT_TIMEOUT,
+    )
+
+
+@tracing.traced()
+def monthly_installment(loan_amount, annual_interest_rate, tenure_months):
+    monthly_rate = annual_interest_rate / (12 * 100)
+    if monthly_rate == 0:
+        return loan_amount / tenure_months
+    return loan_amount * monthly_rate * (1 + monthly_rate) ** tenure_months / ((1 + monthly_rate) ** tenure_months - 1)
+
+
+@tracing.traced()
+def approval_decision(current_emi, monthly_salary, credit_score, projected_emi, interest_rate):
+    """
+    Apply the approval rules given the EMIs already being paid and the
+    projected EMI of the new loan. Returns (approved, corrected_interest_rate).
+    """
+    if current_emi + projected_emi > monthly_salary * 0.5:
+        return False, interest_rate
+
+    if credit_score > 50:
+        return True, interest_rate
+    elif 30 < credit_score <= 50:
+        return True, max(interest_rate, 12)
+    elif 10 < credit_score <= 30:
+        return True, max(interest_rate, 16)
+    else:
+        return False, interest_rate
+
+
+def rejection_message(credit_score, current_emi, monthly_salary):
+    if credit_score <= 10:
+        return "Loan rejected due to low credit score"
+    if current_emi > (monthly_salary * 0.5):
+        return "Loan rejected due to high existing EMI burden"
+    return "Loan rejected based on credit assessment"
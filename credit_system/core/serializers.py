@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Customer
+from .models import Customer, IngestionJob, LoanDecision
+from .ids import allocate_ids
+from django.db import transaction
 import math
 
 class CustomerRegisterSerializer(serializers.ModelSerializer):
@@ -20,10 +22,6 @@ class CustomerRegisterSerializer(serializers.ModelSerializer):
         return f"{obj.first_name} {obj.last_name}"
 
     def create(self, validated_data):
-     
-        last_customer = Customer.objects.order_by('customer_id').last()
-        next_customer_id = (last_customer.customer_id + 1) if last_customer else 1
-        
       
         monthly_income = validated_data.pop('monthly_income')
         validated_data['monthly_salary'] = monthly_income
@@ -33,10 +31,9 @@ class CustomerRegisterSerializer(serializers.ModelSerializer):
         approved_limit_rounded = round(approved_limit / 100000) * 100000 
         validated_data['approved_limit'] = approved_limit_rounded
         
-      
-        validated_data['customer_id'] = next_customer_id
-        
-        return Customer.objects.create(**validated_data)
+        with transaction.atomic():
+            validated_data['customer_id'] = allocate_ids(Customer, 1)
+            return Customer.objects.create(**validated_data)
 
     def to_representation(self, instance):
         """Custom response format"""
@@ -50,6 +47,16 @@ class CustomerRegisterSerializer(serializers.ModelSerializer):
         }
 
 
+class CustomerBatchItemSerializer(CustomerRegisterSerializer):
+    """One row of a batch registration; phone uniqueness is checked for the whole batch at once"""
+
+    class Meta(CustomerRegisterSerializer.Meta):
+        extra_kwargs = {
+            **CustomerRegisterSerializer.Meta.extra_kwargs,
+            'phone_number': {'validators': []},
+        }
+
+
 class LoanEligibilityRequestSerializer(serializers.Serializer):
     customer_id = serializers.IntegerField()
     loan_amount = serializers.FloatField(min_value=0)
@@ -81,6 +88,16 @@ class CreateLoanResponseSerializer(serializers.Serializer):
     monthly_installment = serializers.FloatField()
 
 
+class SparseFieldsMixin:
+    """Keep only the fields named in the ``fields`` keyword argument, when given"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class CustomerDetailsSerializer(serializers.Serializer):
     """Customer details for loan view responses"""
     id = serializers.IntegerField()
@@ -90,7 +107,7 @@ class CustomerDetailsSerializer(serializers.Serializer):
     age = serializers.IntegerField()
 
 
-class ViewLoanResponseSerializer(serializers.Serializer):
+class ViewLoanResponseSerializer(SparseFieldsMixin, serializers.Serializer):
     """Response for viewing a single loan details"""
     loan_id = serializers.IntegerField()
     customer = CustomerDetailsSerializer()
@@ -100,10 +117,70 @@ class ViewLoanResponseSerializer(serializers.Serializer):
     tenure = serializers.IntegerField()
 
 
-class ViewLoansResponseSerializer(serializers.Serializer):
+class ViewLoansResponseSerializer(SparseFieldsMixin, serializers.Serializer):
     """Response for viewing customer's loan list"""
     loan_id = serializers.IntegerField()
     loan_amount = serializers.FloatField()  
     interest_rate = serializers.FloatField()
     monthly_installment = serializers.FloatField()
     repayments_left = serializers.IntegerField()
+
+
+class RecordPaymentRequestSerializer(serializers.Serializer):
+    event_id = serializers.CharField(max_length=100)
+    loan_id = serializers.IntegerField()
+    emis_paid = serializers.IntegerField(min_value=1, default=1)
+    paid_on_time = serializers.BooleanField(default=True)
+
+
+class RecordPaymentBatchRequestSerializer(serializers.Serializer):
+    payments = RecordPaymentRequestSerializer(many=True, allow_empty=False)
+
+
+class RecordPaymentResponseSerializer(serializers.Serializer):
+    """Outcome of one repayment event"""
+    event_id = serializers.CharField()
+    loan_id = serializers.IntegerField()
+    status = serializers.CharField()
+    emis_paid_on_time = serializers.IntegerField(required=False)
+    repayments_left = serializers.IntegerField(required=False)
+
+
+class LoanDecisionSerializer(serializers.ModelSerializer):
+    """State of an asynchronously submitted loan application, and its outcome once decided"""
+
+    class Meta:
+        model = LoanDecision
+        fields = [
+            'decision_id', 'status', 'customer_id', 'loan_amount', 'interest_rate', 'tenure',
+            'loan_id', 'loan_approved', 'message', 'monthly_installment', 'created_at', 'decided_at',
+        ]
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    """Checkpoint and progress of an ingestion run"""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'task_id', 'status', 'stage', 'attempts',
+            'customers_total', 'customer_offset', 'loans_total', 'loan_offset',
+            'loans_created', 'loans_skipped', 'message',
+            'started_at', 'updated_at', 'finished_at', 'progress',
+        ]
+
+    def get_progress(self, obj):
+        return obj.progress()
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Query parameters accepted by /api/export/<kind>"""
+    # not "format": DRF reserves that parameter for renderer selection
+    output = serializers.ChoiceField(choices=['csv', 'parquet'], default='csv')
+    gzip = serializers.BooleanField(default=False)
+    active = serializers.BooleanField(default=False)
+    start_from = serializers.DateField(required=False)
+    start_to = serializers.DateField(required=False)
+    customer_from = serializers.IntegerField(required=False)
+    customer_to = serializers.IntegerField(required=False)
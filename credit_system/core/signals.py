@@ -0,0 +1,41 @@
+from contextlib import ExitStack
+
+from celery.signals import task_postrun, task_prerun
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import customer_cache, slow_queries, tracing
+from .models import Customer
+
+
+# no post_delete receiver: it would stop ingestion's bulk delete from running as one query;
+# ingestion invalidates the whole cache instead
+@receiver(post_save, sender=Customer)
+def invalidate_cached_customer(sender, instance, **kwargs):
+    customer_cache.invalidate([instance.customer_id])
+
+
+_task_captures = {}
+_task_traces = {}
+
+
+@task_prerun.connect
+def start_task_capture(task_id=None, task=None, **kwargs):
+    if task is None or not task.name.startswith('core.tasks.'):
+        return
+    stack = ExitStack()
+    stack.enter_context(slow_queries.capture(task.name))
+    _task_captures[task_id] = stack
+    root = tracing.start_trace(task.name, task_id=task_id)
+    if root is not None:
+        _task_traces[task_id] = root
+
+
+@task_postrun.connect
+def stop_task_capture(task_id=None, state=None, **kwargs):
+    root = _task_traces.pop(task_id, None)
+    if root is not None:
+        root.finish(state=state)
+    stack = _task_captures.pop(task_id, None)
+    if stack is not None:
+        stack.close()
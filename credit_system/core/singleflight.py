@@ -0,0 +1,91 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+from .locks import CacheLock
+
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent callers of the same key.
+
+    Within a process, the first caller for a key runs the function and the
+    others wait on it and get the same result or exception. With
+    ``shared=True`` the leader also holds a short cache lock and stores the
+    result in the shared cache for ``timeout`` seconds, so callers in other
+    processes wait for it instead of recomputing. Keys must change whenever
+    the result would, since a shared result is reused until it expires.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+
+    def do(self, key, fn, shared=False, timeout=5):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._shared(key, fn, timeout) if shared else fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _shared(self, key, fn, timeout):
+        result_key = f"singleflight:{self.namespace}:{key}"
+        cached = cache.get(result_key)
+        if cached is not None:
+            self.shared_hits += 1
+            return cached['value']
+
+        lock = CacheLock(result_key, timeout)
+        if lock.acquire():
+            try:
+                value = fn()
+                cache.set(result_key, {'value': value}, timeout)
+                return value
+            finally:
+                lock.release()
+
+        # another process is computing it; wait for its result rather than repeating the work
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            cached = cache.get(result_key)
+            if cached is not None:
+                self.shared_hits += 1
+                return cached['value']
+            if cache.get(lock.key) is None:
+                break
+        return fn()
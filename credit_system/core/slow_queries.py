@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .jsonl_log import JsonlLog
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'VALUES (?:\((?:\?, )*\?\), )+\((?:\?, )*\?\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders as ``?`` and IN/VALUES lists collapsed, so repeats group together"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _VALUES_LIST.sub('VALUES (...), ...', sql)
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+def _shape(value):
+    if isinstance(value, (list, tuple)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def param_shapes(params, many=False):
+    """Types of the bound parameters, without their values"""
+    if params is None:
+        return []
+    if many:
+        params = list(params)
+        return {'rows': len(params), 'row': param_shapes(params[0]) if params else []}
+    if isinstance(params, dict):
+        return {key: _shape(value) for key, value in params.items()}
+    return [_shape(value) for value in params]
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+# one JSON record per line, rotated by size
+_log = JsonlLog('SLOW_QUERY_LOG_PATH', 'SLOW_QUERY_LOG_MAX_BYTES', 'SLOW_QUERY_LOG_BACKUPS', default=_json_default)
+
+
+def reset_writer():
+    """Close the log file; the next record reopens SLOW_QUERY_LOG_PATH"""
+    _log.close()
+
+
+def _explain(connection, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) of a SELECT, run again on the same connection"""
+    _local.explaining = True
+    try:
+        # a savepoint, so a failing EXPLAIN cannot abort the caller's transaction
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    except Exception as e:
+        return {'error': str(e)}
+    finally:
+        _local.explaining = False
+
+
+class SlowQueryLogger:
+    """
+    ``connection.execute_wrapper`` that times each statement and records
+    the ones slower than SLOW_QUERY_THRESHOLD_MS, tagged with ``source``,
+    the view or task that issued them. A SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+    share of slow SELECTs on Postgres also get their plan captured.
+    """
+
+    def __init__(self, source, alias):
+        self.source = source
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            try:
+                self._record(sql, params, many, context['connection'], duration_ms)
+            except Exception:
+                logger.warning("Could not record slow query", exc_info=True)
+        return result
+
+    def _record(self, sql, params, many, connection, duration_ms):
+        normalized = normalize_sql(sql)
+        record = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'source': self.source,
+            'alias': self.alias,
+            'duration_ms': round(duration_ms, 2),
+            'fingerprint': fingerprint(normalized),
+            'sql': normalized,
+            'params': param_shapes(params, many),
+            'many': many,
+        }
+        explainable = (
+            connection.vendor == 'postgresql'
+            and not many
+            and sql.lstrip()[:6].upper() == 'SELECT'
+            and not connection.needs_rollback
+        )
+        if explainable and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            record['explain'] = _explain(connection, sql, params)
+        _log.write(record)
+
+
+@contextmanager
+def capture(source):
+    """Record slow statements on every database connection of this thread while the block runs"""
+    if not settings.SLOW_QUERY_LOG_ENABLED:
+        yield
+        return
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(SlowQueryLogger(source, alias)))
+        yield
+
+
+def read_records(path=None):
+    """Every record in the log and its rotated backups, oldest file first"""
+    return _log.read(path)
+
+
+def summarize(records, sort='total'):
+    """Group records by fingerprint into per-statement totals, worst first by ``sort`` (total, max or count)"""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'],
+            'sql': record['sql'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'sources': {},
+            'explain': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += record['duration_ms']
+        group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+        group['sources'][record['source']] = group['sources'].get(record['source'], 0) + 1
+        if record.get('explain') is not None:
+            group['explain'] = record['explain']
+
+    for group in groups.values():
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['mean_ms'] = round(group['total_ms'] / group['count'], 2)
+    key = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}[sort]
+    return sorted(groups.values(), key=lambda group: group[key], reverse=True)
@@ -0,0 +1,106 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+# what each kind of process imports before it can do any work
+BOOT_TARGETS = {
+    'web': (
+        'import django; django.setup()\n'
+        'from credit_system.wsgi import application\n'
+        'from django.urls import get_resolver; get_resolver().url_patterns\n'
+    ),
+    'worker': (
+        'import django; django.setup()\n'
+        'from credit_system.celery import app; app.loader.import_default_modules()\n'
+    ),
+    'command': (
+        'import django; django.setup()\n'
+        'from django.core.management import get_commands, load_command_class\n'
+        "[load_command_class(app, name) for name, app in get_commands().items() if app == 'core']\n"
+    ),
+}
+
+# peak RSS of the booted interpreter: ru_maxrss would also count the parent it was forked from,
+# so VmHWM is read where /proc exists
+_REPORT = (
+    'import json, resource, sys\n'
+    'try:\n'
+    "    with open('/proc/self/status') as status:\n"
+    "        max_rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))\n"
+    'except (OSError, StopIteration):\n'
+    '    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n'
+    'print(json.dumps({{'
+    "'max_rss_kb': max_rss_kb, "
+    "'loaded': [name for name in {lazy!r} if name in sys.modules]"
+    '}}))\n'
+)
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """Rows of ``python -X importtime`` output as dicts: module, self_us, cumulative_us and nesting depth"""
+    modules = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append({
+                'module': module,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(indent) - 1) // 2,
+            })
+    return modules
+
+
+def by_package(modules):
+    """Self import time summed per top-level package, most expensive first"""
+    totals = {}
+    for row in modules:
+        package = row['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + row['self_us']
+    return sorted(({'module': name, 'self_us': us} for name, us in totals.items()), key=lambda row: -row['self_us'])
+
+
+def measure(target='web', importtime=False):
+    """
+    Boot ``target`` in a fresh interpreter and report its cold-start wall
+    time, peak RSS, which STARTUP_LAZY_MODULES it imported and, with
+    ``importtime``, the import cost of every module.
+    """
+    script = BOOT_TARGETS[target] + _REPORT.format(lazy=list(settings.STARTUP_LAZY_MODULES))
+    argv = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', script]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+
+    started = time.perf_counter()
+    result = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f'{target} boot failed: {result.stderr.strip().splitlines()[-1:]}')
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'target': target,
+        'wall_seconds': round(wall_seconds, 3),
+        'max_rss_kb': report['max_rss_kb'],
+        'lazy_modules_loaded': report['loaded'],
+        'modules': parse_importtime(result.stderr) if importtime else [],
+    }
+
+
+def budget_violations(report):
+    """Ways a boot report breaks the STARTUP_BUDGET_* settings; empty when within budget"""
+    violations = []
+    if report['wall_seconds'] > settings.STARTUP_BUDGET_SECONDS:
+        violations.append(f"cold start took {report['wall_seconds']}s, budget {settings.STARTUP_BUDGET_SECONDS}s")
+    if report['max_rss_kb'] > settings.STARTUP_BUDGET_RSS_MB * 1024:
+        violations.append(f"peak RSS {report['max_rss_kb'] // 1024} MiB, budget {settings.STARTUP_BUDGET_RSS_MB} MiB")
+    for module in report['lazy_modules_loaded']:
+        violations.append(f'{module} was imported at startup')
+    return violations
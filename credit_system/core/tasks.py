@@ -1,168 +1,311 @@
 from celery import shared_task
-import pandas as pd
-from .models import Customer, Loan
-from django.utils.dateparse import parse_date
+from celery.exceptions import Retry
+from .models import ArchivedLoan, Customer, CustomerLoanHistory, Loan, IngestionGeneration, IngestionJob, new_version
+from . import archive, customer_cache, decisions, ingest_cache, ingestion, partitions, portfolio, repayment_feed
+from .lazy import pd
+from .locks import CacheLock
+from .profiling import StageProfiler, NULL_PROFILER
 from django.db import transaction
+from django.utils import timezone
 import os
+import uuid
 from django.conf import settings
 
-@shared_task
-def ingest_data():
+INGEST_LOCK_NAME = 'ingest-data'
+
+
+def _publish_progress(task, job):
+    """Push the job checkpoint to the Celery result backend when running on a worker"""
+    if task.request.called_directly or task.request.is_eager:
+        return
+    task.update_state(state='PROGRESS', meta={
+        'job_id': job.pk,
+        'stage': job.stage,
+        **job.progress(),
+    })
+
+
+def _fail(job, message):
+    job.status = IngestionJob.STATUS_FAILED
+    job.message = message
+    job.save(update_fields=['status', 'message', 'updated_at'])
+    return message
+
+
+def _start_job(task_id, generation, force):
+    """Resume the unfinished job for this generation, or start a fresh one"""
+    job = None
+    if generation and not force:
+        job = IngestionJob.objects.filter(
+            generation=generation,
+            status__in=[IngestionJob.STATUS_RUNNING, IngestionJob.STATUS_FAILED],
+        ).order_by('-id').first()
+
+    if job is not None:
+        job.task_id = task_id
+        job.status = IngestionJob.STATUS_RUNNING
+        job.attempts += 1
+        job.rows_at_resume = job.rows_done
+        job.resumed_at = timezone.now()
+        job.message = ''
+        job.save()
+        return job, True
+
+    # we hold the ingest lock, so any other job still marked running died mid-load
+    IngestionJob.objects.filter(status=IngestionJob.STATUS_RUNNING).update(
+        status=IngestionJob.STATUS_FAILED,
+        message='Superseded by a fresh ingestion',
+    )
+    job = IngestionJob.objects.create(task_id=task_id, generation=generation or '')
+    return job, False
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def ingest_data(self, force=False, profile=None, lean=None, customer_file=None, loan_file=None):
     try:
-        customer_file = os.path.join(settings.BASE_DIR, 'data', 'customer_data.xlsx')
-        loan_file = os.path.join(settings.BASE_DIR, 'data', 'loan_data.xlsx')
-        
+        customer_file = customer_file or os.path.join(settings.BASE_DIR, 'data', 'customer_data.xlsx')
+        loan_file = loan_file or os.path.join(settings.BASE_DIR, 'data', 'loan_data.xlsx')
+
         if not os.path.exists(customer_file) or not os.path.exists(loan_file):
             return f"Data files not found: customer={os.path.exists(customer_file)}, loan={os.path.exists(loan_file)}"
 
         try:
-            customer_df = pd.read_excel(customer_file)
-        except Exception as e:
-            return f"Error reading customer file: {str(e)}"
-        
-        customer_column_mapping = {}
-        for col in customer_df.columns:
-            col_lower = col.lower().strip()
-            if 'customer' in col_lower and 'id' in col_lower:
-                customer_column_mapping[col] = 'customer_id'
-            elif 'first' in col_lower and 'name' in col_lower:
-                customer_column_mapping[col] = 'first_name'
-            elif 'last' in col_lower and 'name' in col_lower:
-                customer_column_mapping[col] = 'last_name'
-            elif 'age' in col_lower:
-                customer_column_mapping[col] = 'age'
-            elif 'phone' in col_lower:
-                customer_column_mapping[col] = 'phone_number'
-            elif 'salary' in col_lower:
-                customer_column_mapping[col] = 'monthly_salary'
-            elif 'limit' in col_lower:
-                customer_column_mapping[col] = 'approved_limit'
-        
-        try:
-            customer_df = customer_df.rename(columns=customer_column_mapping)
-        except Exception as e:
-            return f"Error renaming customer columns: {str(e)}"
+            fingerprints = ingest_cache.fingerprint_files([customer_file, loan_file])
+            generation = ingest_cache.generation_id(fingerprints)
+        except OSError:
+            fingerprints = {}
+            generation = None
+
+        if generation and not force and ingest_cache.generation_is_loaded(generation):
+            return f"Ingestion skipped: source files unchanged (generation {generation[:12]})"
+
+        lock = CacheLock(INGEST_LOCK_NAME, settings.INGEST_LOCK_TIMEOUT)
+        if not lock.acquire():
+            if not self.request.called_directly and not self.request.is_eager:
+                # the holder may be a crashed worker whose lock has not expired yet
+                raise self.retry(countdown=settings.INGEST_LOCK_TIMEOUT)
+            return "Ingestion already running"
 
+        if lean is None:
+            lean = settings.INGEST_LEAN_LOADING
+        profiler = StageProfiler() if profile else NULL_PROFILER
+        profiler.start()
         try:
-            loan_df = pd.read_excel(loan_file)
-        except Exception as e:
-            return f"Error reading loan file: {str(e)}"
-        
-        loan_column_mapping = {}
-        for col in loan_df.columns:
-            col_lower = col.lower().strip()
-            if 'customer' in col_lower and 'id' in col_lower:
-                loan_column_mapping[col] = 'customer_id'
-            elif 'loan' in col_lower and 'id' in col_lower:
-                loan_column_mapping[col] = 'loan_id'
-            elif 'loan' in col_lower and 'amount' in col_lower:
-                loan_column_mapping[col] = 'loan_amount'
-            elif 'tenure' in col_lower:
-                loan_column_mapping[col] = 'tenure'
-            elif 'interest' in col_lower and 'rate' in col_lower:
-                loan_column_mapping[col] = 'interest_rate'
-            elif 'monthly' in col_lower and 'payment' in col_lower:
-                loan_column_mapping[col] = 'monthly_payment'
-            elif 'emis' in col_lower and ('paid' in col_lower or 'time' in col_lower):
-                loan_column_mapping[col] = 'emis_paid_on_time'
-            elif ('start' in col_lower and 'date' in col_lower) or ('date' in col_lower and 'approval' in col_lower):
-                loan_column_mapping[col] = 'start_date'
-            elif 'end' in col_lower and 'date' in col_lower:
-                loan_column_mapping[col] = 'end_date'
-        
+            return _run_ingestion(self, customer_file, loan_file, fingerprints, generation, force, lock, profiler, lean)
+        finally:
+            lock.release()
+            profiler.stop()
+            if profile:
+                profiler.write_json(profile)
+
+    except Retry:
+        raise
+    except Exception as e:
+        return f"Ingestion failed: {str(e)}"
+
+
+def _read_mapped_frame(kind, path, fingerprint, map_columns, fields, lean, profiler):
+    """
+    Read a source file and rename its columns to ingestion field names.
+
+    In lean mode the mapping is resolved from the header row first so only
+    the mapped columns are loaded, and the frame is stored in compact dtypes.
+    Returns the frame or an error string.
+    """
+    usecols = None
+    if lean:
         try:
-            loan_df = loan_df.rename(columns=loan_column_mapping)
+            with profiler.stage('column mapping'):
+                mapping = map_columns(ingest_cache.read_header(path, fingerprint))
+                usecols = ingestion.source_columns(mapping, fields)
         except Exception as e:
-            return f"Error renaming loan columns: {str(e)}"
-
-        required_customer_cols = ['customer_id', 'first_name', 'last_name', 'phone_number', 'monthly_salary', 'approved_limit']
-        required_loan_cols = ['customer_id', 'loan_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_payment', 'emis_paid_on_time', 'start_date', 'end_date']
-        
-        missing_customer_cols = [col for col in required_customer_cols if col not in customer_df.columns]
-        missing_loan_cols = [col for col in required_loan_cols if col not in loan_df.columns]
-        
-        if missing_customer_cols:
-            return f"Missing customer columns: {missing_customer_cols}. Available: {list(customer_df.columns)}"
-        if missing_loan_cols:
-            return f"Missing loan columns: {missing_loan_cols}. Available: {list(loan_df.columns)}"
+            return f"Error reading {kind} header: {str(e)}"
+
+    try:
+        with profiler.stage('file read') as stage:
+            df = ingest_cache.read_frame(path, fingerprint, columns=usecols)
+            stage['rows'] = len(df)
+    except Exception as e:
+        return f"Error reading {kind} file: {str(e)}"
+
+    try:
+        with profiler.stage('column mapping'):
+            df = df.rename(columns=mapping if lean else map_columns(df.columns))
+            if lean:
+                df = ingestion.compact_frame(df, categorical=ingestion.NAME_COLUMNS)
+    except Exception as e:
+        return f"Error renaming {kind} columns: {str(e)}"
+
+    return df
+
+
+def _ensure_loan_partitions(loan_df):
+    """Create the yearly partitions the source's loans will land in, so none fall into the default one"""
+    years = pd.to_datetime(loan_df['end_date'], errors='coerce').dt.year.dropna()
+    if len(years):
+        partitions.ensure_partitions(int(years.min()), int(years.max()))
+    else:
+        partitions.ensure_partitions()
+
 
+def _run_ingestion(task, customer_file, loan_file, fingerprints, generation, force, lock, profiler, lean):
+    customer_df = _read_mapped_frame(
+        'customer', customer_file, fingerprints.get(customer_file),
+        ingestion.map_customer_columns, ingestion.CUSTOMER_FIELDS, lean, profiler,
+    )
+    if isinstance(customer_df, str):
+        return customer_df
+
+    loan_df = _read_mapped_frame(
+        'loan', loan_file, fingerprints.get(loan_file),
+        ingestion.map_loan_columns, ingestion.REQUIRED_LOAN_COLUMNS, lean, profiler,
+    )
+    if isinstance(loan_df, str):
+        return loan_df
+
+    missing_customer_cols = ingestion.missing_columns(customer_df, ingestion.REQUIRED_CUSTOMER_COLUMNS)
+    missing_loan_cols = ingestion.missing_columns(loan_df, ingestion.REQUIRED_LOAN_COLUMNS)
+
+    if missing_customer_cols:
+        return f"Missing customer columns: {missing_customer_cols}. Available: {list(customer_df.columns)}"
+    if missing_loan_cols:
+        return f"Missing loan columns: {missing_loan_cols}. Available: {list(loan_df.columns)}"
+
+    customer_cols = [col for col in ingestion.CUSTOMER_FIELDS if col in customer_df.columns]
+    loan_cols = ingestion.REQUIRED_LOAN_COLUMNS
+
+    # positions of the first occurrence of each id; chunks are taken from these so the
+    # frames themselves are never copied
+    with profiler.stage('dedupe') as stage:
+        stage['rows'] = len(customer_df) + len(loan_df)
+        customer_rows = ingestion.first_occurrence_positions(customer_df, 'customer_id')
+        loan_rows = ingestion.first_occurrence_positions(loan_df, 'loan_id')
+
+    task_id = task.request.id or uuid.uuid4().hex
+    job, resumed = _start_job(task_id, generation, force)
+
+    if not resumed:
         with transaction.atomic():
+            # on a partitioned loan table whole partitions are dropped rather than deleted row by row
+            partitions.drop_loan_partitions()
+            # the reload replaces the whole loan book, archived loans included
+            CustomerLoanHistory.objects.all().delete()
+            ArchivedLoan.objects.all().delete()
             Customer.objects.all().delete()
             Loan.objects.all().delete()
-            
-            customer_df = customer_df.drop_duplicates(subset=['customer_id'], keep='first')
-            loan_df = loan_df.drop_duplicates(subset=['loan_id'], keep='first')
-
-            for idx, row in customer_df.iterrows():
-                try:
-                    Customer.objects.create(
-                        customer_id=int(row['customer_id']),
-                        first_name=str(row['first_name']).strip(),
-                        last_name=str(row['last_name']).strip(),
-                        phone_number=int(row['phone_number']),
-                        monthly_salary=float(row['monthly_salary']),
-                        approved_limit=float(row['approved_limit']),
-                        age=int(row['age']) if not pd.isna(row['age']) else None,
-                    )
-                except Exception as e:
-                    return f"Error creating customer {row.get('customer_id', 'unknown')}: {str(e)}"
-
-            loans_created = 0
-            loans_skipped = 0
-            
-            for idx, row in loan_df.iterrows():
-                try:
-                    customer = Customer.objects.get(customer_id=int(row['customer_id']))
-                    
-                    start_date = None
-                    end_date = None
-                    
-                    if not pd.isna(row['start_date']):
-                        start_date_str = str(row['start_date'])
-                        if start_date_str and start_date_str != 'nan':
-                            if len(start_date_str) == 10 and start_date_str.count('-') == 2:
-                                start_date = parse_date(start_date_str)
-                            else:
-                                try:
-                                    start_date = pd.to_datetime(row['start_date']).date()
-                                except:
-                                    pass
-                    
-                    if not pd.isna(row['end_date']):
-                        end_date_str = str(row['end_date'])
-                        if end_date_str and end_date_str != 'nan':
-                            if len(end_date_str) == 10 and end_date_str.count('-') == 2:
-                                end_date = parse_date(end_date_str)
-                            else:
-                                try:
-                                    end_date = pd.to_datetime(row['end_date']).date()
-                                except:
-                                    pass
-                    
-                    if start_date is None or end_date is None:
-                        loans_skipped += 1
-                        continue
-                    
-                    Loan.objects.create(
-                        customer=customer,
-                        loan_id=int(row['loan_id']),
-                        loan_amount=float(row['loan_amount']),
-                        tenure=int(row['tenure']),
-                        interest_rate=float(row['interest_rate']),
-                        monthly_repayment=float(row['monthly_payment']),
-                        emis_paid_on_time=int(row['emis_paid_on_time']),
-                        start_date=start_date,
-                        end_date=end_date,
-                    )
-                    loans_created += 1
-                    
-                except Customer.DoesNotExist:
-                    loans_skipped += 1
-                    continue
-                except Exception as e:
-                    return f"Error creating loan {row.get('loan_id', 'unknown')}: {str(e)}"
-
-        return f"Ingestion complete: {Customer.objects.count()} customers, {loans_created} loans" + (f", {loans_skipped} skipped" if loans_skipped > 0 else "")
+            job.customers_total = len(customer_rows)
+            job.loans_total = len(loan_rows)
+            job.save(update_fields=['customers_total', 'loans_total', 'updated_at'])
+        customer_cache.invalidate_all()
+
+    chunk_size = settings.INGEST_CHUNK_SIZE
+    _publish_progress(task, job)
+
+    for start in range(job.customer_offset, len(customer_rows), chunk_size):
+        chunk = customer_df.iloc[customer_rows[start:start + chunk_size]][customer_cols]
+        try:
+            with profiler.stage('customer write', rows=len(chunk)):
+                customers = ingestion.build_customers(chunk)
+                with transaction.atomic():
+                    Customer.objects.bulk_create(customers)
+                    job.customer_offset = start + len(chunk)
+                    job.save(update_fields=['customer_offset', 'updated_at'])
+        except ingestion.RowError as e:
+            return _fail(job, str(e))
+        except Exception as e:
+            return _fail(job, f"Error creating customers at rows {start}-{start + len(chunk) - 1}: {str(e)}")
+        lock.refresh()
+        _publish_progress(task, job)
+
+    if job.stage == IngestionJob.STAGE_CUSTOMERS:
+        job.stage = IngestionJob.STAGE_LOANS
+        job.save(update_fields=['stage', 'updated_at'])
+
+    if partitions.is_partitioned():
+        with profiler.stage('partitions'):
+            _ensure_loan_partitions(loan_df)
+
+    for start in range(job.loan_offset, len(loan_rows), chunk_size):
+        chunk = loan_df.iloc[loan_rows[start:start + chunk_size]][loan_cols]
+        try:
+            with profiler.stage('loan FK resolution', rows=len(chunk)):
+                chunk_customer_ids = pd.to_numeric(chunk['customer_id'], errors='coerce').dropna().astype(int).unique().tolist()
+                known_customer_ids = set(
+                    Customer.objects.filter(customer_id__in=chunk_customer_ids).values_list('customer_id', flat=True)
+                )
+            with profiler.stage('date parsing', rows=len(chunk)):
+                chunk = ingestion.parse_loan_dates(chunk)
+            with profiler.stage('loan write', rows=len(chunk)):
+                loans, skipped = ingestion.build_loans(chunk, known_customer_ids)
+                with transaction.atomic():
+                    Loan.objects.bulk_create(loans)
+                    job.loan_offset = start + len(chunk)
+                    job.loans_created += len(loans)
+                    job.loans_skipped += skipped
+                    job.save(update_fields=['loan_offset', 'loans_created', 'loans_skipped', 'updated_at'])
+        except ingestion.RowError as e:
+            return _fail(job, str(e))
+        except Exception as e:
+            return _fail(job, f"Error creating loans at rows {start}-{start + len(chunk) - 1}: {str(e)}")
+        lock.refresh()
+        _publish_progress(task, job)
+
+    customers_loaded = Customer.objects.count()
+    result = f"Ingestion complete: {customers_loaded} customers, {job.loans_created} loans" + (
+        f", {job.loans_skipped} skipped" if job.loans_skipped > 0 else ""
+    )
 
+    with transaction.atomic():
+        # customers were stamped before their loans were loaded
+        Customer.objects.update(loans_version=new_version())
+        if generation:
+            IngestionGeneration.objects.create(
+                fingerprint=generation,
+                customers_loaded=customers_loaded,
+                loans_loaded=job.loans_created,
+            )
+        job.stage = IngestionJob.STAGE_DONE
+        job.status = IngestionJob.STATUS_SUCCEEDED
+        job.message = result
+        job.finished_at = timezone.now()
+        job.save()
+
+    portfolio.invalidate()
+    customer_cache.invalidate_all()
+    return result
+
+
+@shared_task
+def ensure_loan_partitions():
+    """Keep LOAN_PARTITION_YEARS_AHEAD years of loan partitions ready; run daily by celery beat"""
+    created = partitions.ensure_partitions()
+    return f"Created loan partitions: {', '.join(created)}" if created else "Loan partitions up to date"
+
+
+@shared_task
+def archive_closed_loans(batch_size=None):
+    """Move closed loans out of the hot loan table; run daily by celery beat"""
+    archived = archive.archive_closed_loans(batch_size)
+    return f"Archived {archived} closed loans"
+
+
+@shared_task
+def process_loan_decisions(batch_size=None):
+    """Decide the queued asynchronous loan applications in micro-batches; also swept by celery beat"""
+    decided = decisions.drain(batch_size)
+    return f"Decided {decided} loan applications"
+
+
+@shared_task(acks_late=True)
+def ingest_repayment_feed(path, rejects_path=None, chunk_size=None):
+    """Apply a daily repayment feed (CSV or xlsx) to the loan EMI counters"""
+    if not os.path.exists(path):
+        return f"Repayment feed not found: {path}"
+
+    rejects_path = rejects_path or f"{path}.rejects.csv"
+    try:
+        stats = repayment_feed.process_feed(path, rejects_path, chunk_size or settings.REPAYMENT_FEED_CHUNK_SIZE)
     except Exception as e:
-        return f"Ingestion failed: {str(e)}"
+        return f"Repayment feed failed: {str(e)}"
+
+    return stats.summary() + (f". Rejects: {rejects_path}" if sum(stats.rejected.values()) else "")
@@ -1,14 +1,24 @@
-from django.test import TestCase, TransactionTestCase
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from unittest.mock import patch, MagicMock
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import json
+import os
+import shutil
+import tempfile
+import time
 
-from .models import Customer, Loan
+from .models import (
+    ArchivedLoan, Customer, CustomerLoanHistory, Loan, IngestionGeneration, IngestionJob, LoanDecision, RepaymentEvent,
+)
 from .views import LoanEligibilityView
-from .tasks import ingest_data
+from .tasks import archive_closed_loans, ensure_loan_partitions, ingest_data, ingest_repayment_feed
+from . import admission, customer_cache, export, ingest_cache, ingestion, partitions, repayments
+from .locks import CacheLock
+from .profiling import StageProfiler, format_table
 
 
 class CustomerModelTest(TestCase):
@@ -98,6 +108,42 @@ class LoanModelTest(TestCase):
         self.assertEqual(self.loan.customer.customer_id, 1)
         self.assertEqual(self.customer.loans.first(), self.loan)
 
+    def test_active_loans(self):
+        """Test the active-loan queryset keeps loans ending on or after today"""
+        Loan.objects.create(
+            loan_id=2, customer=self.customer, loan_amount=100000, tenure=12, interest_rate=10,
+            monthly_repayment=8791.59, emis_paid_on_time=12,
+            start_date=date(2020, 1, 1), end_date=date(2021, 1, 1),
+        )
+        self.assertEqual(list(Loan.objects.active(today=date(2026, 1, 1)).values_list('loan_id', flat=True)), [1])
+        self.assertEqual(Loan.objects.active(today=date(2020, 6, 1)).count(), 2)
+        self.assertEqual(Loan.objects.active(today=date(2027, 1, 25)).count(), 1)
+
+
+class LoanPartitionTest(TestCase):
+    """Partition maintenance is Postgres-only and a no-op elsewhere"""
+
+    def test_planned_years_cover_history_and_future(self):
+        with override_settings(LOAN_PARTITION_YEARS_AHEAD=3):
+            self.assertEqual(partitions.planned_years(today=date(2025, 6, 1)), [2025, 2026, 2027, 2028])
+            self.assertEqual(partitions.planned_years(2023, 2026, today=date(2025, 6, 1)), list(range(2023, 2029)))
+            self.assertEqual(partitions.planned_years(2023, 2035, today=date(2025, 6, 1)), list(range(2023, 2036)))
+
+    def test_partition_naming(self):
+        self.assertEqual(partitions.partition_name(2025), 'core_loan_y2025')
+        self.assertEqual(partitions.year_bounds(2025), (date(2025, 1, 1), date(2026, 1, 1)))
+
+    def test_noop_without_postgres(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(partitions.list_partitions(), [])
+        self.assertEqual(partitions.ensure_partitions(), [])
+        self.assertFalse(partitions.drop_loan_partitions())
+        self.assertEqual(ensure_loan_partitions(), "Loan partitions up to date")
+
+    def test_command_requires_partitioned_table(self):
+        with self.assertRaises(CommandError):
+            call_command('loan_partitions', 'list')
+
 
 class RegisterCustomerAPITest(APITestCase):
     """Test customer registration API endpoint"""
@@ -150,6 +196,73 @@ class RegisterCustomerAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class RegisterCustomerBatchAPITest(APITestCase):
+    """Test bulk customer registration endpoint"""
+
+    def setUp(self):
+        self.url = reverse('register-customer-batch')
+        Customer.objects.create(
+            customer_id=7,
+            first_name="Existing",
+            last_name="User",
+            phone_number=9999999999,
+            monthly_salary=50000,
+            approved_limit=1800000,
+            age=30
+        )
+
+    def _customer(self, phone, income=75000):
+        return {
+            "first_name": "John",
+            "last_name": "Doe",
+            "phone_number": str(phone),
+            "monthly_income": income,
+            "age": 28
+        }
+
+    def test_register_batch_success(self):
+        """Test a batch gets contiguous ids and per-row results"""
+        rows = [self._customer(9000000000 + i, income=50000 + 1000 * i) for i in range(5)]
+
+        # phone lookup, id allocation and one insert, plus the savepoint around them
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, {"customers": rows}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        ids = [result['customer']['customer_id'] for result in response.data['results']]
+        self.assertEqual(ids, [8, 9, 10, 11, 12])
+        for row, result in zip(rows, response.data['results']):
+            expected_limit = round((36 * row['monthly_income']) / 100000) * 100000
+            self.assertEqual(result['customer']['approved_limit'], expected_limit)
+
+    def test_register_batch_rejects_rows(self):
+        """Test duplicate and invalid rows are rejected while the rest are created"""
+        rows = [
+            self._customer(8000000001),
+            self._customer(9999999999),
+            self._customer(8000000001),
+            {"first_name": "", "phone_number": "abc"},
+        ]
+
+        response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'rejected', 'rejected', 'rejected'],
+        )
+        self.assertIn('phone_number', response.data['results'][1]['errors'])
+        self.assertIn('phone_number', response.data['results'][2]['errors'])
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_register_batch_empty(self):
+        """Test an empty batch is rejected"""
+        response = self.client.post(self.url, {"customers": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class LoanEligibilityAPITest(APITestCase):
     """Test loan eligibility checking API endpoint"""
     
@@ -250,6 +363,99 @@ class CreateLoanAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class CreateLoanBatchAPITest(APITestCase):
+    """Test bulk loan origination endpoint and command"""
+
+    def setUp(self):
+        self.url = reverse('create-loan-batch')
+        self.customer = Customer.objects.create(
+            customer_id=1,
+            first_name="Test",
+            last_name="User",
+            phone_number=9999999999,
+            monthly_salary=100000,
+            approved_limit=3600000,
+            age=30
+        )
+        Loan.objects.create(
+            loan_id=40,
+            customer=self.customer,
+            loan_amount=100000,
+            tenure=12,
+            interest_rate=10.0,
+            monthly_repayment=1000,
+            emis_paid_on_time=12,
+            start_date=date(2020, 1, 1),
+            end_date=date(2021, 1, 1)
+        )
+        self.application = {
+            "customer_id": 1,
+            "loan_amount": 500000,
+            "interest_rate": 10.0,
+            "tenure": 24
+        }
+
+    def test_batch_sees_earlier_approvals(self):
+        """Test later applications for a customer carry the EMIs approved before them"""
+        rows = [self.application, self.application, self.application,
+                {**self.application, "customer_id": 99999}, {"customer_id": 1}]
+
+        response = self.client.post(self.url, {"applications": rows}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['approved'], 2)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual(response.data['invalid'], 1)
+
+        results = response.data['results']
+        self.assertEqual([result['loan_id'] for result in results[:3]], [41, 42, None])
+        self.assertEqual(results[2]['message'], "Loan rejected based on credit assessment")
+        self.assertEqual(results[3]['message'], "Customer not found")
+        self.assertIn('loan_amount', results[4]['errors'])
+
+        expected_emi = round(LoanEligibilityView().calculate_monthly_installment(500000, 10.0, 24), 2)
+        self.assertEqual(results[0]['monthly_installment'], expected_emi)
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 3)
+
+    def test_batch_matches_single_decisions(self):
+        """Test the vectorised rules agree with the single-application rules"""
+        from . import origination, scoring
+
+        cases = [(current, score, rate) for current in (0, 20000, 45000)
+                 for score in (5, 20, 40, 70) for rate in (8.0, 14.0)]
+        projected = origination.monthly_installments([500000] * len(cases), [rate for _, _, rate in cases], [24] * len(cases))
+        approved, corrected = origination.approval_decisions(
+            [current for current, _, _ in cases], [100000] * len(cases),
+            [score for _, score, _ in cases], projected, [rate for _, _, rate in cases]
+        )
+        for i, (current, score, rate) in enumerate(cases):
+            expected = scoring.approval_decision(
+                current, 100000, score, scoring.monthly_installment(500000, rate, 24), rate
+            )
+            self.assertEqual((bool(approved[i]), float(corrected[i])), expected)
+
+    def test_create_loans_command(self):
+        """Test the command books a file and writes per-row results"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'campaign.csv')
+        with open(path, 'w') as fh:
+            fh.write("Customer ID,Loan Amount,Interest Rate,Tenure\n")
+            fh.write("1,500000,10,24\n1,500000,10,24\n2,100000,10,12\n")
+
+        out = StringIO()
+        call_command('create_loans', path, chunk_size=2, stdout=out)
+
+        self.assertIn('3 applications, 2 approved, 1 rejected, 0 invalid', out.getvalue())
+        with open(f'{path}.results.csv') as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[3].startswith('3,2,,False,Customer not found'))
+
+
 class ViewLoanAPITest(APITestCase):
     """Test loan viewing API endpoints"""
     
@@ -337,6 +543,1463 @@ class ViewLoanAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_view_loan_sparse_fields(self):
+        """Test ?fields= loads only the columns behind the requested fields"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('view-loan', kwargs={'loan_id': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'loan_id,tenure'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'loan_id': 1, 'tenure': 24})
+        loan_query = queries.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', loan_query)
+        self.assertNotIn('loan_amount', loan_query)
+
+    def test_view_loans_sparse_fields(self):
+        """Test a sparse loan list and the error for unknown fields"""
+        url = reverse('view-loans', kwargs={'customer_id': 1})
+        response = self.client.get(url, {'fields': 'loan_id,repayments_left'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'loan_id': 1, 'repayments_left': 24}])
+
+        response = self.client.get(url, {'fields': 'loan_id,customer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('customer', response.data['error'])
+
+    def test_view_loan_not_modified(self):
+        """Test a matching If-None-Match is answered from the version lookup alone"""
+        url = reverse('view-loan', kwargs={'loan_id': 1})
+        etag = self.client.get(url)['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        repayments.record_payment('etag-1', 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_view_loans_not_modified(self):
+        """Test the loan list ETag changes when one of the customer's loans does"""
+        url = reverse('view-loans', kwargs={'customer_id': 1})
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        repayments.bulk_increment_emis({1: 2})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['repayments_left'], 22)
+
+
+    def test_etag_differs_per_field_selection(self):
+        """Test an ETag for one ?fields= selection never validates another"""
+        for url in (reverse('view-loan', kwargs={'loan_id': 1}), reverse('view-loans', kwargs={'customer_id': 1})):
+            full = self.client.get(url)
+            sparse = self.client.get(url, {'fields': 'loan_id'})
+            self.assertNotEqual(full['ETag'], sparse['ETag'])
+
+            response = self.client.get(url, {'fields': 'loan_id'}, HTTP_IF_NONE_MATCH=full['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['ETag'], sparse['ETag'])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=sparse['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(url, {'fields': ' loan_id, loan_id '}, HTTP_IF_NONE_MATCH=sparse['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            response = self.client.get(url, {'fields': 'nonsense'}, HTTP_IF_NONE_MATCH=full['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecordPaymentAPITest(APITestCase):
+    """Test repayment event endpoints"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            customer_id=1,
+            first_name="Test",
+            last_name="User",
+            phone_number=9999999999,
+            monthly_salary=50000,
+            approved_limit=1800000,
+            age=30
+        )
+        for loan_id in (1, 2):
+            Loan.objects.create(
+                loan_id=loan_id,
+                customer=self.customer,
+                loan_amount=500000,
+                tenure=24,
+                interest_rate=10.5,
+                monthly_repayment=23188.02,
+                emis_paid_on_time=0,
+                start_date=date.today(),
+                end_date=date(2027, 1, 25)
+            )
+
+    def test_record_payment_applies_once(self):
+        """Test a repayment increments the counter and a retry is a no-op"""
+        url = reverse('record-payment')
+        payload = {"event_id": "evt-1", "loan_id": 1, "emis_paid": 2}
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'applied')
+        self.assertEqual(response.data['emis_paid_on_time'], 2)
+        self.assertEqual(response.data['repayments_left'], 22)
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'duplicate')
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 2)
+
+    def test_record_late_payment(self):
+        """Test a late payment is recorded without counting as on time"""
+        response = self.client.post(
+            reverse('record-payment'),
+            {"event_id": "evt-late", "loan_id": 1, "paid_on_time": False},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 0)
+        self.assertTrue(RepaymentEvent.objects.filter(event_id="evt-late").exists())
+
+    def test_record_payment_unknown_loan(self):
+        """Test a repayment for an unknown loan is rejected and not stored"""
+        response = self.client.post(
+            reverse('record-payment'),
+            {"event_id": "evt-x", "loan_id": 99999},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(RepaymentEvent.objects.exists())
+
+    def test_record_payment_capped_at_tenure(self):
+        """Test on-time EMIs never exceed the loan tenure"""
+        self.client.post(
+            reverse('record-payment'),
+            {"event_id": "evt-big", "loan_id": 1, "emis_paid": 30},
+            format='json'
+        )
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 24)
+
+    def test_record_payment_batch(self):
+        """Test a batch applies grouped increments and reports duplicates and unknown loans"""
+        RepaymentEvent.objects.create(event_id="evt-old", loan_id=1)
+        payload = {"payments": [
+            {"event_id": "evt-a", "loan_id": 1},
+            {"event_id": "evt-b", "loan_id": 1},
+            {"event_id": "evt-c", "loan_id": 2, "emis_paid": 3},
+            {"event_id": "evt-a", "loan_id": 1},
+            {"event_id": "evt-old", "loan_id": 1},
+            {"event_id": "evt-d", "loan_id": 99999},
+        ]}
+
+        response = self.client.post(reverse('record-payment-batch'), payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(response.data['duplicate'], 2)
+        self.assertEqual(response.data['loan_not_found'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['applied', 'applied', 'applied', 'duplicate', 'duplicate', 'loan_not_found'],
+        )
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 2)
+        self.assertEqual(Loan.objects.get(loan_id=2).emis_paid_on_time, 3)
+        self.assertEqual(RepaymentEvent.objects.count(), 4)
+
+
+class RepaymentFeedTest(TestCase):
+    """Test streaming ingestion of the daily repayment feed"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            customer_id=1,
+            first_name="Test",
+            last_name="User",
+            phone_number=9999999999,
+            monthly_salary=50000,
+            approved_limit=1800000,
+            age=30
+        )
+        for loan_id in (1, 2):
+            Loan.objects.create(
+                loan_id=loan_id,
+                customer=self.customer,
+                loan_amount=500000,
+                tenure=24,
+                interest_rate=10.5,
+                monthly_repayment=23188.02,
+                emis_paid_on_time=0,
+                start_date=date.today(),
+                end_date=date(2027, 1, 25)
+            )
+        self.feed_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.feed_dir)
+
+    def _write_csv(self, lines):
+        path = os.path.join(self.feed_dir, 'repayments.csv')
+        with open(path, 'w') as fh:
+            fh.write('\n'.join(lines) + '\n')
+        return path
+
+    def _read_rejects(self, path):
+        import csv
+        with open(path) as fh:
+            return list(csv.DictReader(fh))
+
+    def test_feed_applies_grouped_increments(self):
+        """Test a CSV feed is applied in chunks and rejects are reported"""
+        RepaymentEvent.objects.create(event_id="old-1", loan_id=1)
+        path = self._write_csv([
+            'Event ID,Loan ID,EMIs Paid,Paid On Time',
+            'e1,1,1,true',
+            'e2,1,2,true',
+            'e3,2,1,false',
+            'e1,1,1,true',
+            'old-1,1,1,true',
+            'e4,99999,1,true',
+            'e5,not-a-loan,1,true',
+            'e6,2,1,yes',
+        ])
+
+        result = ingest_repayment_feed(path, chunk_size=3)
+
+        self.assertIn("Repayment feed complete: 8 rows, 4 applied", result)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 3)
+        self.assertEqual(Loan.objects.get(loan_id=2).emis_paid_on_time, 1)
+        self.assertEqual(RepaymentEvent.objects.count(), 5)
+
+        rejects = self._read_rejects(f"{path}.rejects.csv")
+        self.assertEqual(
+            [(row['row'], row['reason']) for row in rejects],
+            [('4', 'duplicate_event'), ('5', 'duplicate_event'), ('6', 'unknown_loan'), ('7', 'invalid_row')],
+        )
+
+    def test_feed_retries_chunk_after_concurrent_payment(self):
+        """Test an event id recorded concurrently mid-chunk becomes a duplicate instead of failing the feed"""
+        from . import repayment_feed
+        path = self._write_csv(['event_id,loan_id', 'e1,1', 'e2,2'])
+        real_plan_chunk = repayment_feed._plan_chunk
+        calls = {'count': 0}
+
+        def plan_then_concurrent_payment(events):
+            calls['count'] += 1
+            plan = real_plan_chunk(events)
+            if calls['count'] == 1:
+                # /record-payment stores e1 between the chunk's duplicate check and its insert
+                repayments.record_payment('e1', 1)
+            return plan
+
+        with patch('core.repayment_feed._plan_chunk', side_effect=plan_then_concurrent_payment):
+            result = ingest_repayment_feed(path)
+
+        self.assertIn("2 rows, 1 applied", result)
+        self.assertIn("1 duplicates", result)
+        self.assertEqual(calls['count'], 2)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 1)
+        self.assertEqual(Loan.objects.get(loan_id=2).emis_paid_on_time, 1)
+        rejects = self._read_rejects(f"{path}.rejects.csv")
+        self.assertEqual([(row['event_id'], row['reason']) for row in rejects], [('e1', 'duplicate_event')])
+
+    def test_feed_rerun_is_idempotent(self):
+        """Test replaying the same feed changes nothing"""
+        path = self._write_csv(['event_id,loan_id', 'e1,1', 'e2,2'])
+        ingest_repayment_feed(path)
+        result = ingest_repayment_feed(path)
+
+        self.assertIn("0 applied", result)
+        self.assertIn("2 duplicates", result)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 1)
+
+    def test_feed_reads_xlsx(self):
+        """Test an xlsx feed is streamed row by row"""
+        from openpyxl import Workbook
+
+        path = os.path.join(self.feed_dir, 'repayments.xlsx')
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Transaction Reference', 'Loan ID', 'Late'])
+        sheet.append(['x1', 1, 'no'])
+        sheet.append(['x2', 1, 'yes'])
+        workbook.save(path)
+
+        result = ingest_repayment_feed(path)
+
+        self.assertIn("2 applied", result)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 1)
+
+    def test_bulk_increment_caps_at_tenure(self):
+        """Test the VALUES update adds per-loan totals and respects the tenure"""
+        updated = repayments.bulk_increment_emis({1: 5, 2: 30})
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(Loan.objects.get(loan_id=1).emis_paid_on_time, 5)
+        self.assertEqual(Loan.objects.get(loan_id=2).emis_paid_on_time, 24)
+
+    def test_feed_missing_file(self):
+        """Test a missing feed file is reported"""
+        result = ingest_repayment_feed(os.path.join(self.feed_dir, 'missing.csv'))
+        self.assertIn("Repayment feed not found", result)
+
+
+class PortfolioAPITest(APITestCase):
+    """Test portfolio analytics endpoints"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.rich = Customer.objects.create(
+            customer_id=1, first_name="Rich", last_name="User", phone_number=9000000001,
+            monthly_salary=100000, approved_limit=3600000, age=40
+        )
+        self.stretched = Customer.objects.create(
+            customer_id=2, first_name="Stretched", last_name="User", phone_number=9000000002,
+            monthly_salary=10000, approved_limit=100000, age=30
+        )
+        Customer.objects.create(
+            customer_id=3, first_name="New", last_name="User", phone_number=9000000003,
+            monthly_salary=50000, approved_limit=1800000, age=25
+        )
+        Loan.objects.create(
+            loan_id=1, customer=self.rich, loan_amount=500000, tenure=12, interest_rate=10.0,
+            monthly_repayment=43958.0, emis_paid_on_time=12,
+            start_date=date(2020, 1, 1), end_date=date(2021, 1, 1)
+        )
+        Loan.objects.create(
+            loan_id=2, customer=self.rich, loan_amount=300000, tenure=36, interest_rate=14.0,
+            monthly_repayment=10253.0, emis_paid_on_time=3,
+            start_date=date.today(), end_date=date(2099, 1, 1)
+        )
+        Loan.objects.create(
+            loan_id=3, customer=self.stretched, loan_amount=200000, tenure=48, interest_rate=18.0,
+            monthly_repayment=5875.0, emis_paid_on_time=0,
+            start_date=date(2024, 1, 1), end_date=date(2099, 1, 1)
+        )
+
+    def test_summary(self):
+        """Test portfolio totals split active from repaid loans"""
+        response = self.client.get(reverse('portfolio-summary'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['customers'], 3)
+        self.assertEqual(response.data['customers_with_active_loans'], 2)
+        self.assertEqual(response.data['loans'], 3)
+        self.assertEqual(response.data['active_loans'], 2)
+        self.assertEqual(response.data['total_exposure'], 1000000)
+        self.assertEqual(response.data['active_exposure'], 500000)
+        self.assertEqual(response.data['active_emi'], 16128.0)
+
+    def test_breakdown(self):
+        """Test score, volume-ratio, rate and tenure buckets"""
+        response = self.client.get(reverse('portfolio-breakdown'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        scores = {row['bucket']: row['customers'] for row in response.data['credit_scores']}
+        # the stretched customer's active loans exceed their limit, the new one has no history
+        self.assertEqual(scores, {'0-10': 1, '11-30': 0, '31-50': 0, '51-100': 2})
+        ratios = {row['bucket']: row['customers'] for row in response.data['volume_ratios']}
+        self.assertEqual(ratios, {'<=0.5': 2, '0.5-1.0': 0, '1.0-1.5': 0, '>1.5': 1})
+        rates = {row['bucket']: row['loans'] for row in response.data['interest_rates']}
+        self.assertEqual(rates, {'<8': 0, '8-12': 1, '12-16': 1, '16+': 1})
+        tenures = {row['bucket']: row['active_exposure'] for row in response.data['tenures']}
+        self.assertEqual(tenures, {'<=12': 0, '13-24': 0, '25-36': 300000, '37+': 200000})
+
+    def test_unchanged_by_archival(self):
+        """Test archived loans still count towards the reports"""
+        from django.core.cache import cache
+        from .archive import archive_closed_loans
+
+        summary = self.client.get(reverse('portfolio-summary')).data
+        breakdown = self.client.get(reverse('portfolio-breakdown')).data
+        cache.clear()
+
+        self.assertEqual(archive_closed_loans(), 1)
+        self.assertEqual(self.client.get(reverse('portfolio-summary')).data, summary)
+        self.assertEqual(self.client.get(reverse('portfolio-breakdown')).data, breakdown)
+
+    def test_cached_until_ingestion(self):
+        """Test reports are served from cache and cleared by ingestion"""
+        from . import portfolio
+
+        self.client.get(reverse('portfolio-summary'))
+        Loan.objects.filter(loan_id=3).delete()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('portfolio-summary'))
+        self.assertEqual(response.data['loans'], 3)
+
+        portfolio.invalidate()
+        response = self.client.get(reverse('portfolio-summary'))
+        self.assertEqual(response.data['loans'], 2)
+
+
+class ExportTest(TransactionTestCase):
+    """Test streaming exports and their round trip through ingestion"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        for customer_id in range(1, 4):
+            customer = Customer.objects.create(
+                customer_id=customer_id, first_name=f"First{customer_id}", last_name="User",
+                phone_number=9000000000 + customer_id, monthly_salary=50000.0 * customer_id,
+                approved_limit=1800000.0 * customer_id, age=None if customer_id == 3 else 30
+            )
+            Loan.objects.create(
+                loan_id=10 + customer_id, customer=customer, loan_amount=100000.0 * customer_id,
+                tenure=12, interest_rate=10.5, monthly_repayment=8815.0, emis_paid_on_time=customer_id,
+                start_date=date(2020, customer_id, 1),
+                end_date=date(2021, 1, 1) if customer_id == 1 else date(2099, 1, 1)
+            )
+
+    def _snapshot(self):
+        # version stamps are not exported; a reload stamps fresh ones
+        return (
+            list(Customer.objects.order_by('customer_id').values(*[field for _, field in export.CUSTOMER_COLUMNS])),
+            list(Loan.objects.order_by('loan_id').values(*[field for _, field in export.LOAN_COLUMNS[:9]])),
+        )
+
+    def test_export_round_trips_through_ingestion(self):
+        """Test gzipped CSV and Parquet exports load back unchanged"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        customers_path = os.path.join(self.tmpdir, 'customers.csv.gz')
+        loans_path = os.path.join(self.tmpdir, 'loans.parquet')
+        call_command('export_data', 'customers', customers_path, chunk_size=2, stdout=StringIO())
+        call_command('export_data', 'loans', loans_path, chunk_size=2, stdout=StringIO())
+        before = self._snapshot()
+
+        Loan.objects.all().delete()
+        Customer.objects.all().delete()
+        result = ingest_data(force=True, customer_file=customers_path, loan_file=loans_path)
+
+        self.assertEqual(result, "Ingestion complete: 3 customers, 3 loans")
+        self.assertEqual(self._snapshot(), before)
+
+    def test_csv_endpoint_filters(self):
+        """Test the CSV stream honours active and customer-range filters"""
+        import csv
+        import gzip
+
+        response = self.client.get(reverse('export', args=['loans']), {
+            'active': 'true', 'customer_to': 2, 'gzip': 'true',
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual([row['Loan ID'] for row in rows], ['12'])
+        self.assertEqual(rows[0]['First Name'], 'First2')
+        self.assertEqual(rows[0]['Date of Approval'], '2020-02-01')
+
+    def test_parquet_endpoint(self):
+        """Test the Parquet download keeps column types"""
+        import io
+        import pandas as pd
+
+        response = self.client.get(reverse('export', args=['customers']), {'output': 'parquet', 'active': 'true'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        frame = pd.read_parquet(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(list(frame['Customer ID']), [2, 3])
+        self.assertEqual(str(frame['Phone Number'].dtype), 'int64')
+
+    def test_archived_loans_are_exported(self):
+        """Test archived loans stay in the loan export, filtered like live ones, and load back"""
+        import csv
+        from io import StringIO
+        from .archive import archive_closed_loans as archive_loans
+
+        self.assertEqual(archive_loans(), 1)
+        self.assertFalse(Loan.objects.filter(loan_id=11).exists())
+
+        response = self.client.get(reverse('export', args=['loans']), {'customer_to': 2})
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['Loan ID'] for row in rows], ['11', '12'])
+        self.assertEqual(rows[0]['First Name'], 'First1')
+        self.assertEqual(rows[0]['End Date'], '2021-01-01')
+
+        response = self.client.get(reverse('export', args=['loans']), {'active': 'true', 'customer_to': 1})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[1:], [])
+        response = self.client.get(reverse('export', args=['customers']), {'start_to': '2020-01-31'})
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['Customer ID'] for row in rows], ['1'])
+
+        customers_path = os.path.join(self.tmpdir, 'customers.csv')
+        loans_path = os.path.join(self.tmpdir, 'loans.csv')
+        call_command('export_data', 'customers', customers_path, stdout=StringIO())
+        call_command('export_data', 'loans', loans_path, stdout=StringIO())
+        result = ingest_data(force=True, customer_file=customers_path, loan_file=loans_path)
+        self.assertEqual(result, "Ingestion complete: 3 customers, 3 loans")
+        self.assertEqual(sorted(Loan.objects.values_list('loan_id', flat=True)), [11, 12, 13])
+
+    def test_unknown_export(self):
+        response = self.client.get(reverse('export', args=['payments']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoanArchiveTest(APITestCase):
+    """Test closed loans move to the archive without changing scores"""
+
+    def setUp(self):
+        this_year = date.today().year
+        self.customer = Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+        self.other = Customer.objects.create(
+            customer_id=2, first_name="Other", last_name="User", phone_number=9999999998,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+        closed = [
+            (1, self.customer, date(this_year - 10, 1, 1), date(this_year - 9, 1, 1)),
+            (2, self.customer, date(this_year - 8, 3, 1), date(this_year - 6, 3, 1)),
+            (3, self.other, date(this_year - 5, 1, 1), date(this_year - 4, 1, 1)),
+        ]
+        for loan_id, customer, start_date, end_date in closed:
+            Loan.objects.create(
+                loan_id=loan_id, customer=customer, loan_amount=100000 * loan_id, tenure=12,
+                interest_rate=10.0, monthly_repayment=8791.59, emis_paid_on_time=10 + loan_id,
+                start_date=start_date, end_date=end_date
+            )
+        Loan.objects.create(
+            loan_id=4, customer=self.customer, loan_amount=200000, tenure=24, interest_rate=12.0,
+            monthly_repayment=9414.69, emis_paid_on_time=2,
+            start_date=date.today(), end_date=date(this_year + 2, 12, 31)
+        )
+
+    def _scores(self):
+        from . import scoring
+        stats = scoring.customer_loan_stats([1, 2])
+        return stats, {
+            customer.customer_id: scoring.credit_score(customer)
+            for customer in Customer.objects.order_by('customer_id')
+        }
+
+    def _archive(self, batch_size=None):
+        from .archive import archive_closed_loans
+        return archive_closed_loans(batch_size)
+
+    def test_archival_keeps_scores(self):
+        """Test archived loans are folded into history so scores don't change"""
+        before = self._scores()
+        self.assertEqual(self._archive(batch_size=2), 3)
+
+        self.assertEqual(self._scores(), before)
+        self.assertEqual(list(Loan.objects.values_list('loan_id', flat=True)), [4])
+        self.assertEqual(ArchivedLoan.objects.count(), 3)
+        history = CustomerLoanHistory.objects.get(customer_id=1)
+        self.assertEqual((history.loan_count, history.total_tenure, history.total_emis_paid), (2, 24, 23))
+        self.assertEqual(history.total_amount, 300000)
+
+    def test_recent_and_active_loans_stay(self):
+        """Test loans that ended recently or are still running are not archived"""
+        from .archive import archivable_loans
+        Loan.objects.filter(loan_id=3).update(end_date=date.today() - timedelta(days=10))
+        self.assertEqual(set(archivable_loans().values_list('loan_id', flat=True)), {1, 2})
+
+    def test_new_loan_ids_continue_past_archived_loans(self):
+        """Test a loan created after the highest loan id is archived gets a fresh id"""
+        this_year = date.today().year
+        Loan.objects.create(
+            loan_id=5, customer=self.other, loan_amount=50000, tenure=12, interest_rate=10.0,
+            monthly_repayment=4395.79, emis_paid_on_time=12,
+            start_date=date(this_year - 6, 1, 1), end_date=date(this_year - 5, 1, 1)
+        )
+        self._archive()
+        self.assertTrue(ArchivedLoan.objects.filter(loan_id=5).exists())
+
+        response = self.client.post(reverse('create-loan'), {
+            'customer_id': 2, 'loan_amount': 10000, 'interest_rate': 16, 'tenure': 12
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['loan_id'], 6)
+
+    def test_view_loan_finds_archived_loans(self):
+        """Test view-loan serves an archived loan with a stable ETag"""
+        self._archive()
+        url = reverse('view-loan', kwargs={'loan_id': 2})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['loan_id'], 2)
+        self.assertEqual(response.data['customer']['id'], 1)
+        self.assertEqual(response.data['loan_amount'], 200000)
+        self.assertIn('ETag', response)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sparse = self.client.get(url, {'fields': 'loan_id,tenure'})
+        self.assertEqual(sparse.data, {'loan_id': 2, 'tenure': 12})
+        self.assertNotEqual(sparse['ETag'], response['ETag'])
+
+        self.assertEqual(self.client.get(reverse('view-loan', kwargs={'loan_id': 99})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_view_loans_include_archived(self):
+        """Test view-loans adds archived loans only when asked"""
+        self._archive()
+        url = reverse('view-loans', kwargs={'customer_id': 1})
+
+        hot = self.client.get(url)
+        self.assertEqual([loan['loan_id'] for loan in hot.data], [4])
+
+        everything = self.client.get(url, {'include_archived': 'true'})
+        self.assertEqual(sorted(loan['loan_id'] for loan in everything.data), [1, 2, 4])
+        self.assertNotEqual(everything['ETag'], hot['ETag'])
+
+        sparse = self.client.get(url, {'include_archived': 'true', 'fields': 'loan_id,repayments_left'})
+        self.assertEqual(sorted(sparse.data, key=lambda loan: loan['loan_id']), [
+            {'loan_id': 1, 'repayments_left': 1},
+            {'loan_id': 2, 'repayments_left': 0},
+            {'loan_id': 4, 'repayments_left': 22},
+        ])
+
+
+@override_settings(CUSTOMER_CACHE_SIZE=2, CUSTOMER_CACHE_TTL=60)
+class CustomerCacheTest(APITestCase):
+    """Test the per-process customer cache and its invalidation"""
+
+    def setUp(self):
+        customer_cache.reset()
+        self.addCleanup(customer_cache.reset)
+        for customer_id in range(1, 4):
+            Customer.objects.create(
+                customer_id=customer_id, first_name="Test", last_name="User",
+                phone_number=9000000000 + customer_id, monthly_salary=50000,
+                approved_limit=1800000, age=30
+            )
+
+    def test_repeat_lookup_is_cached(self):
+        """Test the second lookup of a customer skips the database"""
+        customer_cache.get_customer(1)
+        with self.assertNumQueries(0):
+            customer = customer_cache.get_customer(1)
+        self.assertEqual(customer.monthly_salary, 50000)
+
+        with self.assertRaises(Customer.DoesNotExist):
+            customer_cache.get_customer(99999)
+
+    def test_save_and_bus_messages_invalidate(self):
+        """Test saves and messages from other processes drop cached rows"""
+        customer = customer_cache.get_customer(1)
+        customer.monthly_salary = 90000
+        customer.save()
+        Customer.objects.filter(customer_id=1).update(approved_limit=100)
+
+        self.assertEqual(customer_cache.get_customer(1).approved_limit, 100)
+
+        Customer.objects.filter(customer_id=1).update(approved_limit=200)
+        customer_cache.get_bus().publish({'ids': [1]})
+        self.assertEqual(customer_cache.get_customer(1).approved_limit, 200)
+
+        customer_cache.get_customer(2)
+        customer_cache.get_bus().publish({'all': True})
+        self.assertEqual(customer_cache.stats()['size'], 0)
+
+    def test_eviction_and_stats(self):
+        """Test LRU eviction, TTL expiry and the stats endpoint"""
+        for customer_id in (1, 2, 1, 3):
+            customer_cache.get_customer(customer_id)
+
+        with self.assertNumQueries(0):
+            customer_cache.get_customer(1)
+
+        with override_settings(CUSTOMER_CACHE_TTL=0):
+            customer_cache.get_customer(2)
+            customer_cache.get_customer(2)
+
+        response = self.client.get(reverse('customer-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], 2)
+        self.assertEqual(response.data['misses'], 5)
+        self.assertEqual(response.data['evictions'], 2)
+        self.assertEqual(response.data['expirations'], 1)
+        self.assertEqual(response.data['hit_rate'], round(2 / 7, 4))
+
+    def test_views_use_cache(self):
+        """Test loan views resolve the customer from the cache"""
+        url = reverse('view-loans', kwargs={'customer_id': 1})
+        self.client.get(url)
+        # the customer lookup is served from the cache; only the version and loans queries remain
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+ADMISSION_TEST_CLASSES = {
+    'scoring': {
+        'routes': ['check-eligibility', 'create-loan'],
+        'concurrency': 1, 'queue': 0, 'queue_timeout': 0,
+        'rate': 0.01, 'burst': 2,
+        'shed_on_db_pressure': True,
+    },
+    'reads': {
+        'routes': ['view-loan', 'view-loans'],
+        'concurrency': 4, 'queue': 0, 'queue_timeout': 0,
+        'rate': 100, 'burst': 100,
+    },
+}
+
+
+@override_settings(ADMISSION_CONTROL_ENABLED=True, ADMISSION_CLASSES=ADMISSION_TEST_CLASSES)
+class AdmissionControlTest(APITestCase):
+    """Test per-class load shedding and rate limits"""
+
+    def setUp(self):
+        admission.reset()
+        self.addCleanup(admission.reset)
+        self.eligibility = {"customer_id": 99999, "loan_amount": 100000, "interest_rate": 10, "tenure": 12}
+
+    def _check(self):
+        return self.client.post(reverse('check-eligibility'), self.eligibility, format='json')
+
+    def _view(self):
+        return self.client.get(reverse('view-loan', kwargs={'loan_id': 99999}))
+
+    def test_rate_limit_per_client(self):
+        """Test a client over its token bucket gets 429 while other clients and classes pass"""
+        self.assertEqual(self._check().status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._check().status_code, status.HTTP_404_NOT_FOUND)
+
+        limited = self._check()
+        self.assertEqual(limited.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(limited['Retry-After']), 1)
+        self.assertIn('error', limited.json())
+
+        other = self.client.post(
+            reverse('check-eligibility'), self.eligibility, format='json', HTTP_X_CLIENT_ID='other'
+        )
+        self.assertEqual(other.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._view().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrency_cap_sheds_with_503(self):
+        """Test a full scoring class sheds new requests without starving cheap reads"""
+        scoring_class = admission.get_controller().route_class('check-eligibility')
+        self.assertTrue(scoring_class.acquire())
+        try:
+            shed = self._check()
+            self.assertEqual(shed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(shed['Retry-After'], '1')
+            self.assertEqual(self._view().status_code, status.HTTP_404_NOT_FOUND)
+        finally:
+            scoring_class.release()
+
+        self.assertEqual(self._check().status_code, status.HTTP_404_NOT_FOUND)
+        stats = self.client.get(reverse('admission-stats')).data['classes']
+        self.assertEqual(stats['scoring']['overloaded'], 1)
+        self.assertEqual(stats['scoring']['admitted'], 1)
+        self.assertEqual(stats['scoring']['in_flight'], 0)
+        self.assertEqual(stats['reads']['admitted'], 1)
+
+    def test_database_pressure_sheds_scoring_only(self):
+        """Test a backed-up connection pool sheds scoring but not reads"""
+        with patch.object(admission.DatabasePressure, '__call__', return_value=True):
+            self.assertEqual(self._check().status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(self._view().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unclassified_routes_pass(self):
+        """Test routes outside every class are not limited"""
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('portfolio-summary')).status_code, status.HTTP_200_OK)
+
+
+class SlowQueryLogTest(APITestCase):
+    """Test the slow-query log and its summary"""
+
+    def setUp(self):
+        from . import slow_queries
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir, ignore_errors=True)
+        self.addCleanup(slow_queries.reset_writer)
+        slow_queries.reset_writer()
+        self.log_path = os.path.join(self.log_dir, 'slow.jsonl')
+        Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+
+    def _records(self):
+        from . import slow_queries
+        slow_queries.reset_writer()
+        return list(slow_queries.read_records(self.log_path))
+
+    def test_normalize_sql(self):
+        """Test literals, placeholders and IN lists are normalized away"""
+        from .slow_queries import normalize_sql
+        self.assertEqual(
+            normalize_sql("SELECT * FROM core_loan_y2025 WHERE id IN (%s, %s,  %s) AND name = 'x''y' AND n > 10"),
+            "SELECT * FROM core_loan_y2025 WHERE id IN (...) AND name = ? AND n > ?",
+        )
+
+    def test_views_and_tasks_are_tagged(self):
+        """Test statements are logged with their view or task and parameter shapes"""
+        with override_settings(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_PATH=self.log_path):
+            self.client.get(reverse('view-loans', kwargs={'customer_id': 1}))
+            archive_closed_loans.delay()
+
+        records = self._records()
+        sources = {record['source'] for record in records}
+        self.assertEqual(sources, {'core.views.ViewLoansView', 'core.tasks.archive_closed_loans'})
+        loan_query = next(record for record in records if 'FROM "core_loan"' in record['sql'])
+        self.assertEqual(loan_query['params'], ['int'])
+        self.assertNotIn('explain', loan_query)
+
+    def test_disabled_and_fast_queries_are_not_logged(self):
+        """Test nothing is written when disabled or below the threshold"""
+        self.client.get(reverse('view-loans', kwargs={'customer_id': 1}))
+        with override_settings(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=60000, SLOW_QUERY_LOG_PATH=self.log_path):
+            self.client.get(reverse('view-loans', kwargs={'customer_id': 1}))
+        self.assertEqual(self._records(), [])
+
+    def test_each_process_writes_its_own_file(self):
+        """Test the log is split per process, a forked child starts its own file and reads merge them all"""
+        from .jsonl_log import JsonlLog, process_path
+        log = JsonlLog('SLOW_QUERY_LOG_PATH', 'SLOW_QUERY_LOG_MAX_BYTES', 'SLOW_QUERY_LOG_BACKUPS')
+        self.addCleanup(log.close)
+        with override_settings(SLOW_QUERY_LOG_PATH=self.log_path, SLOW_QUERY_LOG_MAX_BYTES=60, SLOW_QUERY_LOG_BACKUPS=3):
+            log.write({'n': 1}, {'n': 2})
+            with patch('core.jsonl_log.os.getpid', return_value=424242):
+                log.write({'n': 3})
+            log.write({'n': 4, 'padding': 'x' * 40})
+
+        self.assertFalse(os.path.exists(self.log_path))
+        own_file = process_path(self.log_path, os.getpid())
+        self.assertTrue(os.path.exists(f'{own_file}.1'))
+        with open(process_path(self.log_path, 424242)) as child_file:
+            self.assertEqual([json.loads(line) for line in child_file], [{'n': 3}])
+        self.assertEqual(sorted(record['n'] for record in log.read(self.log_path)), [1, 2, 3, 4])
+
+    def test_summary_command(self):
+        """Test the summary ranks statements by total time"""
+        from io import StringIO
+        records = [
+            {'fingerprint': 'a', 'sql': 'SELECT a', 'source': 'core.views.A', 'duration_ms': 50.0},
+            {'fingerprint': 'b', 'sql': 'SELECT b', 'source': 'core.views.B', 'duration_ms': 120.0},
+            {'fingerprint': 'a', 'sql': 'SELECT a', 'source': 'core.tasks.c', 'duration_ms': 100.0},
+        ]
+        with open(self.log_path, 'w') as log_file:
+            log_file.writelines(json.dumps(record) + '\n' for record in records)
+        with open(f'{self.log_path}.1', 'w') as log_file:
+            log_file.write(json.dumps(records[1]) + '\n')
+
+        out = StringIO()
+        call_command('slow_queries', path=self.log_path, stdout=out)
+        output = out.getvalue()
+        self.assertIn('4 slow statements, 2 distinct', output)
+        self.assertLess(output.index('#1 b: 2 runs, total 240.0 ms'), output.index('#2 a: 2 runs, total 150.0 ms'))
+        self.assertIn('core.views.A (1)', output)
+
+
+class TracingTest(APITestCase):
+    """Test sampled request and task tracing and the flame-graph command"""
+
+    def setUp(self):
+        from . import tracing
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir, ignore_errors=True)
+        self.addCleanup(tracing.reset_writer)
+        tracing.reset_writer()
+        self.log_path = os.path.join(self.log_dir, 'traces.jsonl')
+        Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+
+    def _spans(self):
+        from . import tracing
+        tracing.reset_writer()
+        return list(tracing.read_spans(self.log_path))
+
+    def test_create_loan_spans_are_nested(self):
+        """Test a sampled create-loan request records validation, queries, scoring, EMI and rendering under one root"""
+        with override_settings(TRACE_SAMPLE_RATE=1, TRACE_LOG_PATH=self.log_path):
+            response = self.client.post(reverse('create-loan'), {
+                'customer_id': 1, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        spans = self._spans()
+        self.assertEqual(len({span['trace_id'] for span in spans}), 1)
+        by_id = {span['span_id']: span for span in spans}
+        root = next(span for span in spans if span['parent_id'] is None)
+        self.assertEqual(root['name'], 'core.views.CreateLoanView')
+        self.assertEqual(root['attrs']['status'], 201)
+
+        names = {span['name'] for span in spans}
+        for name in ['validate', 'sql', 'core.scoring.credit_score', 'core.scoring.customer_loan_stats',
+                     'core.scoring.monthly_installment', 'create_loan', 'render']:
+            self.assertIn(name, names)
+        stats = next(span for span in spans if span['name'] == 'core.scoring.customer_loan_stats')
+        self.assertEqual(by_id[stats['parent_id']]['name'], 'core.scoring.credit_score')
+        self.assertTrue(any(
+            span['name'] == 'sql' and span['parent_id'] == stats['span_id'] for span in spans
+        ))
+
+    def test_unsampled_requests_are_not_traced(self):
+        """Test nothing is written at a zero sample rate and instrumented code still runs"""
+        from . import scoring, tracing
+        with override_settings(TRACE_SAMPLE_RATE=0, TRACE_LOG_PATH=self.log_path):
+            response = self.client.post(reverse('check-eligibility'), {
+                'customer_id': 1, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(tracing.active())
+        self.assertEqual(round(scoring.monthly_installment(100000, 0, 10)), 10000)
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_tasks_are_traced(self):
+        """Test a sampled core task is written as its own trace"""
+        with override_settings(TRACE_SAMPLE_RATE=1, TRACE_LOG_PATH=self.log_path):
+            ingest_data.delay(customer_file='/nonexistent.xlsx', loan_file='/nonexistent.xlsx')
+        roots = [span for span in self._spans() if span['parent_id'] is None]
+        self.assertEqual([root['name'] for root in roots], ['core.tasks.ingest_data'])
+        self.assertEqual(roots[0]['attrs']['state'], 'SUCCESS')
+
+    def test_folded_stacks_use_self_time(self):
+        """Test each stack is charged only the time not spent in its children"""
+        from .tracing import folded_stacks
+        spans = [
+            {'span_id': 'r', 'parent_id': None, 'name': 'view', 'duration_ms': 10.0},
+            {'span_id': 'a', 'parent_id': 'r', 'name': 'sql', 'duration_ms': 3.0},
+            {'span_id': 'b', 'parent_id': 'r', 'name': 'sql', 'duration_ms': 2.0},
+            {'span_id': 'c', 'parent_id': 'r', 'name': 'score', 'duration_ms': 4.0},
+            {'span_id': 'd', 'parent_id': 'c', 'name': 'sql', 'duration_ms': 4.0},
+        ]
+        self.assertEqual(folded_stacks(spans), {
+            'view': 1000, 'view;sql': 5000, 'view;score': 0, 'view;score;sql': 4000,
+        })
+
+    def test_flamegraph_command(self):
+        """Test the command folds only the traces matching its filters"""
+        from io import StringIO
+        spans = [
+            {'trace_id': 't1', 'span_id': 'r1', 'parent_id': None, 'name': 'core.views.CreateLoanView', 'duration_ms': 5.0},
+            {'trace_id': 't1', 'span_id': 's1', 'parent_id': 'r1', 'name': 'sql', 'duration_ms': 2.0},
+            {'trace_id': 't2', 'span_id': 'r2', 'parent_id': None, 'name': 'core.views.CreateLoanView', 'duration_ms': 50.0},
+            {'trace_id': 't2', 'span_id': 's2', 'parent_id': 'r2', 'name': 'sql', 'duration_ms': 45.0},
+            {'trace_id': 't3', 'span_id': 'r3', 'parent_id': None, 'name': 'core.tasks.ingest_data', 'duration_ms': 90.0},
+        ]
+        with open(self.log_path, 'w') as log_file:
+            log_file.writelines(json.dumps(span) + '\n' for span in spans)
+
+        out, err = StringIO(), StringIO()
+        call_command('trace_flamegraph', path=self.log_path, name='CreateLoanView', stdout=out, stderr=err)
+        self.assertEqual(out.getvalue().splitlines(), ['core.views.CreateLoanView 8000', 'core.views.CreateLoanView;sql 47000'])
+        self.assertIn('Folded 2 traces into 2 stacks', err.getvalue())
+
+        output_path = os.path.join(self.log_dir, 'stacks.folded')
+        call_command('trace_flamegraph', path=self.log_path, min_ms=20, output=output_path, stdout=out, stderr=err)
+        with open(output_path) as output:
+            self.assertEqual(output.read().splitlines(), [
+                'core.tasks.ingest_data 90000', 'core.views.CreateLoanView 5000', 'core.views.CreateLoanView;sql 45000',
+            ])
+
+
+class StartupBudgetTest(TestCase):
+    """Test process cold starts stay within budget and leave the data stack unloaded"""
+
+    def test_web_worker_cold_start_within_budget(self):
+        """Test a fresh web worker boots within the time and RSS budget without importing pandas or numpy"""
+        from .startup import budget_violations, measure
+        report = measure('web')
+        self.assertEqual(report['lazy_modules_loaded'], [])
+        self.assertEqual(budget_violations(report), [])
+
+    def test_celery_worker_does_not_import_pandas(self):
+        """Test loading every task module leaves pandas for the tasks that use it"""
+        from .startup import measure
+        self.assertEqual(measure('worker')['lazy_modules_loaded'], [])
+
+    def test_parse_importtime(self):
+        """Test -X importtime rows are parsed and summed per package"""
+        from .startup import by_package, parse_importtime
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     django.utils\n"
+            "import time:       300 |        420 |   django\n"
+            "import time:        50 |         50 | core.lazy\n"
+        )
+        modules = parse_importtime(stderr)
+        self.assertEqual(modules[1], {'module': 'django', 'self_us': 300, 'cumulative_us': 420, 'depth': 1})
+        self.assertEqual(modules[2]['depth'], 0)
+        self.assertEqual(by_package(modules), [{'module': 'django', 'self_us': 420}, {'module': 'core', 'self_us': 50}])
+
+    def test_lazy_module_patching_reaches_real_module(self):
+        """Test patching through a lazy module patches the module itself and is undone afterwards"""
+        import pandas
+        from .lazy import pd
+        original = pandas.read_csv
+        with patch('core.ingest_cache.pd.read_csv', return_value='patched'):
+            self.assertEqual(pandas.read_csv(), 'patched')
+            self.assertEqual(pd.read_csv(), 'patched')
+        self.assertIs(pandas.read_csv, original)
+        self.assertIs(pd.read_csv, original)
+
+    def test_budget_violations(self):
+        """Test a slow, heavy boot that imported pandas is reported"""
+        from .startup import budget_violations
+        with override_settings(STARTUP_BUDGET_SECONDS=1, STARTUP_BUDGET_RSS_MB=100):
+            violations = budget_violations({'wall_seconds': 2.5, 'max_rss_kb': 150 * 1024, 'lazy_modules_loaded': ['pandas']})
+        self.assertEqual(len(violations), 3)
+        self.assertIn('pandas was imported at startup', violations)
+
+
+class IdempotencyKeyTest(APITestCase):
+    """Test Idempotency-Key replay on create-loan and register"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+        self.loan_request = {'customer_id': 1, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12}
+
+    def test_create_loan_is_replayed_without_scoring(self):
+        """Test a repeated key returns the first response and creates one loan"""
+        url = reverse('create-loan')
+        first = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with patch.object(LoanEligibilityView, 'calculate_credit_score') as mock_score:
+            second = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        mock_score.assert_not_called()
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.count(), 1)
+
+        third = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='retry-2')
+        self.assertNotEqual(third.data['loan_id'], first.data['loan_id'])
+        self.assertEqual(Loan.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        """Test a key sent with a different body gets 422 and no loan"""
+        url = reverse('create-loan')
+        self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='reused')
+        response = self.client.post(url, {**self.loan_request, 'loan_amount': 5000}, format='json', HTTP_IDEMPOTENCY_KEY='reused')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Loan.objects.count(), 1)
+
+    def test_keys_are_scoped_per_client(self):
+        """Test two clients sending the same key each get their own loan, never the other's response"""
+        url = reverse('create-loan')
+        first = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='shared', REMOTE_ADDR='10.0.0.1')
+        second = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='shared', REMOTE_ADDR='10.0.0.2')
+        self.assertNotEqual(second.data['loan_id'], first.data['loan_id'])
+        self.assertNotIn('Idempotent-Replayed', second)
+        self.assertEqual(Loan.objects.count(), 2)
+
+        spoofed = self.client.post(
+            url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='shared', REMOTE_ADDR='10.0.0.3', HTTP_X_CLIENT_ID='x'
+        )
+        self.assertNotEqual(spoofed.data['loan_id'], first.data['loan_id'])
+
+    def test_key_reused_for_another_mode_is_rejected(self):
+        """Test the query string is part of the request a key is bound to"""
+        url = reverse('create-loan')
+        first = self.client.post(url, self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='mode')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url + '?async=true', self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='mode')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(LoanDecision.objects.exists())
+
+    def test_register_is_replayed(self):
+        """Test a retried registration returns the same customer instead of a duplicate-phone error"""
+        url = reverse('register-customer')
+        data = {'first_name': 'New', 'last_name': 'Customer', 'age': 28, 'monthly_income': 60000, 'phone_number': 8888888888}
+        first = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='register-1')
+        second = self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY='register-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data['customer_id'], first.data['customer_id'])
+        self.assertEqual(Customer.objects.filter(phone_number=8888888888).count(), 1)
+
+    def test_duplicate_waits_for_in_flight_original(self):
+        """Test a duplicate arriving while the original runs waits for its response"""
+        import threading
+        from django.core.cache import cache
+        stored = {'fingerprint': None, 'status': 201, 'data': {'loan_id': 42}}
+
+        from .idempotency import result_key
+        key = result_key('create-loan', 'addr:127.0.0.1', 'in-flight')
+        lock = CacheLock(key, 30)
+        self.assertTrue(lock.acquire())
+        finish = threading.Timer(0.2, lambda: (cache.set(key, stored), lock.release()))
+        with patch('core.idempotency.request_fingerprint', return_value=None):
+            finish.start()
+            response = self.client.post(reverse('create-loan'), self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='in-flight')
+        finish.join()
+        self.assertEqual(response.data, {'loan_id': 42})
+        self.assertEqual(Loan.objects.count(), 0)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.1)
+    def test_duplicate_gives_up_on_stuck_original(self):
+        """Test a duplicate gets 409 when the original outlasts the wait"""
+        from .idempotency import result_key
+        lock = CacheLock(result_key('create-loan', 'addr:127.0.0.1', 'stuck'), 30)
+        self.assertTrue(lock.acquire())
+        self.addCleanup(lock.release)
+        response = self.client.post(reverse('create-loan'), self.loan_request, format='json', HTTP_IDEMPOTENCY_KEY='stuck')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(Loan.objects.count(), 0)
+
+
+class AsyncLoanCreationTest(APITestCase):
+    """Test queued loan creation, its micro-batch drain and decision polling"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for customer_id in (1, 2):
+            Customer.objects.create(
+                customer_id=customer_id, first_name="Test", last_name="User", phone_number=9999999990 + customer_id,
+                monthly_salary=50000, approved_limit=1800000, age=30
+            )
+        self.loan_request = {'customer_id': 1, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12}
+
+    def test_async_create_loan_is_decided_by_worker(self):
+        """Test the request answers 202 at once and the decision is ready after the worker runs"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('create-loan') + '?async=true', self.loan_request, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['status_url'])
+        self.assertEqual(response.data['status'], LoanDecision.STATUS_PENDING)
+        self.assertEqual(Loan.objects.count(), 0)
+
+        pending = self.client.get(response['Location'])
+        self.assertEqual(pending.data['status'], LoanDecision.STATUS_PENDING)
+        self.assertIsNone(pending.data['loan_id'])
+
+        for callback in callbacks:
+            callback()
+        decided = self.client.get(response['Location'])
+        self.assertEqual(decided.status_code, status.HTTP_200_OK)
+        self.assertEqual(decided.data['status'], LoanDecision.STATUS_DECIDED)
+        self.assertTrue(decided.data['loan_approved'])
+        self.assertTrue(Loan.objects.filter(loan_id=decided.data['loan_id'], customer_id=1).exists())
+
+    def test_burst_is_drained_in_micro_batches(self):
+        """Test one drain task is scheduled for a burst and it books a batch per transaction"""
+        from . import decisions, origination
+        with self.captureOnCommitCallbacks() as callbacks:
+            for customer_id in (1, 2, 1):
+                decisions.submit({**self.loan_request, 'customer_id': customer_id})
+            decisions.submit({**self.loan_request, 'customer_id': 999})
+        with patch('core.tasks.process_loan_decisions.apply_async') as mock_apply:
+            for callback in callbacks:
+                callback()
+        mock_apply.assert_called_once()
+
+        with patch('core.decisions.origination.originate_loans', wraps=origination.originate_loans) as mock_originate:
+            self.assertEqual(decisions.drain(batch_size=3), 4)
+        self.assertEqual([len(call.args[0]) for call in mock_originate.call_args_list], [3, 1])
+        self.assertEqual(Loan.objects.count(), 3)
+        self.assertFalse(LoanDecision.objects.filter(status=LoanDecision.STATUS_PENDING).exists())
+        unknown = LoanDecision.objects.get(customer_id=999)
+        self.assertFalse(unknown.loan_approved)
+        self.assertIsNone(unknown.loan_id)
+        self.assertEqual(decisions.drain(), 0)
+
+    def test_failing_application_does_not_block_the_queue(self):
+        """Test an application that makes origination raise is marked failed and the rest are decided"""
+        from . import decisions, origination
+        real_originate = origination.originate_loans
+
+        def originate(applications):
+            if any(application['customer_id'] == 2 for application in applications):
+                raise RuntimeError("scoring exploded")
+            return real_originate(applications)
+
+        for customer_id in (1, 2, 1):
+            decisions.submit({**self.loan_request, 'customer_id': customer_id})
+        with patch('core.decisions.origination.originate_loans', side_effect=originate):
+            self.assertEqual(decisions.drain(batch_size=10), 3)
+
+        statuses = list(LoanDecision.objects.order_by('id').values_list('customer_id', 'status'))
+        self.assertEqual(statuses, [
+            (1, LoanDecision.STATUS_DECIDED), (2, LoanDecision.STATUS_FAILED), (1, LoanDecision.STATUS_DECIDED),
+        ])
+        failed = LoanDecision.objects.get(customer_id=2)
+        self.assertIn('scoring exploded', failed.message)
+        self.assertFalse(failed.loan_approved)
+        self.assertEqual(Loan.objects.count(), 2)
+        self.assertEqual(decisions.drain(), 0)
+
+    def test_unknown_customer_and_decision(self):
+        """Test an async request for an unknown customer is refused up front and unknown decisions are 404"""
+        import uuid
+        response = self.client.post(reverse('create-loan') + '?async=true', {**self.loan_request, 'customer_id': 999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(LoanDecision.objects.exists())
+        response = self.client.get(reverse('loan-decision', kwargs={'decision_id': uuid.uuid4()}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ServeTest(TestCase):
+    """Test the production server entry point and worker warm-up"""
+
+    def test_gunicorn_command_line(self):
+        """Test serve options become gunicorn overrides of the config file"""
+        from .management.commands.serve import ASGI_WORKER, CONFIG_PATH, gunicorn_argv
+
+        argv = gunicorn_argv({'workers': 4, 'threads': 8, 'max_requests': 0})
+        self.assertEqual(argv[1:5], ['-m', 'gunicorn', '--config', CONFIG_PATH])
+        self.assertEqual(argv[5:], [
+            '--workers', '4', '--threads', '8', '--max-requests', '0', 'credit_system.wsgi:application',
+        ])
+
+        argv = gunicorn_argv({'asgi': True, 'no_preload': True})
+        self.assertEqual(argv[5:], ['--no-preload', '--worker-class', ASGI_WORKER, 'credit_system.asgi:application'])
+
+    @override_settings(CUSTOMER_CACHE_SIZE=2, SERVE_WARM_CUSTOMERS=5)
+    def test_worker_warm_up_preloads_customers(self):
+        """Test a warmed worker answers the newest customers from its cache"""
+        from .warmup import warm_worker
+
+        customer_cache.reset()
+        self.addCleanup(customer_cache.reset)
+        for customer_id in range(1, 4):
+            Customer.objects.create(
+                customer_id=customer_id, first_name="Test", last_name="User",
+                phone_number=9000000000 + customer_id, monthly_salary=50000,
+                approved_limit=1800000, age=30
+            )
+
+        self.assertEqual(warm_worker(), 2)
+        with self.assertNumQueries(0):
+            customer_cache.get_customer(3)
+            customer_cache.get_customer(2)
+
+
+class DatabasePoolTest(APITestCase):
+    """Test connection pool sizing and metrics"""
+
+    def test_stats_endpoint_without_pools(self):
+        """Test the stats endpoint lists no pools when the database is not pooled"""
+        response = self.client.get(reverse('db-pool-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pid'], os.getpid())
+        self.assertEqual(response.data['pools'], [])
+
+    def test_pool_metrics(self):
+        """Test saturation and average wait are derived from the pool counters"""
+        from .db_pool import _pool_stats
+        pool = MagicMock()
+        pool.get_stats.return_value = {
+            'pool_min': 2, 'pool_max': 10, 'pool_size': 8, 'pool_available': 2,
+            'requests_num': 500, 'requests_queued': 4, 'requests_wait_ms': 90, 'returns_bad': 1,
+        }
+        stats = _pool_stats('default', pool)
+        self.assertEqual(stats['in_use'], 6)
+        self.assertEqual(stats['saturation'], 0.6)
+        self.assertEqual(stats['checkouts'], 500)
+        self.assertEqual(stats['wait_ms_avg'], 22.5)
+        self.assertEqual(stats['failed_health_checks'], 1)
+
+    @override_settings(CELERY_DB_POOL_MIN_SIZE=1, CELERY_DB_POOL_MAX_SIZE=3, DB_POOL_TIMEOUT=5)
+    def test_worker_pool_options(self):
+        """Test worker pools get their own size and the shared timeouts"""
+        from django.conf import settings
+        from .db_pool import pool_options
+        options = pool_options(settings.CELERY_DB_POOL_MIN_SIZE, settings.CELERY_DB_POOL_MAX_SIZE)
+        self.assertEqual((options['min_size'], options['max_size'], options['timeout']), (1, 3, 5))
+
+
+class SingleFlightTest(TestCase):
+    """Test coalescing of concurrent credit score computations"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.customer = Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+
+    def test_concurrent_scoring_shares_one_computation(self):
+        """Test threads scoring the same customer run the aggregates once"""
+        import threading
+        import time
+        from . import scoring
+
+        followers = 4
+        release = threading.Event()
+        start_coalesced = scoring.score_flights.coalesced
+
+        def slow_stats(customer_ids, today=None):
+            release.wait(5)
+            return {customer_id: scoring.empty_stats() for customer_id in customer_ids}
+
+        results = []
+        with patch('core.scoring.customer_loan_stats', side_effect=slow_stats) as mock_stats:
+            threads = [
+                threading.Thread(target=lambda: results.append(scoring.credit_score(self.customer)))
+                for _ in range(followers + 1)
+            ]
+            for thread in threads:
+                thread.start()
+            # hold the leader until every other thread is waiting on it
+            deadline = time.monotonic() + 5
+            while scoring.score_flights.coalesced - start_coalesced < followers and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(mock_stats.call_count, 1)
+        self.assertEqual(results, [60] * (followers + 1))
+
+    def test_new_version_is_not_coalesced(self):
+        """Test a bumped loans_version computes a fresh score"""
+        from . import scoring, versions
+
+        self.assertEqual(scoring.credit_score(self.customer), 60)
+        Loan.objects.create(
+            loan_id=1, customer=self.customer, loan_amount=5000000, tenure=12, interest_rate=10.0,
+            monthly_repayment=1000, emis_paid_on_time=0, start_date=date.today(), end_date=date(2099, 1, 1)
+        )
+        versions.touch_customers([1])
+        self.customer.refresh_from_db()
+        self.assertEqual(scoring.credit_score(self.customer), 0)
+
+    @override_settings(SCORING_SINGLEFLIGHT_SHARED=True)
+    def test_shared_result_across_processes(self):
+        """Test another process reuses a result computed under the cache lock"""
+        from .singleflight import SingleFlight
+
+        compute = MagicMock(return_value=42)
+        self.assertEqual(SingleFlight('test').do('key', compute, shared=True), 42)
+
+        other_process = SingleFlight('test')
+        self.assertEqual(other_process.do('key', compute, shared=True), 42)
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(other_process.shared_hits, 1)
+
+        # a leader elsewhere holds the lock; we wait for its result instead of computing
+        lock = CacheLock('singleflight:test:busy', 5)
+        lock.acquire()
+        self.addCleanup(lock.release)
+        from django.core.cache import cache
+        import threading
+        threading.Timer(0.1, lambda: cache.set('singleflight:test:busy', {'value': 7}, 5)).start()
+        self.assertEqual(other_process.do('busy', compute, shared=True), 7)
+        self.assertEqual(compute.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(APITransactionTestCase):
+    """Test read-replica routing, stickiness after writes and lag fallback"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import db_routers
+        cache.clear()
+        db_routers.reset_lag_checks()
+        self.addCleanup(db_routers.reset_lag_checks)
+        self.customer = Customer.objects.create(
+            customer_id=1, first_name="Test", last_name="User", phone_number=9999999999,
+            monthly_salary=50000, approved_limit=1800000, age=30
+        )
+        Loan.objects.create(
+            loan_id=1, customer=self.customer, loan_amount=100000, tenure=12, interest_rate=10.0,
+            monthly_repayment=8792, emis_paid_on_time=0, start_date=date.today(), end_date=date(2099, 1, 1)
+        )
+
+    def _aliases(self, method, url, **kwargs):
+        """Database aliases that served the queries of one request"""
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, format='json', **kwargs)
+        aliases = set()
+        if primary.captured_queries:
+            aliases.add('default')
+        if replica.captured_queries:
+            aliases.add('replica')
+        return response, aliases
+
+    def test_reads_go_to_replica(self):
+        """Test loan views and eligibility aggregates read from the replica"""
+        response, aliases = self._aliases('get', reverse('view-loan', kwargs={'loan_id': 1}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {'replica'})
+
+        response, aliases = self._aliases('post', reverse('check-eligibility'), data={
+            "customer_id": 1, "loan_amount": 100000, "interest_rate": 12.0, "tenure": 12
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(aliases, {'replica'})
+
+    def test_reads_stick_to_primary_after_write(self):
+        """Test a client that just wrote reads its own writes from the primary"""
+        headers = {'HTTP_X_CLIENT_ID': 'portal-7'}
+        response, aliases = self._aliases('post', reverse('record-payment'), data={
+            "event_id": "sticky-1", "loan_id": 1
+        }, **headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(aliases, {'default'})
+
+        _, aliases = self._aliases('get', reverse('view-loans', kwargs={'customer_id': 1}), **headers)
+        self.assertEqual(aliases, {'default'})
+
+        _, aliases = self._aliases('get', reverse('view-loans', kwargs={'customer_id': 1}), HTTP_X_CLIENT_ID='other')
+        self.assertEqual(aliases, {'replica'})
+
+    def test_eligibility_checks_do_not_pin_to_primary(self):
+        """Test repeated eligibility checks from one client all read from the replica"""
+        headers = {'HTTP_X_CLIENT_ID': 'portal-8'}
+        data = {"customer_id": 1, "loan_amount": 100000, "interest_rate": 12.0, "tenure": 12}
+        for _ in range(2):
+            response, aliases = self._aliases('post', reverse('check-eligibility'), data=data, **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(aliases, {'replica'})
+
+        _, aliases = self._aliases('get', reverse('view-loans', kwargs={'customer_id': 1}), **headers)
+        self.assertEqual(aliases, {'replica'})
+
+    @override_settings(CUSTOMER_CACHE_SIZE=10)
+    def test_customer_cache_fills_from_primary(self):
+        """Test a customer cache miss under replica reads is filled from the primary, not a replica"""
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        customer_cache.reset()
+        self.addCleanup(customer_cache.reset)
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.post(reverse('check-eligibility'), {
+                "customer_id": 1, "loan_amount": 100000, "interest_rate": 12.0, "tenure": 12
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(any('FROM "core_customer"' in query['sql'] for query in primary.captured_queries))
+        self.assertFalse(any('FROM "core_customer"' in query['sql'] for query in replica.captured_queries))
+        self.assertTrue(replica.captured_queries)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Test a replica past REPLICA_MAX_LAG is skipped"""
+        with patch('core.db_routers.replica_lag', return_value=30.0):
+            _, aliases = self._aliases('get', reverse('view-loan', kwargs={'loan_id': 1}))
+        self.assertEqual(aliases, {'default'})
+
 
 class CreditScoreCalculationTest(TestCase):
     """Test credit score calculation logic"""
@@ -454,6 +2117,291 @@ class DataIngestionTaskTest(TransactionTestCase):
         self.assertIn("Data files not found", result)
 
 
+class IngestionCacheTest(TransactionTestCase):
+    """Test source fingerprinting, generation skip and the Parquet parse cache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.override = override_settings(INGEST_CACHE_DIR=self.cache_dir)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def _write_source(self, name, content):
+        path = os.path.join(self.cache_dir, name)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def test_fingerprint_tracks_content(self):
+        """Test fingerprint is stable for unchanged files and changes with content"""
+        path = self._write_source('customers.xlsx', b'first')
+        first = ingest_cache.fingerprint_files([path])[path]
+        again = ingest_cache.fingerprint_files([path])[path]
+        self.assertEqual(first['sha256'], again['sha256'])
+
+        self._write_source('customers.xlsx', b'second version')
+        changed = ingest_cache.fingerprint_files([path])[path]
+        self.assertNotEqual(first['sha256'], changed['sha256'])
+        self.assertNotEqual(
+            ingest_cache.generation_id({path: first}),
+            ingest_cache.generation_id({path: changed}),
+        )
+
+    def test_read_frame_uses_parquet_cache(self):
+        """Test the second read of an unchanged file comes from the Parquet cache"""
+        import pandas as pd
+
+        path = self._write_source('customers.xlsx', b'workbook bytes')
+        fingerprint = ingest_cache.fingerprint_files([path])[path]
+        frame = pd.DataFrame({'Customer ID': [1, 2], 'First Name': ['A', 'B']})
+
+        with patch('core.ingest_cache.pd.read_excel', return_value=frame) as mock_read_excel:
+            first = ingest_cache.read_frame(path, fingerprint)
+            second = ingest_cache.read_frame(path, fingerprint)
+
+        self.assertEqual(mock_read_excel.call_count, 1)
+        self.assertEqual(list(second['Customer ID']), list(first['Customer ID']))
+
+    def test_column_subsets_are_cached_apart(self):
+        """Test lean reads cache their own column set, so a full read never gets a lean conversion"""
+        import pandas as pd
+
+        path = self._write_source('customers.xlsx', b'workbook bytes')
+        fingerprint = ingest_cache.fingerprint_files([path])[path]
+        frame = pd.DataFrame({'Customer ID': [1, 2], 'First Name': ['A', 'B'], 'Age': [30, 40]})
+
+        def read_excel(path, usecols=None):
+            return frame if usecols is None else frame[usecols]
+
+        with patch('core.ingest_cache.pd.read_excel', side_effect=read_excel) as mock_read_excel:
+            lean = ingest_cache.read_frame(path, fingerprint, columns=['Customer ID'])
+            lean_again = ingest_cache.read_frame(path, fingerprint, columns=['Customer ID'])
+            self.assertEqual(mock_read_excel.call_count, 1)
+            self.assertEqual(mock_read_excel.call_args.kwargs, {'usecols': ['Customer ID']})
+
+            full = ingest_cache.read_frame(path, fingerprint)
+            self.assertEqual(mock_read_excel.call_count, 2)
+            # a full conversion also serves lean reads of any column set
+            other = ingest_cache.read_frame(path, fingerprint, columns=['Customer ID', 'Age'])
+            self.assertEqual(mock_read_excel.call_count, 2)
+
+        self.assertEqual(list(lean.columns), ['Customer ID'])
+        self.assertEqual(list(lean_again.columns), ['Customer ID'])
+        self.assertEqual(list(full.columns), ['Customer ID', 'First Name', 'Age'])
+        self.assertEqual(list(other.columns), ['Customer ID', 'Age'])
+
+    def test_ingest_skips_unchanged_generation(self):
+        """Test re-running ingestion on unchanged files skips the load"""
+        first = ingest_data()
+        self.assertIn("Ingestion complete", first)
+        self.assertEqual(IngestionGeneration.objects.count(), 1)
+
+        second = ingest_data()
+        self.assertIn("Ingestion skipped", second)
+        self.assertEqual(IngestionGeneration.objects.count(), 1)
+
+        forced = ingest_data(force=True)
+        self.assertIn("Ingestion complete", forced)
+        self.assertEqual(IngestionGeneration.objects.count(), 2)
+
+    def test_ingest_reloads_when_data_missing(self):
+        """Test a matching generation is reloaded if the tables were emptied"""
+        ingest_data()
+        Customer.objects.all().delete()
+
+        result = ingest_data()
+        self.assertIn("Ingestion complete", result)
+        self.assertTrue(Customer.objects.exists())
+
+
+@override_settings(INGEST_CHUNK_SIZE=100)
+class ResumableIngestionTest(TransactionTestCase):
+    """Test checkpointed ingestion, resume after failure, locking and status"""
+
+    def test_resume_from_checkpoint(self):
+        """Test a failed run resumes after its last committed chunk"""
+        real_build_loans = ingestion.build_loans
+        calls = {'count': 0}
+
+        def crash_on_third_chunk(chunk, known_customer_ids):
+            calls['count'] += 1
+            if calls['count'] == 3:
+                raise RuntimeError("worker lost")
+            return real_build_loans(chunk, known_customer_ids)
+
+        with patch('core.tasks.ingestion.build_loans', side_effect=crash_on_third_chunk):
+            first = ingest_data()
+
+        self.assertIn("worker lost", first)
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, IngestionJob.STATUS_FAILED)
+        self.assertEqual(job.loan_offset, 200)
+        self.assertEqual(job.customer_offset, job.customers_total)
+
+        second = ingest_data()
+        self.assertIn("Ingestion complete", second)
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.loan_offset, job.loans_total)
+        self.assertEqual(Loan.objects.count(), job.loans_created)
+        self.assertEqual(job.progress()['percent'], 100.0)
+
+    def test_concurrent_ingestion_is_locked(self):
+        """Test a second ingestion does not start while the lock is held"""
+        lock = CacheLock('ingest-data', 60)
+        self.assertTrue(lock.acquire())
+        self.addCleanup(lock.release)
+
+        result = ingest_data(force=True)
+        self.assertEqual(result, "Ingestion already running")
+        self.assertFalse(IngestionJob.objects.exists())
+
+    def test_status_endpoint(self):
+        """Test the status endpoint reports progress of the latest run"""
+        response = self.client.get(reverse('ingest-status'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        ingest_data()
+        job = IngestionJob.objects.get()
+
+        response = self.client.get(reverse('ingest-status-detail', kwargs={'task_id': job.task_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['status'], IngestionJob.STATUS_SUCCEEDED)
+        self.assertEqual(data['progress']['rows_done'], data['progress']['rows_total'])
+        self.assertIn('rows_per_sec', data['progress'])
+        self.assertIn('eta_seconds', data['progress'])
+
+
+class IngestionProfilingTest(TransactionTestCase):
+    """Test the opt-in ingestion stage profiler"""
+
+    def test_profile_report_covers_stages(self):
+        """Test profiling writes per-stage figures as JSON"""
+        report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, report_dir)
+        path = os.path.join(report_dir, 'profile.json')
+
+        result = ingest_data(profile=path)
+        self.assertIn("Ingestion complete", result)
+
+        with open(path) as fh:
+            report = json.load(fh)
+
+        stages = {stage['stage']: stage for stage in report['stages']}
+        for name in ['file read', 'column mapping', 'dedupe', 'customer write',
+                     'loan FK resolution', 'date parsing', 'loan write']:
+            self.assertIn(name, stages)
+        self.assertEqual(stages['customer write']['rows'], Customer.objects.count())
+        self.assertGreater(stages['file read']['peak_traced_kb'], 0)
+        self.assertIn('loan write', format_table(report))
+
+    def test_peak_rss_is_sampled_during_the_stage(self):
+        """Test a stage reports its highest RSS, not the RSS left when it ends"""
+        readings = iter([1000, 5000])
+
+        def rss_kb():
+            return next(readings, 2000)
+
+        profiler = StageProfiler()
+        with patch('core.profiling._rss_kb', side_effect=rss_kb):
+            with profiler.stage('spike'):
+                time.sleep(0.05)
+
+        record = profiler.stages['spike']
+        self.assertEqual(record['peak_rss_kb'], 5000)
+
+    def test_profiling_is_off_by_default(self):
+        """Test no profiler is created unless requested"""
+        with patch('core.tasks.StageProfiler') as mock_profiler:
+            ingest_data()
+        mock_profiler.assert_not_called()
+
+
+class LeanIngestionTest(TransactionTestCase):
+    """Test memory-lean dataframe loading"""
+
+    def test_lean_ingestion_matches_default(self):
+        """Test lean loading produces the same rows as the default path"""
+        default_result = ingest_data()
+        default_loans = list(Loan.objects.order_by('loan_id').values_list('loan_id', 'customer_id', 'interest_rate', 'start_date'))
+        default_customers = list(Customer.objects.order_by('customer_id').values_list('customer_id', 'first_name', 'phone_number', 'age'))
+
+        lean_result = ingest_data(force=True, lean=True)
+        self.assertEqual(lean_result, default_result)
+        self.assertEqual(
+            list(Loan.objects.order_by('loan_id').values_list('loan_id', 'customer_id', 'interest_rate', 'start_date')),
+            default_loans,
+        )
+        self.assertEqual(
+            list(Customer.objects.order_by('customer_id').values_list('customer_id', 'first_name', 'phone_number', 'age')),
+            default_customers,
+        )
+
+    def test_lean_ingestion_with_cold_parse_cache(self):
+        """Test a lean run with an empty parse cache parses only mapped columns and leaves full reads intact"""
+        import pandas as pd
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        real_read_excel = pd.read_excel
+
+        with override_settings(INGEST_CACHE_DIR=cache_dir):
+            with patch('core.ingest_cache.pd.read_excel', side_effect=real_read_excel) as mock_read_excel:
+                lean_result = ingest_data(lean=True)
+            self.assertIn("Ingestion complete", lean_result)
+            parses = [call.kwargs for call in mock_read_excel.call_args_list if call.kwargs.get('nrows') != 0]
+            self.assertEqual(len(parses), 2)
+            self.assertTrue(all(kwargs.get('usecols') for kwargs in parses))
+            lean_customers = list(Customer.objects.order_by('customer_id').values_list('customer_id', 'first_name', 'age'))
+
+            full_result = ingest_data(force=True)
+            self.assertEqual(full_result, lean_result)
+            self.assertEqual(
+                list(Customer.objects.order_by('customer_id').values_list('customer_id', 'first_name', 'age')),
+                lean_customers,
+            )
+
+    def test_lean_read_loads_only_mapped_columns(self):
+        """Test the header is read first and only mapped columns are loaded"""
+        import pandas as pd
+
+        header = pd.DataFrame(columns=['Customer ID', 'First Name', 'Notes', 'Phone Number'])
+        with patch('core.ingest_cache.pd.read_excel', return_value=header) as mock_read_excel:
+            columns = ingest_cache.read_header('customers.xlsx')
+            usecols = ingestion.source_columns(ingestion.map_customer_columns(columns), ingestion.CUSTOMER_FIELDS)
+            ingest_cache.read_frame('customers.xlsx', columns=usecols)
+
+        self.assertEqual(mock_read_excel.call_args_list[0].kwargs, {'nrows': 0})
+        self.assertEqual(mock_read_excel.call_args_list[1].kwargs, {'usecols': ['Customer ID', 'First Name', 'Phone Number']})
+
+    def test_compact_frame_dtypes(self):
+        """Test integer columns are downcast and names become categoricals"""
+        import pandas as pd
+
+        df = pd.DataFrame({
+            'customer_id': [1, 2, 3],
+            'phone_number': [9999999999, 8888888888, 7777777777],
+            'first_name': ['A', 'B', 'A'],
+            'monthly_salary': [50000.5, 60000.25, 70000.0],
+        })
+        ingestion.compact_frame(df, categorical=ingestion.NAME_COLUMNS)
+
+        self.assertEqual(str(df['customer_id'].dtype), 'int8')
+        self.assertEqual(str(df['phone_number'].dtype), 'int64')
+        self.assertEqual(str(df['first_name'].dtype), 'category')
+        self.assertEqual(str(df['monthly_salary'].dtype), 'float64')
+
+    def test_first_occurrence_positions(self):
+        """Test dedupe keeps the first row of each id without copying the frame"""
+        import pandas as pd
+
+        df = pd.DataFrame({'loan_id': [5, 6, 5, 7, 6]})
+        self.assertEqual(list(ingestion.first_occurrence_positions(df, 'loan_id')), [0, 1, 3])
+
+
 class MonthlyInstallmentCalculationTest(TestCase):
     """Test monthly installment calculation"""
     
@@ -0,0 +1,188 @@
+import functools
+import logging
+import random
+import time
+import uuid
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .jsonl_log import JsonlLog
+from .slow_queries import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# the innermost open span of the current trace, or None when this request or task is not traced
+_current = ContextVar('trace_span', default=None)
+
+_NOOP = nullcontext()
+
+# finished traces, one span per line
+_log = JsonlLog('TRACE_LOG_PATH', 'TRACE_LOG_MAX_BYTES', 'TRACE_LOG_BACKUPS')
+
+
+class Span:
+    def __init__(self, trace, name, parent, attrs):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def finish(self):
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+            self.trace.spans.append(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round(self.duration_ms, 3),
+            'attrs': self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+
+
+def active():
+    return _current.get() is not None
+
+
+def start_span(name, **attrs):
+    """Open a child of the current span; the caller must ``finish()`` it. None when not tracing."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent, attrs)
+
+
+@contextmanager
+def _span(parent, name, attrs):
+    span = Span(parent.trace, name, parent, attrs)
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+        span.finish()
+
+
+def span(name, **attrs):
+    """Context manager timing a child span of the current one; a shared no-op when not tracing"""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _span(parent, name, attrs)
+
+
+def traced(name=None):
+    """Decorator running the function inside a span named after it"""
+    def decorate(fn):
+        span_name = name or f'{fn.__module__}.{fn.__qualname__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            with _span(parent, span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _query_span(execute, sql, params, many, context):
+    parent = _current.get()
+    if parent is None:
+        return execute(sql, params, many, context)
+    with _span(parent, 'sql', {'sql': normalize_sql(sql), 'alias': context['connection'].alias}):
+        return execute(sql, params, many, context)
+
+
+def sampled(sample_rate=None):
+    sample_rate = settings.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class RootSpan:
+    """
+    The outermost span of a sampled request or task. While it is open every
+    ORM query on this thread becomes a ``sql`` span; when it finishes the
+    whole trace is written to TRACE_LOG_PATH.
+    """
+
+    def __init__(self, name, **attrs):
+        self.span = Span(Trace(), name, None, attrs)
+        self._token = _current.set(self.span)
+        self._queries = ExitStack()
+        for alias in connections:
+            self._queries.enter_context(connections[alias].execute_wrapper(_query_span))
+
+    def finish(self, **attrs):
+        self._queries.close()
+        _current.reset(self._token)
+        self.span.attrs.update(attrs)
+        self.span.finish()
+        try:
+            write(self.span.trace)
+        except Exception:
+            logger.warning("Could not write trace", exc_info=True)
+
+
+def start_trace(name, sample_rate=None, **attrs):
+    """Begin a trace if this request or task is sampled; returns a RootSpan to finish, or None"""
+    if _current.get() is not None or not sampled(sample_rate):
+        return None
+    return RootSpan(name, **attrs)
+
+
+def reset_writer():
+    """Close the trace file; the next trace reopens TRACE_LOG_PATH"""
+    _log.close()
+
+
+def write(trace):
+    """Append a finished trace to the log, one span per line"""
+    _log.write(*(span.to_dict() for span in trace.spans))
+
+
+def read_spans(path=None):
+    """Every span in the trace log and its rotated backups, oldest file first"""
+    return _log.read(path)
+
+
+def folded_stacks(spans):
+    """
+    Collapse spans into flame-graph stacks: ``{"root;child;leaf": self_time_us}``,
+    where self time excludes the time spent in child spans.
+    """
+    by_id = {span['span_id']: span for span in spans}
+    child_time = {}
+    for span in spans:
+        if span['parent_id']:
+            child_time[span['parent_id']] = child_time.get(span['parent_id'], 0) + span['duration_ms']
+
+    stacks = {}
+    for span in spans:
+        names = []
+        node = span
+        while node is not None:
+            names.append(node['name'].replace(';', ':'))
+            node = by_id.get(node['parent_id'])
+        self_us = max(0, round((span['duration_ms'] - child_time.get(span['span_id'], 0)) * 1000))
+        stack = ';'.join(reversed(names))
+        stacks[stack] = stacks.get(stack, 0) + self_us
+    return stacks
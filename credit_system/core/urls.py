@@ -1,10 +1,28 @@
 from django.urls import path
-from .views import RegisterCustomerView, LoanEligibilityView, CreateLoanView, ViewLoanView, ViewLoansView
+from .views import (
+    RegisterCustomerView, RegisterCustomerBatchView, LoanEligibilityView, CreateLoanView, ViewLoanView, ViewLoansView,
+    CreateLoanBatchView, RecordPaymentView, RecordPaymentBatchView, IngestionStatusView,
+    PortfolioSummaryView, PortfolioBreakdownView, ExportView, CustomerCacheStatsView,
+    DatabasePoolStatsView, AdmissionStatsView, LoanDecisionView,
+)
 
 urlpatterns = [
     path('register', RegisterCustomerView.as_view(), name='register-customer'),
+    path('register-batch', RegisterCustomerBatchView.as_view(), name='register-customer-batch'),
     path('check-eligibility', LoanEligibilityView.as_view(), name='check-eligibility'),
     path('create-loan', CreateLoanView.as_view(), name='create-loan'),
+    path('loan-decision/<uuid:decision_id>', LoanDecisionView.as_view(), name='loan-decision'),
+    path('create-loan-batch', CreateLoanBatchView.as_view(), name='create-loan-batch'),
     path('view-loan/<int:loan_id>', ViewLoanView.as_view(), name='view-loan'),
     path('view-loans/<int:customer_id>', ViewLoansView.as_view(), name='view-loans'),
+    path('record-payment', RecordPaymentView.as_view(), name='record-payment'),
+    path('record-payment-batch', RecordPaymentBatchView.as_view(), name='record-payment-batch'),
+    path('ingest-status', IngestionStatusView.as_view(), name='ingest-status'),
+    path('ingest-status/<str:task_id>', IngestionStatusView.as_view(), name='ingest-status-detail'),
+    path('portfolio/summary', PortfolioSummaryView.as_view(), name='portfolio-summary'),
+    path('portfolio/breakdown', PortfolioBreakdownView.as_view(), name='portfolio-breakdown'),
+    path('export/<str:kind>', ExportView.as_view(), name='export'),
+    path('customer-cache/stats', CustomerCacheStatsView.as_view(), name='customer-cache-stats'),
+    path('db-pool/stats', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('admission/stats', AdmissionStatsView.as_view(), name='admission-stats'),
 ]
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+from . import customer_cache
+from .models import ArchivedLoan, Customer, Loan, new_version
+
+LOAN_ID_BATCH_SIZE = 400
+
+
+def touch_customers(customer_ids, version=None):
+    """Mark the loan lists of ``customer_ids`` as changed"""
+    customer_ids = list(customer_ids)
+    version = version or new_version()
+    updated = Customer.objects.filter(customer_id__in=customer_ids).update(loans_version=version)
+    # cached rows carry the old loans_version
+    customer_cache.invalidate(customer_ids)
+    return updated
+
+
+def touch_customers_of_loans(loan_ids, version=None):
+    """Mark the loan lists owning ``loan_ids`` as changed"""
+    version = version or new_version()
+    loan_ids = list(loan_ids)
+    updated = 0
+    for start in range(0, len(loan_ids), LOAN_ID_BATCH_SIZE):
+        customer_ids = Loan.objects.filter(
+            loan_id__in=loan_ids[start:start + LOAN_ID_BATCH_SIZE]
+        ).values_list('customer_id', flat=True).distinct()
+        updated += touch_customers(customer_ids, version)
+    return updated
+
+
+def loan_version(loan_id):
+    version = Loan.objects.filter(loan_id=loan_id).values_list('version', flat=True).first()
+    if version is None:
+        # archived loans keep the version they had when moved and never change again
+        version = ArchivedLoan.objects.filter(loan_id=loan_id).values_list('version', flat=True).first()
+    return version
+
+
+def customer_loans_version(customer_id):
+    return Customer.objects.filter(customer_id=customer_id).values_list('loans_version', flat=True).first()
+
+
+def as_datetime(version):
+    """The moment a version was stamped, for Last-Modified"""
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
@@ -8,19 +8,36 @@ from .serializers import (
     CreateLoanRequestSerializer,
     CreateLoanResponseSerializer,
     ViewLoanResponseSerializer,
-    ViewLoansResponseSerializer
+    ViewLoansResponseSerializer,
+    RecordPaymentRequestSerializer,
+    RecordPaymentBatchRequestSerializer,
+    RecordPaymentResponseSerializer,
+    IngestionJobSerializer,
+    LoanDecisionSerializer,
+    ExportQuerySerializer
 )
-from .models import Customer, Loan
+from .models import ArchivedLoan, Customer, Loan, IngestionJob, LoanDecision
+from . import repayments, batch, scoring, origination, portfolio, export, versions, customer_cache, db_pool, admission, tracing, decisions
+from .db_routers import replica_reads
+from .ids import allocate_ids
+from .idempotency import idempotent
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum, Q, Count
 from datetime import datetime, date
+from dateutil.relativedelta import relativedelta
 import math
-from django.http import HttpResponse
+import os
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 
 
 from django.http import HttpResponse
 
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
 def home(request):
     return render(request, 'home.html')
@@ -28,6 +45,7 @@ def home(request):
 
 
 class RegisterCustomerView(APIView):
+    @idempotent('register')
     def post(self, request):
         serializer = CustomerRegisterSerializer(data=request.data)
         if serializer.is_valid():
@@ -37,10 +55,41 @@ class RegisterCustomerView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class RegisterCustomerBatchView(APIView):
+    def post(self, request):
+        """Register a spreadsheet's worth of customers in one request"""
+        rows = request.data.get('customers') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"error": "Expected a non-empty list of customers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > settings.REGISTER_BATCH_MAX_SIZE:
+            return Response(
+                {"error": f"At most {settings.REGISTER_BATCH_MAX_SIZE} customers per batch"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = batch.register_customers(rows)
+        created = sum(1 for result in results if result['status'] == 'created')
+
+        return Response({
+            'created': created,
+            'rejected': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
 class LoanEligibilityView(APIView):
+    # the POST only reads, so it must not pin the client to the primary
+    writes_data = False
+
+    @method_decorator(replica_reads())
     def post(self, request):
         request_serializer = LoanEligibilityRequestSerializer(data=request.data)
-        if not request_serializer.is_valid():
+        with tracing.span('validate'):
+            valid = request_serializer.is_valid()
+        if not valid:
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = request_serializer.validated_data
@@ -50,7 +99,7 @@ class LoanEligibilityView(APIView):
         tenure = data['tenure']
 
         try:
-            customer = Customer.objects.get(customer_id=customer_id)
+            customer = customer_cache.get_customer(customer_id)
         except Customer.DoesNotExist:
             return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -71,99 +120,37 @@ class LoanEligibilityView(APIView):
         }
 
         response_serializer = LoanEligibilityResponseSerializer(data=response_data)
-        if response_serializer.is_valid():
+        with tracing.span('serialize'):
+            valid = response_serializer.is_valid()
+        if valid:
             return Response(response_serializer.data, status=status.HTTP_200_OK)
         return Response(response_serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def calculate_credit_score(self, customer):
-        loans = Loan.objects.filter(customer=customer)
-
-        if not loans.exists():
-            return 60 
-
-  
-        total_emis_expected = loans.aggregate(Sum('tenure'))['tenure__sum'] or 0
-        total_emis_paid = loans.aggregate(Sum('emis_paid_on_time'))['emis_paid_on_time__sum'] or 0
-        emi_score = (total_emis_paid / total_emis_expected) * 25 if total_emis_expected > 0 else 0
-
-   
-        loan_count = loans.count()
-        if loan_count <= 2:
-            loan_count_score = 20
-        elif loan_count <= 5:
-            loan_count_score = 15
-        elif loan_count <= 10:
-            loan_count_score = 10
-        else:
-            loan_count_score = 5
-
-   
-        current_year = datetime.now().year
-        activity_score = 20 if loans.filter(start_date__year=current_year).exists() else 0
-
-
-        total_loan_amt = loans.aggregate(Sum('loan_amount'))['loan_amount__sum'] or 0
-        if customer.approved_limit > 0:
-            volume_ratio = total_loan_amt / customer.approved_limit
-            if volume_ratio <= 0.5:
-                volume_score = 20
-            elif volume_ratio <= 1.0:
-                volume_score = 15
-            elif volume_ratio <= 1.5:
-                volume_score = 10
-            else:
-                volume_score = 5
-        else:
-            volume_score = 0
-
-    
-        current_loans_amt = loans.filter(end_date__gte=date.today()).aggregate(Sum('loan_amount'))['loan_amount__sum'] or 0
-        if current_loans_amt > customer.approved_limit:
-            return 0
-
-        total_score = emi_score + loan_count_score + activity_score + volume_score
-        return round(min(total_score, 100))
+        return scoring.credit_score(customer)
 
     def check_loan_approval(self, customer, credit_score, loan_amount, interest_rate, tenure):
-        current_loans = Loan.objects.filter(customer=customer, end_date__gte=date.today())
+        current_loans = Loan.objects.active().filter(customer=customer)
         current_emi = current_loans.aggregate(Sum('monthly_repayment'))['monthly_repayment__sum'] or 0
 
         projected_emi = self.calculate_monthly_installment(loan_amount, interest_rate, tenure)
-        total_emi = current_emi + projected_emi
-
-        if total_emi > customer.monthly_salary * 0.5:
-            return False, interest_rate 
-
-      
-        if credit_score > 50:
-            return True, interest_rate
-        elif 30 < credit_score <= 50:
-            if interest_rate >= 12:
-                return True, interest_rate
-            else:
-                return True, 12  
-        elif 10 < credit_score <= 30:
-            if interest_rate >= 16:
-                return True, interest_rate
-            else:
-                return True, 16  
-        else:
-            return False, interest_rate  
+        return scoring.approval_decision(
+            current_emi, customer.monthly_salary, credit_score, projected_emi, interest_rate
+        )
 
     def calculate_monthly_installment(self, loan_amount, annual_interest_rate, tenure_months):
-        monthly_rate = annual_interest_rate / (12 * 100)
-        if monthly_rate == 0:
-            return loan_amount / tenure_months
-        emi = loan_amount * monthly_rate * (1 + monthly_rate) ** tenure_months / ((1 + monthly_rate) ** tenure_months - 1)
-        return emi
+        return scoring.monthly_installment(loan_amount, annual_interest_rate, tenure_months)
 
 
 
 class CreateLoanView(APIView):
+    @idempotent('create-loan')
     def post(self, request):
 
         request_serializer = CreateLoanRequestSerializer(data=request.data)
-        if not request_serializer.is_valid():
+        with tracing.span('validate'):
+            valid = request_serializer.is_valid()
+        if not valid:
             return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         data = request_serializer.validated_data
@@ -174,13 +161,15 @@ class CreateLoanView(APIView):
         
   
         try:
-            customer = Customer.objects.get(customer_id=customer_id)
+            customer = customer_cache.get_customer(customer_id)
         except Customer.DoesNotExist:
             return Response(
                 {"error": "Customer not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        
+
+        if _async_requested(request):
+            return self.submit_async(data)
    
         eligibility_view = LoanEligibilityView()
         credit_score = eligibility_view.calculate_credit_score(customer)
@@ -198,27 +187,25 @@ class CreateLoanView(APIView):
         
         if approval:
      
-            last_loan = Loan.objects.order_by('loan_id').last()
-            loan_id = (last_loan.loan_id + 1) if last_loan else 1
-            
             start_date = date.today()
-
-            import calendar
-            from dateutil.relativedelta import relativedelta
             end_date = start_date + relativedelta(months=tenure)
             
             try:
-                Loan.objects.create(
-                    loan_id=loan_id,
-                    customer=customer,
-                    loan_amount=loan_amount,
-                    tenure=tenure,
-                    interest_rate=corrected_interest_rate,
-                    monthly_repayment=round(monthly_installment, 2),
-                    emis_paid_on_time=0,
-                    start_date=start_date,
-                    end_date=end_date
-                )
+                # the partitioned loan table cannot enforce unique loan ids on its own
+                with tracing.span('create_loan'), transaction.atomic():
+                    loan_id = allocate_ids(Loan, 1)
+                    Loan.objects.create(
+                        loan_id=loan_id,
+                        customer=customer,
+                        loan_amount=loan_amount,
+                        tenure=tenure,
+                        interest_rate=corrected_interest_rate,
+                        monthly_repayment=round(monthly_installment, 2),
+                        emis_paid_on_time=0,
+                        start_date=start_date,
+                        end_date=end_date
+                    )
+                    versions.touch_customers([customer_id])
                 message = "Loan approved successfully"
             except Exception as e:
                 return Response(
@@ -226,19 +213,9 @@ class CreateLoanView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
         else:
-            if credit_score <= 10:
-                message = "Loan rejected due to low credit score"
-            else:
-                current_loans = Loan.objects.filter(
-                    customer=customer, 
-                    end_date__gte=date.today()
-                )
-                current_emi = current_loans.aggregate(Sum('monthly_repayment'))['monthly_repayment__sum'] or 0
-                
-                if current_emi > (customer.monthly_salary * 0.5):
-                    message = "Loan rejected due to high existing EMI burden"
-                else:
-                    message = "Loan rejected based on credit assessment"
+            current_loans = Loan.objects.active().filter(customer=customer)
+            current_emi = current_loans.aggregate(Sum('monthly_repayment'))['monthly_repayment__sum'] or 0
+            message = scoring.rejection_message(credit_score, current_emi, customer.monthly_salary)
         
         response_data = {
             'loan_id': loan_id,
@@ -249,78 +226,367 @@ class CreateLoanView(APIView):
         }
         
         response_serializer = CreateLoanResponseSerializer(data=response_data)
-        if response_serializer.is_valid():
+        with tracing.span('serialize'):
+            valid = response_serializer.is_valid()
+        if valid:
             return Response(response_serializer.data, status=status.HTTP_201_CREATED if approval else status.HTTP_200_OK)
         return Response(response_serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+    def submit_async(self, data):
+        """Queue the application for a worker and answer 202 with where to poll for the decision"""
+        decision = decisions.submit(data)
+        status_url = reverse('loan-decision', kwargs={'decision_id': decision.decision_id})
+        response = Response({
+            'decision_id': decision.decision_id,
+            'status': decision.status,
+            'status_url': status_url,
+        }, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = status_url
+        return response
+
+
+def _async_requested(request):
+    return request.GET.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+class LoanDecisionView(APIView):
+    def get(self, request, decision_id):
+        """State of an application submitted with ``/create-loan?async=true``, and its outcome once decided"""
+        decision = LoanDecision.objects.filter(decision_id=decision_id).first()
+        if decision is None:
+            return Response(
+                {"error": "Loan decision not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(LoanDecisionSerializer(decision).data, status=status.HTTP_200_OK)
+
+
+class CreateLoanBatchView(APIView):
+    def post(self, request):
+        """Decide and book a campaign's worth of loan applications in one request"""
+        rows = request.data.get('applications') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"error": "Expected a non-empty list of applications"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > settings.LOAN_BATCH_MAX_SIZE:
+            return Response(
+                {"error": f"At most {settings.LOAN_BATCH_MAX_SIZE} applications per batch"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = origination.originate_loans(rows)
+        approved = sum(1 for result in results if result.get('loan_approved'))
+        invalid = sum(1 for result in results if 'errors' in result)
+
+        return Response({
+            'approved': approved,
+            'rejected': len(results) - approved - invalid,
+            'invalid': invalid,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if approved else status.HTTP_200_OK)
+
+
+def _version_lookup(request, key, lookup):
+    """Fetch a version once per request; the ETag and Last-Modified checks share it"""
+    if not hasattr(request, '_versions'):
+        request._versions = {}
+    if key not in request._versions:
+        request._versions[key] = lookup()
+    return request._versions[key]
+
+
+def _fields_suffix(request, available):
+    """
+    ETag suffix naming the ``?fields=`` selection in response order: empty
+    for the full representation, None when the selection is invalid.
+    """
+    try:
+        fields = _requested_fields(request, available)
+    except ValueError:
+        return None
+    return '' if fields == list(available) else '-fields:' + ','.join(fields)
+
+
+def _loan_etag(request, loan_id):
+    version = _version_lookup(request, ('loan', loan_id), lambda: versions.loan_version(loan_id))
+    suffix = _fields_suffix(request, LOAN_DETAIL_COLUMNS)
+    if version is None or suffix is None:
+        return None
+    return f'"loan-{loan_id}-{version}{suffix}"'
+
+
+def _loan_last_modified(request, loan_id):
+    version = _version_lookup(request, ('loan', loan_id), lambda: versions.loan_version(loan_id))
+    return None if version is None else versions.as_datetime(version)
+
+
+def _include_archived(request):
+    return request.GET.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+def _loans_etag(request, customer_id):
+    version = _version_lookup(request, ('customer', customer_id), lambda: versions.customer_loans_version(customer_id))
+    suffix = _fields_suffix(request, LOAN_LIST_COLUMNS)
+    if version is None or suffix is None:
+        return None
+    if _include_archived(request):
+        suffix = '-archived' + suffix
+    return f'"loans-{customer_id}-{version}{suffix}"'
+
+
+def _loans_last_modified(request, customer_id):
+    version = _version_lookup(request, ('customer', customer_id), lambda: versions.customer_loans_version(customer_id))
+    return None if version is None else versions.as_datetime(version)
+
+
+# columns each response field is built from; ?fields= loads only the ones asked for
+LOAN_DETAIL_COLUMNS = {
+    'loan_id': ['loan_id'],
+    'customer': ['customer_id', 'customer__first_name', 'customer__last_name', 'customer__phone_number', 'customer__age'],
+    'loan_amount': ['loan_amount'],
+    'interest_rate': ['interest_rate'],
+    'monthly_installment': ['monthly_repayment'],
+    'tenure': ['tenure'],
+}
+
+LOAN_LIST_COLUMNS = {
+    'loan_id': ['loan_id'],
+    'loan_amount': ['loan_amount'],
+    'interest_rate': ['interest_rate'],
+    'monthly_installment': ['monthly_repayment'],
+    'repayments_left': ['tenure', 'emis_paid_on_time'],
+}
+
+
+def _requested_fields(request, available):
+    """Fields named in ``?fields=``, all of them when absent; raises ValueError on unknown names"""
+    raw = request.query_params.get('fields', '')
+    if not raw.strip():
+        return list(available)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+
+def _columns(fields, column_map):
+    return list(dict.fromkeys(column for field in fields for column in column_map[field]))
+
+
 class ViewLoanView(APIView):
+    # the version check and the body must come from the same database
+    @method_decorator(replica_reads())
+    @method_decorator(condition(etag_func=_loan_etag, last_modified_func=_loan_last_modified))
     def get(self, request, loan_id):
         """View details of a specific loan"""
         try:
-            loan = Loan.objects.select_related('customer').get(loan_id=loan_id)
-        except Loan.DoesNotExist:
+            fields = _requested_fields(request, LOAN_DETAIL_COLUMNS)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # the customer join only happens when a customer column is requested
+        columns = _columns(fields, LOAN_DETAIL_COLUMNS)
+        loan = Loan.objects.filter(loan_id=loan_id).values(*columns).first()
+        if loan is None:
+            # closed loans moved out of the hot table are still viewable
+            loan = ArchivedLoan.objects.filter(loan_id=loan_id).values(*columns).first()
+        if loan is None:
             return Response(
                 {"error": "Loan not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        response_data = {
-            'loan_id': loan.loan_id,
-            'customer': {
-                'id': loan.customer.customer_id,
-                'first_name': loan.customer.first_name,
-                'last_name': loan.customer.last_name,
-                'phone_number': loan.customer.phone_number,
-                'age': loan.customer.age
+        builders = {
+            'loan_id': lambda: loan['loan_id'],
+            'customer': lambda: {
+                'id': loan['customer_id'],
+                'first_name': loan['customer__first_name'],
+                'last_name': loan['customer__last_name'],
+                'phone_number': loan['customer__phone_number'],
+                'age': loan['customer__age']
             },
-            'loan_amount': loan.loan_amount,
-            'interest_rate': loan.interest_rate,
-            'monthly_installment': loan.monthly_repayment,
-            'tenure': loan.tenure
+            'loan_amount': lambda: loan['loan_amount'],
+            'interest_rate': lambda: loan['interest_rate'],
+            'monthly_installment': lambda: loan['monthly_repayment'],
+            'tenure': lambda: loan['tenure'],
         }
+        response_data = {field: builders[field]() for field in fields}
         
-        response_serializer = ViewLoanResponseSerializer(data=response_data)
+        response_serializer = ViewLoanResponseSerializer(data=response_data, fields=fields)
         if response_serializer.is_valid():
             return Response(response_serializer.data, status=status.HTTP_200_OK)
         return Response(response_serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class ViewLoansView(APIView):
+    @method_decorator(replica_reads())
+    @method_decorator(condition(etag_func=_loans_etag, last_modified_func=_loans_last_modified))
     def get(self, request, customer_id):
         """View all loans for a specific customer"""
         try:
-            customer = Customer.objects.get(customer_id=customer_id)
+            fields = _requested_fields(request, LOAN_LIST_COLUMNS)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            customer_cache.get_customer(customer_id)
         except Customer.DoesNotExist:
             return Response(
                 {"error": "Customer not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        loans = Loan.objects.filter(customer=customer)
+        columns = _columns(fields, LOAN_LIST_COLUMNS)
+        loans = Loan.objects.filter(customer_id=customer_id).values(*columns)
+        if _include_archived(request):
+            # ?include_archived=true adds the customer's closed loans moved to the archive
+            loans = loans.union(ArchivedLoan.objects.filter(customer_id=customer_id).values(*columns), all=True)
         
-        if not loans.exists():
-            return Response([], status=status.HTTP_200_OK)
-        
-        loans_data = []
-        for loan in loans:
-            repayments_left = max(0, loan.tenure - loan.emis_paid_on_time)
-            
-            loan_data = {
-                'loan_id': loan.loan_id,
-                'loan_amount': loan.loan_amount,
-                'interest_rate': loan.interest_rate,
-                'monthly_installment': loan.monthly_repayment,
-                'repayments_left': repayments_left
-            }
-            loans_data.append(loan_data)
+        builders = {
+            'loan_id': lambda loan: loan['loan_id'],
+            'loan_amount': lambda loan: loan['loan_amount'],
+            'interest_rate': lambda loan: loan['interest_rate'],
+            'monthly_installment': lambda loan: loan['monthly_repayment'],
+            'repayments_left': lambda loan: max(0, loan['tenure'] - loan['emis_paid_on_time']),
+        }
         
         serialized_loans = []
-        for loan_data in loans_data:
-            loan_serializer = ViewLoansResponseSerializer(data=loan_data)
+        for loan in loans:
+            loan_data = {field: builders[field](loan) for field in fields}
+            loan_serializer = ViewLoansResponseSerializer(data=loan_data, fields=fields)
             if loan_serializer.is_valid():
                 serialized_loans.append(loan_serializer.data)
             else:
                 return Response(loan_serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         return Response(serialized_loans, status=status.HTTP_200_OK)
+
+
+class RecordPaymentView(APIView):
+    def post(self, request):
+        """Apply one repayment event; repeating an event id is a no-op"""
+        request_serializer = RecordPaymentRequestSerializer(data=request.data)
+        if not request_serializer.is_valid():
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        result = repayments.record_payment(**request_serializer.validated_data)
+
+        if result['status'] == repayments.LOAN_NOT_FOUND:
+            return Response(
+                {"error": "Loan not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        response_status = status.HTTP_201_CREATED if result['status'] == repayments.APPLIED else status.HTTP_200_OK
+        return Response(RecordPaymentResponseSerializer(result).data, status=response_status)
+
+
+class RecordPaymentBatchView(APIView):
+    def post(self, request):
+        """Apply a burst of repayment events in one transaction"""
+        request_serializer = RecordPaymentBatchRequestSerializer(data=request.data)
+        if not request_serializer.is_valid():
+            return Response(request_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = repayments.record_payments(request_serializer.validated_data['payments'])
+
+        summary = {
+            repayments.APPLIED: 0,
+            repayments.DUPLICATE: 0,
+            repayments.LOAN_NOT_FOUND: 0,
+        }
+        for result in results:
+            summary[result['status']] += 1
+
+        return Response({
+            **summary,
+            'results': RecordPaymentResponseSerializer(results, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+class IngestionStatusView(APIView):
+    def get(self, request, task_id=None):
+        """Progress of the latest ingestion run, or of the run started by ``task_id``"""
+        jobs = IngestionJob.objects.order_by('-id')
+        if task_id is not None:
+            jobs = jobs.filter(task_id=task_id)
+
+        job = jobs.first()
+        if job is None:
+            return Response(
+                {"error": "Ingestion job not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(IngestionJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class PortfolioSummaryView(APIView):
+    def get(self, request):
+        """Exposure and EMI totals across the whole loan book"""
+        return Response(portfolio.summary(), status=status.HTTP_200_OK)
+
+
+class PortfolioBreakdownView(APIView):
+    def get(self, request):
+        """Distribution of the loan book by credit score, volume ratio, interest rate and tenure"""
+        return Response(portfolio.breakdown(), status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    def get(self, request, kind):
+        """Stream every loan (joined with its customer) or every customer as CSV or Parquet"""
+        if kind not in export.KINDS:
+            return Response(
+                {"error": f"Unknown export: {kind}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        query_serializer = ExportQuerySerializer(data=request.query_params)
+        if not query_serializer.is_valid():
+            return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        options = dict(query_serializer.validated_data)
+        fmt = options.pop('output')
+        compress = options.pop('gzip')
+        filters = {
+            'active_only': options.pop('active'),
+            **options,
+        }
+
+        if fmt == export.PARQUET:
+            return FileResponse(
+                export.parquet_file(kind, compress=compress, **filters),
+                as_attachment=True,
+                filename=f'{kind}.parquet',
+                content_type='application/vnd.apache.parquet',
+            )
+
+        filename = f'{kind}.csv.gz' if compress else f'{kind}.csv'
+        response = StreamingHttpResponse(
+            export.stream_csv(kind, compress=compress, **filters),
+            content_type='application/gzip' if compress else 'text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class CustomerCacheStatsView(APIView):
+    def get(self, request):
+        """Hit rate, size and eviction counters of this worker's customer cache"""
+        return Response(customer_cache.stats(), status=status.HTTP_200_OK)
+
+
+class DatabasePoolStatsView(APIView):
+    def get(self, request):
+        """Checkouts, wait time and saturation of this worker's database connection pools"""
+        return Response({'pid': os.getpid(), 'pools': db_pool.pool_stats()}, status=status.HTTP_200_OK)
+
+
+class AdmissionStatsView(APIView):
+    def get(self, request):
+        """In-flight requests, queue depth and admit/shed counts of this worker's admission control"""
+        return Response(admission.get_controller().stats(), status=status.HTTP_200_OK)
@@ -0,0 +1,65 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import get_resolver
+
+from . import customer_cache
+
+logger = logging.getLogger(__name__)
+
+
+def warm_server():
+    """
+    Import and build everything requests need once, in the server process
+    before it forks, so every worker starts with it in shared memory.
+    Leaves no database connection open for the workers to inherit.
+    """
+    from rest_framework.settings import api_settings
+
+    started = time.monotonic()
+    # importing the URLconf imports every view, serializer and the scoring modules
+    get_resolver().url_patterns
+    api_settings.DEFAULT_RENDERER_CLASSES
+    api_settings.DEFAULT_PARSER_CLASSES
+    connections.close_all()
+    logger.info("Server warm-up done in %.2fs", time.monotonic() - started)
+
+
+def warm_worker():
+    """
+    Connect a freshly forked worker before it accepts requests: open the
+    database pools, reach the shared cache and preload up to
+    SERVE_WARM_CUSTOMERS customers into the customer cache. A failed
+    warm-up is logged and the worker starts cold, rather than failing to
+    boot and taking the server down with it.
+    """
+    started = time.monotonic()
+    try:
+        for alias in ['default', *settings.DATABASE_REPLICAS]:
+            connection = connections[alias]
+            pool = getattr(connection, 'pool', None)
+            if pool is not None:
+                pool.open(wait=True, timeout=settings.DB_POOL_TIMEOUT)
+            else:
+                connection.ensure_connection()
+
+        try:
+            cache.get('warmup')
+        except Exception:
+            logger.warning("Cache unreachable during worker warm-up", exc_info=True)
+
+        preloaded = customer_cache.preload(settings.SERVE_WARM_CUSTOMERS)
+    except Exception:
+        logger.warning("Worker warm-up failed; starting cold", exc_info=True)
+        return 0
+    finally:
+        # hand the connections back; request threads take their own from the pool
+        connections.close_all()
+
+    logger.info(
+        "Worker warm-up done in %.2fs (%d customers cached)", time.monotonic() - started, preloaded
+    )
+    return preloaded
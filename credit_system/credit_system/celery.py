@@ -1,9 +1,18 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'credit_system.settings')
 
 app = Celery('credit_system')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+@worker_process_init.connect
+def size_database_pools(**kwargs):
+    """Give worker processes their own, smaller database connection pools"""
+    from core.db_pool import configure_worker_pools
+    configure_worker_pools()
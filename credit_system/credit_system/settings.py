@@ -28,8 +28,12 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
+    'core.middleware.SlowQueryLogMiddleware',
+    'core.middleware.TracingMiddleware',
 ]
 
 ROOT_URLCONF = 'credit_system.urls'
@@ -64,6 +68,19 @@ WSGI_APPLICATION = 'credit_system.wsgi.application'
 #     }
 # }
 
+# Connection pool of each web process (psycopg_pool): connections kept open, the most it
+# opens, seconds a request waits for one, and seconds before a connection is recycled or
+# an idle one above min_size is closed. Connections are health-checked on checkout.
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+
+# Pool size of each Celery worker process, applied when the process starts
+CELERY_DB_POOL_MIN_SIZE = int(os.environ.get('CELERY_DB_POOL_MIN_SIZE', 1))
+CELERY_DB_POOL_MAX_SIZE = int(os.environ.get('CELERY_DB_POOL_MAX_SIZE', 2))
+
 # Database for Docker connection
 DATABASES = {
     'default': {
@@ -73,9 +90,39 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASS', 'django_pass'),
         'HOST': os.environ.get('DB_HOST', 'db'),
         'PORT': '5432',
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': DB_POOL_MIN_SIZE,
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': DB_POOL_TIMEOUT,
+                'max_lifetime': DB_POOL_MAX_LIFETIME,
+                'max_idle': DB_POOL_MAX_IDLE,
+            },
+        },
     }
 }
 
+# Read replicas, as a comma-separated list of hosts; each becomes a replicaN alias
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+for _index, _host in enumerate(DB_REPLICA_HOSTS, start=1):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'OPTIONS': {'pool': dict(DATABASES['default']['OPTIONS']['pool'])},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [f'replica{index}' for index in range(1, len(DB_REPLICA_HOSTS) + 1)]
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
+# Seconds a client's reads stay on the primary after it writes
+REPLICA_STICKY_SECONDS = 5
+
+# Replicas further behind than this many seconds are skipped; lag is rechecked this often
+REPLICA_MAX_LAG = 2
+REPLICA_LAG_CHECK_INTERVAL = 5
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,7 +150,159 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+
+# Periodic maintenance run by `celery -A credit_system beat`
+CELERY_BEAT_SCHEDULE = {
+    'ensure-loan-partitions': {
+        'task': 'core.tasks.ensure_loan_partitions',
+        'schedule': 24 * 60 * 60,
+    },
+    'archive-closed-loans': {
+        'task': 'core.tasks.archive_closed_loans',
+        'schedule': 24 * 60 * 60,
+    },
+    # picks up queued loan applications whose drain task was lost
+    'process-loan-decisions': {
+        'task': 'core.tasks.process_loan_decisions',
+        'schedule': 60,
+    },
+}
+
+# Parsed copies of data/*.xlsx keyed by content hash; set to None to always parse the workbooks
+INGEST_CACHE_DIR = os.path.join(BASE_DIR, 'data', '.cache')
+
+# Rows committed per checkpoint; an interrupted ingestion resumes after the last committed chunk
+INGEST_CHUNK_SIZE = 1000
+# Seconds before the ingestion lock expires if its holder dies; refreshed after every chunk
+INGEST_LOCK_TIMEOUT = 300
+# Load only mapped columns in compact dtypes; for ingest workers in small containers
+INGEST_LEAN_LOADING = os.environ.get('INGEST_LEAN_LOADING', '0') == '1'
+
+# Rows per transaction when applying a daily repayment feed
+REPAYMENT_FEED_CHUNK_SIZE = 10000
+
+# Largest request accepted by /api/register-batch
+REGISTER_BATCH_MAX_SIZE = 5000
+
+# Largest request accepted by /api/create-loan-batch, and rows per transaction for create_loans
+LOAN_BATCH_MAX_SIZE = 5000
+
+# Seconds the /api/portfolio reports are cached; ingestion clears them early
+PORTFOLIO_CACHE_TTL = 300
+
+# Rows fetched per round trip when exporting; Postgres streams them through a server-side cursor
+EXPORT_CHUNK_SIZE = 5000
+
+# Bytes of a Parquet export held in memory before it spills to a temporary file
+EXPORT_SPOOL_SIZE = 32 * 1024 * 1024
+
+# Per-process LRU of Customer rows; a size of 0 turns it off
+CUSTOMER_CACHE_SIZE = int(os.environ.get('CUSTOMER_CACHE_SIZE', 10000))
+CUSTOMER_CACHE_TTL = 300
+
+# How cache invalidations reach other processes: 'redis' (pub/sub) or 'memory' (this process only)
+CUSTOMER_CACHE_BUS = 'redis'
+
+# Share in-flight credit score computations across processes through the cache, and
+# how long (seconds) the lock and shared result live
+SCORING_SINGLEFLIGHT_SHARED = os.environ.get('SCORING_SINGLEFLIGHT_SHARED', '0') == '1'
+SCORING_SINGLEFLIGHT_TIMEOUT = 5
+
+# Idempotency-Key support on create-loan and register: how long (seconds) a first response is
+# replayed for repeats, how long the original may run before a duplicate may take over, and how
+# long a duplicate waits for an original that is still running before getting a 409
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Asynchronous loan creation (POST /create-loan?async=true): applications are queued and a worker
+# decides them in micro-batches of up to this many per transaction, starting this many seconds
+# after the first queued application so that a burst lands in one batch
+LOAN_DECISION_BATCH_SIZE = 100
+LOAN_DECISION_BATCH_WINDOW = 0.5
+
+# Years of future yearly loan partitions kept ready on Postgres; covers the longest tenure
+LOAN_PARTITION_YEARS_AHEAD = 5
+
+# Closed loans move to the archive table this many days after their end date (leaving time
+# for late repayments), in transactions of LOAN_ARCHIVE_BATCH_SIZE loans
+LOAN_ARCHIVE_AFTER_DAYS = 90
+LOAN_ARCHIVE_BATCH_SIZE = 5000
+
+# Customers loaded into each server worker's customer cache before it takes traffic
+SERVE_WARM_CUSTOMERS = int(os.environ.get('SERVE_WARM_CUSTOMERS', 1000))
+
+# Load shedding per worker process. Each class of routes gets `concurrency` requests in
+# flight, with up to `queue` more waiting at most `queue_timeout` seconds for a slot (503
+# past that), and each client a token bucket of `rate` requests/second with bursts of
+# `burst` (429 past that). Classes with shed_on_db_pressure also get 503 while the
+# database pool is backed up.
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', '1') == '1'
+ADMISSION_CLASSES = {
+    'scoring': {
+        'routes': ['check-eligibility', 'create-loan'],
+        'concurrency': 8, 'queue': 16, 'queue_timeout': 2,
+        'rate': 10, 'burst': 20,
+        'shed_on_db_pressure': True,
+    },
+    'batch': {
+        'routes': ['create-loan-batch', 'register-customer-batch', 'record-payment-batch'],
+        'concurrency': 2, 'queue': 2, 'queue_timeout': 5,
+        'rate': 1, 'burst': 3,
+        'shed_on_db_pressure': True,
+    },
+    'reads': {
+        'routes': ['view-loan', 'view-loans', 'loan-decision'],
+        'concurrency': 32, 'queue': 64, 'queue_timeout': 1,
+        'rate': 50, 'burst': 100,
+    },
+}
+
+# The database pool counts as backed up when this many requests wait for a connection, or
+# the average wait over the last ADMISSION_DB_CHECK_INTERVAL seconds reaches this many ms
+ADMISSION_MAX_DB_WAITING = 4
+ADMISSION_MAX_DB_WAIT_MS = 200
+ADMISSION_DB_CHECK_INTERVAL = 1
+
+# Retry-After (seconds) sent with 503s
+ADMISSION_RETRY_AFTER = 1
+
+# Slow-query log for statements issued by core views and tasks: statements slower than
+# the threshold go to a JSONL file per process (SLOW_QUERY_LOG_PATH with the pid inserted)
+# rotated at SLOW_QUERY_LOG_MAX_BYTES, and this share of
+# slow SELECTs on Postgres are re-run under EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', '0') == '1'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_LOG_PATH = os.path.join(BASE_DIR, 'logs', 'slow-queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Request and task tracing: this share of requests to core views and core Celery tasks are
+# traced as nested spans (validation, each ORM query, scoring, EMI, rendering) and written as
+# JSONL, one span per line and one file per process; `manage.py trace_flamegraph` folds them into flame-graph stacks
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+TRACE_LOG_PATH = os.path.join(BASE_DIR, 'logs', 'traces.jsonl')
+TRACE_LOG_MAX_BYTES = 10 * 1024 * 1024
+TRACE_LOG_BACKUPS = 5
+
+# Cold-start budget for web workers, Celery workers and management commands booted in a fresh
+# interpreter (`manage.py startup_profile --check`); none of them may import these modules
+# until the code that needs them runs
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 3))
+STARTUP_BUDGET_RSS_MB = int(os.environ.get('STARTUP_BUDGET_RSS_MB', 120))
+STARTUP_LAZY_MODULES = ['pandas', 'numpy', 'pyarrow']
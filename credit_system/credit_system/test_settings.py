@@ -4,13 +4,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',  
-    }
+    },
+    # stands in for a read replica; tests that route to it list it in DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_REPLICAS = []
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
 
+INGEST_CACHE_DIR = None
+
+# the test database rolls back under the cache, so tests that use it switch it on and reset it
+CUSTOMER_CACHE_SIZE = 0
+CUSTOMER_CACHE_BUS = 'memory'
+
+# every test client shares one address, so tests that exercise admission control switch it on
+ADMISSION_CONTROL_ENABLED = False
+
 class DisableMigrations:
     def __contains__(self, item):
         return True
@@ -0,0 +1,38 @@
+# Production server settings; used by `python manage.py serve`, which can override each one.
+# `kill -HUP <master pid>` re-reads this file and replaces the workers gracefully.
+import multiprocessing
+import os
+
+wsgi_app = 'credit_system.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# one worker process per CPU; more than one thread switches workers to the threaded worker
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# recycle a worker after this many requests (plus jitter, so they don't all restart at once)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# load Django once in the master; workers share it copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # runs in the master before the first workers are forked
+    if server.cfg.preload_app:
+        from core.warmup import warm_server
+        warm_server()
+
+
+def post_worker_init(worker):
+    # runs in each worker after it loaded the app, before it accepts connections
+    from core.warmup import warm_worker
+    warm_worker()